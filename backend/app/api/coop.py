@@ -0,0 +1,184 @@
+"""
+WebSocket endpoint for co-operative play (see app.core.coop).
+
+Players of a session connect to /api/nonograms/{name}/coop/{session} and
+exchange JSON text messages. Cells are addressed by index = row * width +
+column and have the states 0 (unknown), 1 (filled) and 2 (crossed); line
+statuses are 0 (satisfied), 1 (contradicted) and 2 (open), rows first,
+then columns.
+
+Client to server:
+    {"type": "set", "cells": [index, state, ...]}
+
+Server to client:
+    {"type": "state", ...}    the whole board on joining (cells as base64
+                              of the packed grid, lines as one status each)
+    {"type": "delta", "seq": n, "cells": [index, state, ...],
+     "lines": [line, status, ...], "satisfied", "contradicted", "complete"}
+    {"type": "players", "count": n}
+    {"type": "error", "detail": "..."}
+
+Every message is encoded once and queued to each player; a player whose
+queue fills up is disconnected rather than buffered without bound, and
+gets the current board again when it reconnects.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+
+from fastapi import APIRouter, WebSocket
+
+from ..core import metrics
+from ..core.coop import COOP_COALESCE_MS, COOP_IDLE_SECONDS, COOP_PLAYERS, CoopSession, CoopSessions, CoopSessionsFull
+from ..core.crud import data_manager
+from ..core.encoding import dumps
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+# Messages queued per player before it is considered too slow and disconnected
+COOP_SEND_QUEUE = 256
+
+# Close codes; 4xxx are application codes mirroring the HTTP statuses
+CLOSE_INVALID = 1008
+CLOSE_TRY_AGAIN = 1013
+CLOSE_NOT_FOUND = 4404
+CLOSE_IDLE = 4408
+
+_SESSION_ID = re.compile(r"[A-Za-z0-9_-]{1,64}$")
+
+coop_sessions = CoopSessions()
+
+metrics.registry.gauge(
+    "nonogram_coop_sessions", "Co-op sessions held by this process", function=lambda: len(coop_sessions)
+)
+metrics.registry.gauge(
+    "nonogram_coop_players", "Players connected to co-op sessions", function=coop_sessions.players
+)
+
+
+class _Player:
+    """A connected player and the queue of messages its sender task writes out"""
+    __slots__ = ("websocket", "queue")
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[Union[str, Tuple[int, str]]]" = asyncio.Queue(COOP_SEND_QUEUE)
+
+    def send(self, text: str) -> None:
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.close(CLOSE_TRY_AGAIN, "Too far behind; reconnect for the current board")
+
+    def close(self, code: int, reason: str) -> None:
+        """Drop the messages not sent yet and close the connection"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait((code, reason))
+
+    async def run(self) -> None:
+        try:
+            while True:
+                item = await self.queue.get()
+                if isinstance(item, tuple):
+                    await self.websocket.close(*item)
+                    return
+                await self.websocket.send_text(item)
+        except Exception as e:
+            # The connection went away; the receiving side sees the disconnect and cleans up
+            logger.debug("Stopped sending to a co-op player: %s", e)
+
+
+def _encode(message: Dict[str, Any]) -> str:
+    return dumps(message).decode("utf-8")
+
+
+def _broadcast(session: CoopSession, message: Dict[str, Any]) -> None:
+    text = _encode(message)
+    for player in list(session.players):
+        player.send(text)
+
+
+def _flush(session: CoopSession) -> None:
+    delta = session.take_delta()
+    if delta is not None:
+        _broadcast(session, delta)
+
+
+def _receive(session: CoopSession, player: _Player, text: Optional[str]) -> None:
+    """Apply one message of a player, answering errors to that player only"""
+    try:
+        if text is None:
+            raise ValueError("Expected JSON text messages")
+        message = json.loads(text)
+        if not isinstance(message, dict) or message.get("type") != "set":
+            raise ValueError('Expected {"type": "set", "cells": [index, state, ...]}')
+        flush_scheduled = bool(session.pending)
+        session.apply(message.get("cells"))
+    except ValueError as e:
+        player.send(_encode({"type": "error", "detail": str(e)}))
+        return
+    coop_sessions.touch(session, time.monotonic())
+    if session.pending and not flush_scheduled:
+        asyncio.get_running_loop().call_later(COOP_COALESCE_MS / 1000.0, _flush, session)
+
+
+@router.websocket("/{name}/coop/{session_id}")
+async def coop_session(websocket: WebSocket, name: str, session_id: str):
+    """
+    Join the co-op session `session_id` of a puzzle, creating it if needed.
+    Players sharing a session id share the board.
+    """
+    await websocket.accept()
+    if not _SESSION_ID.match(session_id):
+        await websocket.close(CLOSE_INVALID, "Session ids are 1 to 64 letters, digits, '-' or '_'")
+        return
+    descriptors = data_manager.get_descriptors(name)
+    if descriptors is None:
+        await websocket.close(CLOSE_NOT_FOUND, f"Nonogram with name '{name}' not found")
+        return
+    try:
+        session, reset = coop_sessions.join(name, session_id, descriptors, time.monotonic())
+    except CoopSessionsFull as e:
+        await websocket.close(CLOSE_TRY_AGAIN, str(e))
+        return
+    if len(session.players) >= COOP_PLAYERS:
+        await websocket.close(CLOSE_TRY_AGAIN, f"Session '{session_id}' already has {COOP_PLAYERS} players")
+        return
+    if reset:
+        # The puzzle was replaced: players already in the session start over too
+        _broadcast(session, session.state())
+
+    player = _Player(websocket)
+    session.players.add(player)
+    player.send(_encode(session.state()))
+    _broadcast(session, {"type": "players", "count": len(session.players)})
+    sender = asyncio.create_task(player.run())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            _receive(session, player, message.get("text"))
+    finally:
+        session.players.discard(player)
+        sender.cancel()
+        coop_sessions.touch(session, time.monotonic())
+        _broadcast(session, {"type": "players", "count": len(session.players)})
+
+
+async def evict_idle_sessions(interval_seconds: float = min(COOP_IDLE_SECONDS / 4, 60.0)) -> None:
+    """Evict idle sessions every `interval_seconds`, closing their players, until cancelled"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        evicted = coop_sessions.evict_idle(time.monotonic())
+        for session in evicted:
+            for player in list(session.players):
+                player.close(CLOSE_IDLE, "Session idle")
+        if evicted:
+            logger.info("Evicted %d idle co-op sessions", len(evicted))
@@ -0,0 +1,188 @@
+import os
+import zlib
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+
+from ..core.encoding import CONTENT_CODINGS, GZIP_LEVEL
+from ..core.snapshot import CachedResponse
+
+# Cache-Control sent with cacheable responses. The default lets browsers and
+# proxies store responses but revalidate them, which is answered with a 304.
+CACHE_CONTROL = os.environ.get("NONOGRAM_CACHE_CONTROL", "public, no-cache")
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.environ.get("NONOGRAM_COMPRESS_MIN_BYTES", 1024))
+
+
+# Streamed responses the compression middleware leaves alone, so their lines arrive as they are made
+STREAMED_CONTENT_TYPES = ("application/x-ndjson", "text/event-stream")
+
+
+def _coding_weights(accept_encoding: str) -> Dict[str, float]:
+    """q-value of every coding named in an Accept-Encoding header"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, parameters = part.partition(";")
+        weight = 1.0
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip().lower()] = weight
+    return weights
+
+
+def negotiate_coding(accept_encoding: Optional[str], codings: Tuple[str, ...] = CONTENT_CODINGS) -> Optional[str]:
+    """
+    Content coding to answer an Accept-Encoding header with: the supported
+    coding with the highest q-value, the better compressor on ties, or None
+    for the uncompressed body.
+    """
+    if not accept_encoding:
+        return None
+    weights = _coding_weights(accept_encoding)
+    best, best_weight = None, 0.0
+    for coding in codings:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def coded_etag(etag: str, coding: str) -> str:
+    """ETag of the body in a content coding; each coding is a distinct representation"""
+    return f'{etag[:-1]}-{coding}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag.
+    Uses the weak comparison required for If-None-Match (RFC 9110 13.1.2).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def cached_json_response(request: Request, cached: CachedResponse,
+                         cache_control: str = CACHE_CONTROL,
+                         media_type: str = "application/json",
+                         headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Serve a pre-encoded JSON body, or a bodiless 304 when the client
+    already holds the current version. Bodies of COMPRESS_MIN_BYTES or more
+    are compressed with the coding the client prefers; the compressed bytes
+    are cached with the body. The response always carries its
+    Content-Encoding, if any, so CompressionMiddleware passes it through.
+    """
+    coding = None
+    negotiated = len(cached.body) >= COMPRESS_MIN_BYTES
+    if negotiated:
+        coding = negotiate_coding(request.headers.get("accept-encoding"))
+    etag = coded_etag(cached.etag, coding) if coding is not None else cached.etag
+    headers = {"ETag": etag, "Cache-Control": cache_control, **(headers or {})}
+    if negotiated:
+        headers["Vary"] = f"{headers['Vary']}, Accept-Encoding" if "Vary" in headers else "Accept-Encoding"
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if coding is None:
+        return Response(content=cached.body, media_type=media_type, headers=headers)
+    headers["Content-Encoding"] = coding
+    return Response(content=cached.compressed(coding), media_type=media_type, headers=headers)
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware gzipping the responses that routes do not encode
+    themselves, when they are at least `minimum_size` bytes (or streamed)
+    and the client accepts gzip. Responses that already carry a
+    Content-Encoding, such as the cached ones from cached_json_response,
+    and STREAMED_CONTENT_TYPES pass through untouched. Not every Starlette
+    version's GZipMiddleware skips encoded responses, so the app relies on
+    this one instead.
+    """
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES, compresslevel: int = GZIP_LEVEL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        gzip = negotiate_coding(Headers(scope=scope).get("accept-encoding"), ("gzip",)) is not None
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+                if "content-encoding" in headers or content_type in STREAMED_CONTENT_TYPES:
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held until the first body chunk shows whether it is worth compressing
+                    start = {**message, "headers": list(message["headers"])}
+                return
+            if message["type"] != "http.response.body":
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                if len(body) < self.minimum_size and not more_body:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not gzip:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                # wbits=31 writes the gzip container
+                compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 31)
+                headers["Content-Encoding"] = "gzip"
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    body = compressor.compress(body) + compressor.flush()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({**message, "body": body})
+                    return
+                await send(start)
+            if more_body:
+                # Flushed so every chunk reaches the client as it is produced
+                body = compressor.compress(body) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            else:
+                body = compressor.compress(body) + compressor.flush()
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
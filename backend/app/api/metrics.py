@@ -0,0 +1,79 @@
+import time
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from ..core import metrics
+
+router = APIRouter()
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def route_template(scope) -> str:
+    """
+    Path template of the route that served a request, e.g.
+    "/api/nonograms/{name}". Routes of included routers may only know
+    their path below the router's prefix, so the prefix is taken from the
+    request path in front of the part the route matched.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope["path"]
+    start = 0
+    while start >= 0:
+        if route.path_regex.match(path[start:]):
+            return path[:start] + template
+        start = path.find("/", start + 1)
+    return template
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording in-flight requests and, per route
+    template, latency by status and response body size. Only installed
+    when metrics are enabled.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_and_measure(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            metrics.http_requests_in_flight.dec()
+            # The router stores the matched route in the scope; templates keep label cardinality bounded
+            route = route_template(scope)
+            method = scope["method"]
+            metrics.http_request_duration.observe(time.perf_counter() - started, method, route, str(status))
+            metrics.http_response_size.observe(size, method, route)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Metrics of this worker process in the Prometheus text format.
+    """
+    if not metrics.registry.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled, set NONOGRAM_METRICS=1")
+    return PlainTextResponse(metrics.registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,49 +1,462 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
+import asyncio
+import logging
+import random
+from collections import deque
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Literal, Optional, Tuple
 
-from ..core.models import Nonogram, NonogramList, NonogramSearchResult, NonogramCreate
+from ..core.models import (
+    LIST_FIELDS,
+    Difficulty,
+    MAX_PAGE_SIZE,
+    Nonogram,
+    NonogramCompact,
+    NonogramList,
+    NonogramBatchRequest,
+    NonogramBatchResult,
+    NonogramCheckRequest,
+    NonogramCheckResult,
+    NonogramDescriptorsBatchRequest,
+    NonogramDescriptorsBatchResult,
+    NonogramGenerateRequest,
+    NonogramHintRequest,
+    NonogramHintResult,
+    NonogramSearchResult,
+    NonogramCreate,
+    NonogramCreateResult,
+    NonogramUpdate,
+    NonogramSimilarRequest,
+    NonogramSimilarResult,
+    NonogramSolveRequest,
+    NonogramSolveResult,
+)
 from ..core.crud import data_manager
+from ..core import jobs, metrics
+from ..core.descriptors import calculate_descriptors_batch
+from ..core.executor import CancelFlag, ExecutorSaturated, JobTimeout, job_executor
+from ..core.generator import DEFAULT_ATTEMPTS_PER_PUZZLE, GenerateSpec, batch_size
+from ..core.hints import HINT_INLINE_CELLS
+from ..core.play import CHECK_INLINE_CHANGES, UnknownBoardError
+from ..core.similarity import DuplicateNonogramError
+from ..core.storage import NonogramExistsError, ReadOnlyStoreError, StoreError
+from .http_cache import cached_json_response
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
 
-@router.get("/list", response_model=NonogramList)
-async def get_nonogram_list():
+# Media types a client can put in Accept to ask for a compact board
+BOARD_MEDIA_TYPES = {
+    "bitmap": "application/vnd.nonogram.bitmap+json",
+    "rle": "application/vnd.nonogram.rle+json",
+}
+
+
+def _board_format(request: Request, format: Optional[str]) -> str:
+    """Pick the board encoding from the format parameter or the Accept header"""
+    if format:
+        return format
+    accept = request.headers.get("accept", "")
+    for encoding, media_type in BOARD_MEDIA_TYPES.items():
+        if media_type in accept:
+            return encoding
+    return "json"
+
+
+async def _run_job(run, func, *args):
+    """Run a job with `run` (an executor method), mapping executor errors to HTTP errors"""
+    try:
+        return await run(func, *args)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except JobTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+
+async def _run_cpu(func, *args):
+    """Run a CPU-bound job on the process pool; ValueError means invalid input"""
+    try:
+        return await _run_job(job_executor.run_cpu, func, *args)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+async def _write(func, *args):
+    """Run a store write on the I/O pool, mapping store errors to HTTP errors"""
+    try:
+        return await _run_job(job_executor.run_io, func, *args)
+    except ReadOnlyStoreError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except (NonogramExistsError, DuplicateNonogramError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except StoreError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+def _parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Parse a comma separated projection; 'dimensions' stands for width and height"""
+    if not fields:
+        return ()
+    requested = set()
+    for field in fields.split(","):
+        field = field.strip()
+        if field == "dimensions":
+            requested.update(("width", "height"))
+        elif field in LIST_FIELDS:
+            requested.add(field)
+        elif field:
+            raise HTTPException(status_code=422, detail=f"Unknown field {field!r}, expected one of {', '.join(LIST_FIELDS)} or dimensions")
+    return tuple(field for field in LIST_FIELDS if field in requested)
+
+
+@router.get("/list", response_model=NonogramList, response_model_exclude_none=True)
+async def get_nonogram_list(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's next_cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of names per page"),
+    prefix: Optional[str] = Query(None, description="Only list names starting with this prefix"),
+    fields: Optional[str] = Query(None, description="Comma separated metadata to include: name, width, height, density, difficulty or dimensions"),
+    sort: Literal["name", "difficulty"] = Query("name", description="List in name order or from easiest to hardest"),
+    min_difficulty: Optional[Difficulty] = Query(None, description="Only list puzzles at least this difficult"),
+    max_difficulty: Optional[Difficulty] = Query(None, description="Only list puzzles at most this difficult")
+):
     """
     Get a list of all available nonogram names.
+    With a cursor, limit, prefix, fields, sort or difficulty band the names
+    are listed one page at a time, in name order unless sorted by
+    difficulty, and 'items' carries the requested metadata. Difficulties
+    are precomputed, so neither sorting nor filtering analyses puzzles.
     """
-    names = data_manager.get_all_names()
-    return NonogramList(names=names)
+    projection = _parse_fields(fields)
+    if (cursor is None and limit is None and not prefix and not projection and sort == "name"
+            and min_difficulty is None and max_difficulty is None):
+        return cached_json_response(request, data_manager.get_list_response())
+    try:
+        page = data_manager.get_list_page(
+            prefix or "", cursor, limit, projection, sort, min_difficulty, max_difficulty
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return cached_json_response(request, page)
 
 
 @router.get("/search", response_model=NonogramSearchResult)
-async def search_nonograms(clue: str = Query(..., description="Clue string to search for, e.g. '1,2,3' or '1 2 3'")):
+async def search_nonograms(
+    request: Request,
+    clue: Optional[str] = Query(None, description="Clue string to search for, e.g. '1,2,3' or '1 2 3'"),
+    q: Optional[str] = Query(None, description="Query such as 'row:*,3,1,* col:5,* size:15x15'; terms are ANDed"),
+    sort: Literal["catalogue", "difficulty"] = Query("catalogue", description="Order matches as in the catalogue or from easiest to hardest")
+):
     """
     Search for nonograms that have the specified clue in their row or column descriptors.
+    Alternatively `q` takes a query of whitespace separated terms, all of which must match:
+    row:, col: or any: with a clue pattern (exact `3,1`, prefix `5,*`, suffix `*,1`,
+    contains `*,3,1,*`), size:WxH, width:, height: or filled: with a number or range,
+    and difficulty: with a level (`easy`), a range of levels (`easy..medium`, `>=medium`)
+    or of scores.
+    """
+    if (clue is None) == (q is None):
+        raise HTTPException(status_code=422, detail="Pass exactly one of 'clue' or 'q'")
+    if clue is not None:
+        return cached_json_response(request, data_manager.get_search_response(clue, sort))
+    try:
+        response = data_manager.get_query_response(q, sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return cached_json_response(request, response)
+
+
+@router.post("/batch", response_model=NonogramBatchResult)
+async def get_nonogram_batch(request: NonogramBatchRequest):
+    """
+    Get many nonograms by name in one request, all from the same data snapshot.
+    Names that do not exist are listed under 'missing'.
+    """
+    return Response(content=data_manager.get_batch_body(request.names), media_type="application/json")
+
+
+@router.post("/descriptors:batch", response_model=NonogramDescriptorsBatchResult)
+async def calculate_descriptors_for_boards(request: NonogramDescriptorsBatchRequest):
+    """
+    Calculate row and column descriptors for many boards in one request.
+    Boards of the same shape are processed together on the CPU pool.
+    """
+    descriptors = await _run_cpu(calculate_descriptors_batch, request.boards)
+    return NonogramDescriptorsBatchResult(descriptors=descriptors)
+
+
+@router.post("/solve", response_model=NonogramSolveResult)
+async def solve_nonogram(request: NonogramSolveRequest):
+    """
+    Solve a nonogram from its row and column descriptors.
+    The search runs on the CPU pool, bounded by the server's node and time budgets.
+    """
+    result = await _run_cpu(jobs.solve_nonogram, request)
+    metrics.record_solve("solve", result.status, result.stats)
+    return result
+
+
+@router.post("/hint", response_model=NonogramHintResult, response_model_exclude_none=True)
+async def hint_nonogram(request: NonogramHintRequest):
+    """
+    Find the next logical deduction on a partly filled grid: the cells the
+    easiest single line forces, or else a cell whose other value leads to a
+    contradiction. A line the known cells already break is reported
+    instead. On grids of up to NONOGRAM_HINT_INLINE_CELLS cells line
+    deductions are answered in place from the line-solver cache; larger
+    grids, and probing, run on the CPU pool within the hint budgets.
+    """
+    cells = len(request.descriptors["rows"]) * len(request.descriptors["columns"])
+    if cells > HINT_INLINE_CELLS:
+        result = await _run_cpu(jobs.hint_nonogram, request)
+    else:
+        try:
+            result = jobs.hint_nonogram(request, probe=False)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if result.status == "stuck":
+            # Probe without repeating the line pass that just forced nothing
+            lines = result.stats
+            result = await _run_cpu(jobs.hint_nonogram, request, True, True)
+            result.stats.line_solves += lines.line_solves
+            result.stats.elapsed_ms += lines.elapsed_ms
+    metrics.record_solve("hint", result.status, result.stats)
+    return result
+
+
+@router.post("/similar", response_model=NonogramSimilarResult)
+async def find_similar_nonograms(request: NonogramSimilarRequest):
     """
-    matches = data_manager.search_by_clue(clue)
-    return NonogramSearchResult(matches=matches)
+    Find the puzzles most similar to a stored puzzle or to a board, nearest first.
+    Only puzzles of the same size are compared, by differing cells (metric=board)
+    or by differing row and column clues (metric=clues).
+    """
+    # The lookup reads this process's snapshot (and builds its similarity index on
+    # first use), which the CPU pool's processes do not have: it runs on the I/O pool
+    try:
+        matches = await _run_job(
+            job_executor.run_io, data_manager.find_similar, request.name, request.board, request.k, request.metric
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if matches is None:
+        raise HTTPException(status_code=404, detail=f"Nonogram '{request.name}' not found")
+    return NonogramSimilarResult(matches=matches)
+
+
+class _GenerateRun:
+    """
+    Batches of one generate request on the CPU pool, one per worker in
+    flight, planned so that the requested count and attempt budget are
+    not exceeded. Results are taken in submission order.
+    Each batch runs for at most the executor's job timeout, and batches
+    already running stop at their next board once the run is cancelled.
+    """
+    def __init__(self, spec: GenerateSpec, count: int, max_attempts: int):
+        self.spec = spec
+        self.cancel = CancelFlag()
+        self.count = count
+        self.max_attempts = max_attempts
+        self.size = batch_size(spec.width, spec.height)
+        self.sent = 0
+        self.planned_attempts = 0
+        self.next_batch = 0
+        self.pending = deque()
+
+    def wanted(self) -> int:
+        in_flight = sum(wanted for _, wanted in self.pending)
+        return min(self.size, self.count - self.sent - in_flight)
+
+    def submit(self) -> None:
+        """Submit the next batch; raises ExecutorSaturated when the pool is full"""
+        wanted = self.wanted()
+        attempts = min(self.spec.batch_attempts, self.max_attempts - self.planned_attempts)
+        future = job_executor.submit_cpu(
+            jobs.generate_batch, self.spec, self.next_batch, wanted, attempts, job_executor.timeout, self.cancel.is_set
+        )
+        self.pending.append((asyncio.wrap_future(future), wanted))
+        self.next_batch += 1
+        self.planned_attempts += attempts
+
+    def can_submit(self) -> bool:
+        return (len(self.pending) < max(1, job_executor.cpu_workers)
+                and self.wanted() > 0 and self.planned_attempts < self.max_attempts)
+
+    async def lines(self) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                while self.can_submit():
+                    try:
+                        self.submit()
+                    except ExecutorSaturated as e:
+                        if self.pending:
+                            break
+                        # Nothing of ours is running; wait for other jobs to make room
+                        await asyncio.sleep(e.retry_after)
+                if not self.pending:
+                    return
+                future, _ = self.pending.popleft()
+                lines, attempts = await future
+                lines = lines[:self.count - self.sent]
+                self.sent += len(lines)
+                metrics.generated_puzzles.inc("kept", amount=len(lines))
+                metrics.generated_puzzles.inc("rejected", amount=attempts - len(lines))
+                if lines:
+                    yield b"".join(lines)
+        except Exception:
+            logger.exception("Puzzle generation failed after %d puzzles", self.sent)
+            raise
+        finally:
+            # The client went away or a batch failed: drop batches that have not started
+            # and stop the running ones
+            self.cancel.set()
+            for future, _ in self.pending:
+                future.cancel()
+
 
+@router.post("/generate", response_class=StreamingResponse,
+             responses={200: {"content": {"application/x-ndjson": {}}}})
+async def generate_nonograms(request: NonogramGenerateRequest):
+    """
+    Generate random puzzles of a size and density, streamed as NDJSON, one
+    puzzle per line, as batches finish on the CPU pool.
+    Boards can be filtered to unique solutions and a difficulty band; the
+    stream ends early when max_attempts boards have been tried. The seed is
+    returned in X-Nonogram-Seed, so the same request can be replayed.
+    """
+    seed = request.seed if request.seed is not None else random.getrandbits(32)
+    spec = GenerateSpec(
+        width=request.width,
+        height=request.height,
+        density=request.density,
+        seed=seed,
+        prefix=request.prefix,
+        unique=request.unique,
+        min_difficulty=request.min_difficulty,
+        max_difficulty=request.max_difficulty
+    )
+    run = _GenerateRun(spec, request.count, request.max_attempts or request.count * DEFAULT_ATTEMPTS_PER_PUZZLE)
+    # Submit the first batch now, so a busy pool is refused before the stream starts
+    try:
+        run.submit()
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return StreamingResponse(run.lines(), media_type="application/x-ndjson", headers={"X-Nonogram-Seed": str(seed)})
 
-@router.get("/{name}", response_model=Nonogram)
-async def get_nonogram(name: str):
+
+@router.get(
+    "/{name}",
+    response_model=Nonogram,
+    responses={200: {"content": {media_type: {"schema": NonogramCompact.model_json_schema()}
+                                 for media_type in BOARD_MEDIA_TYPES.values()}}}
+)
+async def get_nonogram(
+    request: Request,
+    name: str,
+    format: Optional[Literal["json", "bitmap", "rle"]] = Query(
+        None, description="Board encoding; defaults to the Accept header, then 'json'"
+    )
+):
     """
     Get the full data for a specific nonogram by name.
+    The body is encoded once per data snapshot and served as-is.
     """
-    nonogram = data_manager.get_by_name(name)
-    if nonogram is None:
+    board_format = _board_format(request, format)
+    if board_format == "json":
+        cached = data_manager.get_cached(name)
+    else:
+        cached = data_manager.get_compact(name, board_format)
+    if cached is None:
         raise HTTPException(
             status_code=404, 
             detail=f"Nonogram with name '{name}' not found"
         )
+    return cached_json_response(
+        request,
+        cached,
+        media_type=BOARD_MEDIA_TYPES.get(board_format, "application/json"),
+        headers={"Vary": "Accept"}
+    )
+
+
+@router.post("/{name}/check", response_model=NonogramCheckResult)
+async def check_nonogram(name: str, request: NonogramCheckRequest):
+    """
+    Check a board in play against the puzzle's clues.
+    Send the full board (or nothing, for an empty board) to start a
+    session, then only the changed cells with the session of the first
+    answer and, optionally, the board_hash of the previous one. Only the
+    rows and columns of changed cells are examined, and their status is
+    returned with whether the puzzle is complete. An unknown session, or a
+    board_hash other than the session's, answers 409 Conflict: send the
+    full board again. Deltas of up to NONOGRAM_CHECK_INLINE_CHANGES cells
+    are checked in place; starts and larger deltas run on the I/O pool.
+    """
+    args = (name, request.changes, request.session, request.board_hash, request.board)
+    try:
+        if request.session is not None and len(request.changes) <= CHECK_INLINE_CHANGES:
+            result = data_manager.check_board(*args)
+        else:
+            # The boards in play are this process's, so not the CPU pool's
+            result = await _run_job(job_executor.run_io, data_manager.check_board, *args)
+    except UnknownBoardError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Nonogram with name '{name}' not found")
+    return result
+
+
+@router.put("/{name}", response_model=Nonogram, responses={201: {"model": Nonogram}})
+async def put_nonogram(name: str, update: NonogramUpdate, response: Response):
+    """
+    Create or replace a stored nonogram (descriptors will be calculated automatically).
+    Answers 201 when the nonogram was created and 403 when the store is read-only.
+    """
+    result = await _run_cpu(jobs.create_nonogram, NonogramCreate(name=name, board=update.board))
+    nonogram = Nonogram(name=result.name, board=result.board, descriptors=result.descriptors)
+    if await _write(data_manager.save_nonogram, nonogram, True):
+        response.status_code = 201
     return nonogram
 
 
-@router.post("/", response_model=Nonogram)
-async def create_nonogram(nonogram: NonogramCreate):
+@router.delete("/{name}", status_code=204)
+async def delete_nonogram(name: str):
+    """
+    Delete a stored nonogram.
+    Answers 404 when it does not exist and 403 when the store is read-only.
+    """
+    if not await _write(data_manager.delete_nonogram, name):
+        raise HTTPException(
+            status_code=404, 
+            detail=f"Nonogram with name '{name}' not found"
+        )
+    return Response(status_code=204)
+
+
+@router.post("/", response_model=NonogramCreateResult, response_model_exclude_none=True)
+async def create_nonogram(
+    nonogram: NonogramCreate,
+    response: Response,
+    validate: Optional[Literal["unique"]] = Query(
+        None, description="'unique' checks that the clues have a single solution, within the server's solver budgets"
+    ),
+    save: bool = Query(False, description="Also store the nonogram; 409 if the name is taken, 403 if the store is read-only")
+):
     """
     Create a new nonogram (descriptors will be calculated automatically).
-    This is currently a stateless operation - the nonogram is not saved to the data store.
+    Unless save=true this is a stateless operation - the nonogram is not saved to the data store.
+    Descriptors and the optional uniqueness check are computed on the CPU pool.
     """
-    # In a future version, this would save to persistent storage
-    return data_manager.create_nonogram(nonogram) 
\ No newline at end of file
+    result = await _run_cpu(jobs.create_nonogram, nonogram, validate)
+    if result.uniqueness is not None:
+        metrics.record_solve("unique", result.uniqueness.status, result.uniqueness.stats)
+    if save:
+        await _write(
+            data_manager.save_nonogram,
+            Nonogram(name=result.name, board=result.board, descriptors=result.descriptors)
+        )
+        response.status_code = 201
+    return result 
\ No newline at end of file
@@ -0,0 +1,138 @@
+import base64
+from itertools import chain
+from typing import Iterator, List, Sequence, Union
+
+# Maps the bytes of a list of booleans (0/1) to the digits "0"/"1"
+_BIT_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+# The eight cells encoded by every possible byte, most significant bit first
+_BYTE_CELLS = [tuple(bool((byte >> shift) & 1) for shift in range(7, -1, -1)) for byte in range(256)]
+
+
+class PackedBoard:
+    """
+    Bit-packed, immutable nonogram solution.
+
+    Cells are stored row by row, one bit per cell, most significant bit
+    first. Every row starts on a byte boundary (like a PBM bitmap), so a row
+    is a plain slice of `bits` and the same layout is used on the wire.
+    `bits` may be a read-only memoryview, e.g. into a mapped catalogue file,
+    which is then used in place rather than copied.
+    """
+    __slots__ = ("width", "height", "bits")
+
+    def __init__(self, width: int, height: int, bits: Union[bytes, memoryview]):
+        if width < 0 or height < 0:
+            raise ValueError("Board dimensions must not be negative")
+        if len(bits) != self.row_bytes(width) * height:
+            raise ValueError(f"Expected {self.row_bytes(width) * height} bytes for a {width}x{height} board, got {len(bits)}")
+        self.width = width
+        self.height = height
+        shared = isinstance(bits, memoryview) and bits.readonly and bits.format == "B"
+        self.bits = bits if shared or type(bits) is bytes else bytes(bits)
+
+    @staticmethod
+    def row_bytes(width: int) -> int:
+        """Number of bytes used by one row"""
+        return (width + 7) // 8
+
+    @classmethod
+    def from_rows(cls, board: Sequence[Sequence[bool]]) -> "PackedBoard":
+        """Pack a rectangular list-of-lists board"""
+        height = len(board)
+        width = len(board[0]) if height else 0
+        stride = cls.row_bytes(width)
+        padding = stride * 8 - width
+        packed = bytearray()
+        for row in board:
+            if len(row) != width:
+                raise ValueError("All rows of a board must have the same length")
+            mask = int(bytes(map(bool, row)).translate(_BIT_DIGITS), 2) if width else 0
+            packed += (mask << padding).to_bytes(stride, "big")
+        return cls(width, height, bytes(packed))
+
+    @classmethod
+    def from_row_masks(cls, width: int, masks: Sequence[int]) -> "PackedBoard":
+        """Pack rows given as integers where bit width-1 is the first column"""
+        stride = cls.row_bytes(width)
+        padding = stride * 8 - width
+        return cls(width, len(masks), b"".join((mask << padding).to_bytes(stride, "big") for mask in masks))
+
+    def row_mask(self, row: int) -> int:
+        """Row as an integer; the first column is bit width-1"""
+        stride = self.row_bytes(self.width)
+        chunk = self.bits[row * stride:(row + 1) * stride]
+        return int.from_bytes(chunk, "big") >> (stride * 8 - self.width)
+
+    def row_masks(self) -> List[int]:
+        """All rows as integers, see `row_mask`"""
+        return [self.row_mask(r) for r in range(self.height)]
+
+    def iter_rows(self) -> Iterator[List[bool]]:
+        """Rows unpacked to lists of booleans"""
+        stride = self.row_bytes(self.width)
+        for r in range(self.height):
+            chunk = self.bits[r * stride:(r + 1) * stride]
+            yield list(chain.from_iterable(map(_BYTE_CELLS.__getitem__, chunk)))[:self.width]
+
+    def to_rows(self) -> List[List[bool]]:
+        """Unpack to the list-of-lists representation used by the models"""
+        return list(self.iter_rows())
+
+    def filled_count(self) -> int:
+        """Number of filled cells"""
+        return bin(int.from_bytes(self.bits, "big")).count("1")
+
+    def to_base64(self) -> str:
+        """Row-aligned bitmap encoded as base64"""
+        return base64.b64encode(self.bits).decode("ascii")
+
+    @classmethod
+    def from_base64(cls, data: str, width: int, height: int) -> "PackedBoard":
+        """Decode a row-aligned base64 bitmap"""
+        return cls(width, height, base64.b64decode(data, validate=True))
+
+    def to_rle(self) -> List[int]:
+        """
+        Run lengths over the cells in row-major order, alternating empty and
+        filled runs and always starting with an (possibly zero) empty run.
+        """
+        runs: List[int] = []
+        current = False
+        length = 0
+        for row in self.iter_rows():
+            for cell in row:
+                if cell == current:
+                    length += 1
+                else:
+                    runs.append(length)
+                    current = cell
+                    length = 1
+        if length or not runs:
+            runs.append(length)
+        return runs
+
+    @classmethod
+    def from_rle(cls, runs: Sequence[int], width: int, height: int) -> "PackedBoard":
+        """Decode run lengths produced by `to_rle`"""
+        if sum(runs) != width * height:
+            raise ValueError("Run lengths do not add up to the board size")
+        cells: List[bool] = []
+        for index, length in enumerate(runs):
+            cells.extend([index % 2 == 1] * length)
+        return cls.from_rows([cells[r * width:(r + 1) * width] for r in range(height)])
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PackedBoard):
+            return NotImplemented
+        return (self.width, self.height, self.bits) == (other.width, other.height, other.bits)
+
+    def __hash__(self) -> int:
+        return hash((self.width, self.height, self.bits))
+
+    def __reduce__(self):
+        # Views into a mapping cannot be pickled; their bytes can
+        return PackedBoard, (self.width, self.height, bytes(self.bits))
+
+    def __repr__(self) -> str:
+        return f"PackedBoard(width={self.width}, height={self.height}, bits={bytes(self.bits)!r})"
@@ -0,0 +1,214 @@
+"""
+Compiled binary catalogue files.
+
+A catalogue file holds a whole catalogue in a form that is mapped into
+memory rather than parsed. Layout (little endian):
+
+- header: MAGIC, FORMAT_VERSION, the puzzle count, the SHA-256 digest and
+  fingerprint of the catalogue it was compiled from and the offset of
+  each section;
+- records: one fixed-size record per puzzle, in catalogue order, giving
+  its name (offset and length in the name table), width, height, board
+  offset, clue offset and length, number of row clues and its difficulty
+  (score -1 when not analysed);
+- names: the UTF-8 names, concatenated;
+- boards: the boards in PackedBoard layout, concatenated;
+- clues: every line's clue as its block count followed by the blocks, as
+  unsigned 16-bit integers, rows first and then columns.
+
+Reading decodes the records and clues, which the search index needs, while
+boards are never copied out of the mapping: a board is a view into it,
+made each time the puzzle's board is used. Every process mapping the same
+file shares its pages through the page cache.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from functools import partial
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from .bitboard import PackedBoard
+from .difficulty import DIFFICULTY_LEVELS, Difficulty
+from .snapshot import CatalogueEntry
+
+MAGIC = b"NONOCAT\0"
+FORMAT_VERSION = 1
+
+# magic, version, count, source digest, source mtime (-1 when unknown) and size,
+# records, names, boards, clues and end offsets
+_HEADER = struct.Struct("<8sII32sqQQQQQQ")
+
+# name offset, name length, width, height, board offset, clue offset, clue length,
+# row clues, score, passes, probes, branches, depth, level, settled
+_RECORD = struct.Struct("<IIHHQIIIiIIIHBB")
+
+_MAX_DIMENSION = 0xFFFF
+
+# Clues are stored as unsigned 16-bit integers in little-endian order
+_CLUE_TYPECODE = "H"
+_SWAP_CLUES = sys.byteorder != "little"
+
+
+class CatalogueFileError(ValueError):
+    """Raised when a file is not a catalogue file this version can read"""
+
+
+def _flatten_clues(descriptors: Dict[str, List[List[int]]]) -> List[int]:
+    values: List[int] = []
+    for axis in ("rows", "columns"):
+        for clue in descriptors.get(axis, []):
+            values.append(len(clue))
+            values.extend(clue)
+    return values
+
+
+def _clue_array(values: List[int]) -> bytes:
+    clues = array(_CLUE_TYPECODE, values)
+    if _SWAP_CLUES:  # pragma: no cover - big-endian hosts
+        clues.byteswap()
+    return clues.tobytes()
+
+
+def write_catalogue_file(path: str, entries: Mapping[str, CatalogueEntry], digest: str,
+                         source_fingerprint: Optional[Tuple[int, int]] = None) -> None:
+    """
+    Compile `entries` into a catalogue file at `path`; `digest` is the hex
+    SHA-256 and `source_fingerprint` the (st_mtime_ns, st_size) of the
+    catalogue they were read from. The file is written next to `path` and
+    renamed over it, so readers never see a partial file.
+    Raises ValueError for boards or clues the format cannot hold.
+    """
+    records = []
+    names = bytearray()
+    boards = bytearray()
+    clue_values: List[int] = []
+    for name, entry in entries.items():
+        board = entry.board
+        if board.width > _MAX_DIMENSION or board.height > _MAX_DIMENSION:
+            raise ValueError(f"Board {name!r} is too large for a catalogue file")
+        encoded_name = name.encode("utf-8")
+        clues = _flatten_clues(entry.descriptors)
+        if any(value < 0 or value > _MAX_DIMENSION for value in clues):
+            raise ValueError(f"Clues of {name!r} cannot be stored in a catalogue file")
+        difficulty = entry.difficulty
+        if difficulty is None:
+            rating = (-1, 0, 0, 0, 0, 0, 0)
+        else:
+            rating = (difficulty.score, difficulty.passes, difficulty.probes, difficulty.branches,
+                      min(difficulty.depth, _MAX_DIMENSION), DIFFICULTY_LEVELS.index(difficulty.level),
+                      int(difficulty.settled))
+        records.append(_RECORD.pack(len(names), len(encoded_name), board.width, board.height, len(boards),
+                                    len(clue_values), len(clues), len(entry.descriptors.get("rows", [])), *rating))
+        names += encoded_name
+        boards += board.bits
+        clue_values.extend(clues)
+
+    records_offset = _HEADER.size
+    names_offset = records_offset + _RECORD.size * len(records)
+    boards_offset = names_offset + len(names)
+    clues_offset = boards_offset + len(boards)
+    clue_bytes = _clue_array(clue_values)
+    end_offset = clues_offset + len(clue_bytes)
+    source_mtime, source_size = source_fingerprint if source_fingerprint is not None else (-1, 0)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(records), bytes.fromhex(digest), source_mtime, source_size,
+                          records_offset, names_offset, boards_offset, clues_offset, end_offset)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as f:
+            f.write(header)
+            f.writelines(records)
+            f.write(names)
+            f.write(boards)
+            f.write(clue_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
+
+
+class CatalogueFile:
+    """
+    A catalogue file mapped read-only into memory.
+    The mapping stays open for as long as the CatalogueFile or any entry
+    read from it is alive, even once the file itself has been replaced or
+    removed.
+    """
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            try:
+                self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                raise CatalogueFileError(f"{path} is not a catalogue file")
+        # Boards are slices of this view; they keep the mapping open while in use
+        self._view = memoryview(self._buffer)
+        self.path = path
+        if len(self._buffer) < _HEADER.size:
+            raise CatalogueFileError(f"{path} is not a catalogue file")
+        (magic, version, self.count, digest, source_mtime, source_size, self._records, self._names,
+         self._boards, self._clues, end) = _HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            raise CatalogueFileError(f"{path} is not a catalogue file")
+        if version != FORMAT_VERSION:
+            raise CatalogueFileError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+        if (end != len(self._buffer) or not self._records <= self._names <= self._boards <= self._clues <= end
+                or self._names - self._records != _RECORD.size * self.count):
+            raise CatalogueFileError(f"{path} is truncated or corrupt")
+        self.version = version
+        self.digest = digest.hex()
+        # (st_mtime_ns, st_size) of the compiled catalogue, as in snapshot.Fingerprint
+        self.source_fingerprint = (source_mtime, source_size) if source_mtime >= 0 else None
+
+    def _board(self, width: int, height: int, offset: int) -> PackedBoard:
+        start = self._boards + offset
+        return PackedBoard(width, height, self._view[start:start + PackedBoard.row_bytes(width) * height])
+
+    def entries(self) -> Dict[str, CatalogueEntry]:
+        """
+        The catalogue, with boards viewed in the mapping whenever they are used.
+        Raises CatalogueFileError when a record points outside its section.
+        """
+        buffer = self._buffer
+        clues = array(_CLUE_TYPECODE)
+        clues.frombytes(buffer[self._clues:len(buffer)])
+        if _SWAP_CLUES:  # pragma: no cover - big-endian hosts
+            clues.byteswap()
+        # Slicing a list is much cheaper than converting many small array slices
+        clue_values = clues.tolist()
+        names = buffer[self._names:self._boards]
+        board_bytes = self._clues - self._boards
+
+        entries: Dict[str, CatalogueEntry] = {}
+        for (name_offset, name_length, width, height, board_offset, clue_offset, clue_length, row_clues,
+             score, passes, probes, branches, depth, level, settled) in _RECORD.iter_unpack(buffer[self._records:self._names]):
+            if (name_offset + name_length > len(names) or clue_offset + clue_length > len(clue_values)
+                    or board_offset + PackedBoard.row_bytes(width) * height > board_bytes or level >= len(DIFFICULTY_LEVELS)):
+                raise CatalogueFileError(f"{self.path} is truncated or corrupt")
+            name = names[name_offset:name_offset + name_length].decode("utf-8")
+            descriptors = _unflatten_clues(clue_values, clue_offset, clue_offset + clue_length, row_clues)
+            difficulty: Optional[Difficulty] = None
+            if score >= 0:
+                difficulty = Difficulty(score, DIFFICULTY_LEVELS[level], passes, probes, branches, depth, bool(settled))
+            entries[name] = CatalogueEntry(
+                None, descriptors, loader=partial(self._board, width, height, board_offset),
+                width=width, height=height, difficulty=difficulty, keep_board=False
+            )
+        return entries
+
+
+def _unflatten_clues(values: List[int], start: int, end: int, rows: int) -> Dict[str, List[List[int]]]:
+    lines: List[List[int]] = []
+    position = start
+    while position < end:
+        following = position + 1 + values[position]
+        lines.append(values[position + 1:following])
+        position = following
+    if position != end or rows > len(lines):
+        raise CatalogueFileError("The clues of a puzzle are corrupt")
+    return {"rows": lines[:rows], "columns": lines[rows:]}
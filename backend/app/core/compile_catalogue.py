@@ -0,0 +1,66 @@
+"""
+Compile a JSON data file into a catalogue file (see catalogue_file).
+
+JsonFileStore maps the compiled file instead of reading the JSON, as long
+as the JSON has not changed since it was compiled, so startup and reloads
+skip parsing the JSON and analysing difficulties. Run from the backend
+directory after changing the data file:
+
+    python -m app.core.compile_catalogue
+    python -m app.core.compile_catalogue path/to/catalogue.json --output catalogue.bin
+"""
+import argparse
+import logging
+import sys
+import time
+from typing import List, Optional
+
+from .catalogue_file import write_catalogue_file
+from .difficulty import analyze_missing
+from .storage import DEFAULT_JSON_PATH, JsonFileStore, StoreError, compiled_path_for
+
+logger = logging.getLogger(__name__)
+
+
+def compile_catalogue(json_file_path: str, output_path: Optional[str] = None, analyze_difficulty: bool = True) -> int:
+    """
+    Compile `json_file_path` to `output_path` (by default where
+    JsonFileStore looks for it) and return the number of puzzles. With
+    `analyze_difficulty` puzzles without a stored difficulty are analysed
+    first, so loading the compiled file has none left to analyse.
+    Raises StoreError when the JSON cannot be read and ValueError for
+    puzzles the format cannot hold.
+    """
+    store = JsonFileStore(json_file_path, compiled=False)
+    fingerprint = store.fingerprint()
+    if fingerprint is None:
+        raise StoreError(f"JSON file not found at {json_file_path}")
+    contents = store.load()
+    if analyze_difficulty:
+        analyze_missing(contents.entries)
+    write_catalogue_file(output_path or compiled_path_for(json_file_path), contents.entries, contents.digest,
+                         contents.fingerprint)
+    return len(contents.entries)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("json_file", nargs="?", default=DEFAULT_JSON_PATH, help="JSON data file to compile")
+    parser.add_argument("--output", help="Catalogue file to write (default: the JSON file's name with .bin)")
+    parser.add_argument("--no-difficulty", action="store_true", help="Do not analyse puzzles without a difficulty")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    output = args.output or compiled_path_for(args.json_file)
+    started = time.perf_counter()
+    try:
+        count = compile_catalogue(args.json_file, output, analyze_difficulty=not args.no_difficulty)
+    except (StoreError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Compiled {count} puzzles to {output} in {time.perf_counter() - started:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Co-operative play: several players solving one puzzle on a shared board.
+
+A session is one board of one puzzle. Its cells are a bit-packed tri-state
+grid, two bits per cell (UNKNOWN, FILLED or CROSSED, four cells to a byte,
+row-major), which is also the form in which the board is sent to joining
+players. Filled cells are mirrored in a PlayState (see app.core.play), so
+a change re-examines only the rows and columns it touches and completion
+is known without comparing boards.
+
+Changes are applied as they arrive and collected until the session is
+flushed: one delta then carries every cell changed since the previous
+delta, with the last value of each, so a burst of moves (a drag across a
+row, several players at once) goes out as one message.
+
+Sessions are held per process in activity order. Sessions idle for
+COOP_IDLE_SECONDS are evicted, and once COOP_SESSIONS are held a new one
+replaces the least recently active session without players, so memory is
+bounded by the number of sessions times their board size; the clues of a
+puzzle are normalised once and shared by all its sessions. This module
+holds the state only; app.api.coop runs the WebSocket side.
+"""
+import base64
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from .play import LINE_STATUSES, PlayState, normalize_clues
+from .solver import Clue
+
+# Sessions kept per process, players per session and seconds without activity before a session is evicted
+COOP_SESSIONS = int(os.environ.get("NONOGRAM_COOP_SESSIONS", 5000))
+COOP_PLAYERS = int(os.environ.get("NONOGRAM_COOP_PLAYERS", 16))
+COOP_IDLE_SECONDS = float(os.environ.get("NONOGRAM_COOP_IDLE_SECONDS", 900))
+# Changes arriving within this window are broadcast as one delta
+COOP_COALESCE_MS = int(os.environ.get("NONOGRAM_COOP_COALESCE_MS", 50))
+
+UNKNOWN, FILLED, CROSSED = 0, 1, 2
+CELL_STATES = (UNKNOWN, FILLED, CROSSED)
+
+# Line statuses travel as their index in LINE_STATUSES
+_STATUS_CODES = {status: code for code, status in enumerate(LINE_STATUSES)}
+
+
+class CoopSessionsFull(Exception):
+    """Raised when a new session is needed but every session held has players"""
+
+
+class TriStateGrid:
+    """Cells of a board in play, two bits each, four to a byte, row-major"""
+    __slots__ = ("width", "height", "cells")
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.cells = bytearray((width * height + 3) // 4)
+
+    def __len__(self) -> int:
+        return self.width * self.height
+
+    def get(self, index: int) -> int:
+        return self.cells[index >> 2] >> ((index & 3) << 1) & 3
+
+    def set(self, index: int, state: int) -> int:
+        """Set a cell and return its previous state"""
+        shift = (index & 3) << 1
+        byte = self.cells[index >> 2]
+        self.cells[index >> 2] = byte & ~(3 << shift) | state << shift
+        return byte >> shift & 3
+
+    def encode(self) -> str:
+        """The packed cells in base64"""
+        return base64.b64encode(bytes(self.cells)).decode("ascii")
+
+
+class CoopSession:
+    """
+    One shared board of one puzzle: its cells, their line statuses, the
+    changes not yet broadcast and the players connected to it. Players are
+    opaque to the session; the caller adds and removes them.
+    """
+    __slots__ = ("name", "session_id", "grid", "play", "players", "pending", "pending_lines", "seq", "last_active")
+
+    def __init__(self, name: str, session_id: str, descriptors: Dict[str, List[List[int]]], now: float,
+                 clues: Optional[List[Clue]] = None):
+        self.name = name
+        self.session_id = session_id
+        self.players: Set[Any] = set()
+        self.seq = 0
+        self.last_active = now
+        self.reset(descriptors, clues)
+
+    @property
+    def descriptors(self) -> Dict[str, List[List[int]]]:
+        return self.play.descriptors
+
+    def reset(self, descriptors: Dict[str, List[List[int]]], clues: Optional[List[Clue]] = None) -> None:
+        """Start over with an empty board, e.g. for a puzzle that was replaced"""
+        self.play = PlayState(self.name, descriptors, clues=clues)
+        self.grid = TriStateGrid(self.play.width, self.play.height)
+        self.pending: Dict[int, int] = {}
+        self.pending_lines: Set[int] = set()
+
+    def apply(self, cells: Sequence[int]) -> None:
+        """
+        Set cells given as a flat [index, state, index, state, ...] list,
+        with index = row * width + column. Raises ValueError for a malformed
+        list, an index outside the board or an unknown state, before
+        changing anything.
+        """
+        if not isinstance(cells, list) or len(cells) % 2:
+            raise ValueError("Expected cells as a flat [index, state, ...] list")
+        size = len(self.grid)
+        if len(cells) > 2 * size:
+            raise ValueError(f"More changes than the {size} cells of the board")
+        for i in range(0, len(cells), 2):
+            index, state = cells[i], cells[i + 1]
+            # bool is an int subclass; neither true nor false names a cell or a state
+            if type(index) is not int or not 0 <= index < size:
+                raise ValueError(f"Cell {index!r} is outside the {self.grid.width}x{self.grid.height} board")
+            if type(state) is not int or state not in CELL_STATES:
+                raise ValueError(f"Unknown cell state {state!r}; expected one of {list(CELL_STATES)}")
+
+        width = self.grid.width
+        filled: List[Tuple[int, int, bool]] = []
+        for i in range(0, len(cells), 2):
+            index, state = cells[i], cells[i + 1]
+            previous = self.grid.set(index, state)
+            if previous == state:
+                continue
+            self.pending[index] = state
+            if (previous == FILLED) != (state == FILLED):
+                row, column = divmod(index, width)
+                filled.append((row, column, state == FILLED))
+        if filled:
+            self.pending_lines.update(self.play.apply(filled))
+
+    def _counts(self) -> Dict[str, Any]:
+        return {
+            "satisfied": self.play.counts["satisfied"],
+            "contradicted": self.play.counts["contradicted"],
+            "complete": self.play.complete,
+        }
+
+    def take_delta(self) -> Optional[Dict[str, Any]]:
+        """
+        The delta message for the changes since the previous one, or None if
+        there are none: changed cells and re-examined lines, both as flat
+        [index, value, ...] lists, and the line counts after them.
+        """
+        if not self.pending:
+            return None
+        self.seq += 1
+        cells: List[int] = []
+        for index, state in self.pending.items():
+            cells += (index, state)
+        lines: List[int] = []
+        for index in sorted(self.pending_lines):
+            lines += (index, _STATUS_CODES[self.play.status[index]])
+        self.pending = {}
+        self.pending_lines = set()
+        return {"type": "delta", "seq": self.seq, "cells": cells, "lines": lines, **self._counts()}
+
+    def state(self) -> Dict[str, Any]:
+        """
+        The full state message for a joining player. It includes changes not
+        yet broadcast, which the next delta repeats.
+        """
+        return {
+            "type": "state",
+            "name": self.name,
+            "session": self.session_id,
+            "width": self.grid.width,
+            "height": self.grid.height,
+            "seq": self.seq,
+            "cells": self.grid.encode(),
+            "lines": [_STATUS_CODES[status] for status in self.play.status],
+            "players": len(self.players),
+            **self._counts(),
+        }
+
+
+class CoopSessions:
+    """
+    Sessions keyed by puzzle name and session id, least recently active
+    first.
+    """
+    def __init__(self, max_sessions: int = COOP_SESSIONS, idle_seconds: float = COOP_IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[Tuple[str, str], CoopSession]" = OrderedDict()
+        # Per puzzle: the descriptors, their normalised clues and the number of sessions sharing them
+        self._clues: Dict[str, List[Any]] = {}
+
+    def join(self, name: str, session_id: str, descriptors: Dict[str, List[List[int]]],
+             now: float) -> Tuple[CoopSession, bool]:
+        """
+        The session `session_id` of puzzle `name`, created if needed, and
+        whether it was reset because the puzzle's clues changed since it
+        started. Raises CoopSessionsFull when a session has to be created
+        while every one held has players.
+        """
+        key = (name, session_id)
+        session = self._sessions.get(key)
+        if session is not None:
+            self.touch(session, now)
+            if session.descriptors is not descriptors and session.descriptors != descriptors:
+                self._release(session)
+                session.reset(descriptors, self._share_clues(name, descriptors))
+                return session, True
+            return session, False
+        if len(self._sessions) >= self.max_sessions:
+            self._evict_one()
+        session = CoopSession(name, session_id, descriptors, now, self._share_clues(name, descriptors))
+        self._sessions[key] = session
+        return session, False
+
+    def _share_clues(self, name: str, descriptors: Dict[str, List[List[int]]]) -> List[Clue]:
+        shared = self._clues.get(name)
+        if shared is None or (shared[0] is not descriptors and shared[0] != descriptors):
+            # A replaced puzzle: sessions still on the old clues keep their own reference
+            shared = self._clues[name] = [descriptors, normalize_clues(descriptors), 0]
+        shared[2] += 1
+        return shared[1]
+
+    def _release(self, session: CoopSession) -> None:
+        shared = self._clues.get(session.name)
+        if shared is not None and shared[1] is session.play.clues:
+            shared[2] -= 1
+            if shared[2] == 0:
+                del self._clues[session.name]
+
+    def _remove(self, key: Tuple[str, str]) -> CoopSession:
+        session = self._sessions.pop(key)
+        self._release(session)
+        return session
+
+    def _evict_one(self) -> None:
+        for key, session in self._sessions.items():
+            if not session.players:
+                self._remove(key)
+                return
+        raise CoopSessionsFull(f"All {self.max_sessions} co-op sessions are in use")
+
+    def touch(self, session: CoopSession, now: float) -> None:
+        """Mark a session active, unless it was evicted meanwhile"""
+        session.last_active = now
+        key = (session.name, session.session_id)
+        if self._sessions.get(key) is session:
+            self._sessions.move_to_end(key)
+
+    def evict_idle(self, now: float) -> List[CoopSession]:
+        """Remove and return the sessions inactive for idle_seconds; their players are the caller's to close"""
+        evicted = []
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session.last_active < self.idle_seconds:
+                break
+            evicted.append(self._remove(key))
+        return evicted
+
+    def players(self) -> int:
+        return sum(len(session.players) for session in list(self._sessions.values()))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
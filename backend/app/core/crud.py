@@ -1,182 +1,381 @@
-import json
-import os
+import logging
+import threading
 import time
+from functools import partial
 from typing import List, Dict, Optional, Tuple, Any
-from .models import Nonogram, NonogramCreate
+from . import descriptors as descriptor_engine
+from . import jobs
+from . import metrics
+from .bitboard import PackedBoard
+from .difficulty import Difficulty, analyze, analyze_difficulty_from_env, analyze_missing, level_scores
+from .models import (
+    CellChange, Nonogram, NonogramCheckResult, NonogramCreate, NonogramCreateResult, NonogramLineCheck, NonogramNeighbour
+)
+from .play import CheckSessions, PlayState, UnknownBoardError
+from .reload import ReloadStrategy, reload_strategy_from_env
+from .index import Clue
+from .query import parse_query, run_query
+from .similarity import DuplicateNonogramError, near_duplicate_ratio_from_env
+from .snapshot import CachedNonogram, CachedResponse, CatalogueEntry, CatalogueSnapshot
+from .storage import DEFAULT_JSON_PATH, JsonFileStore, NonogramStore, StoreError, store_from_env
+
+logger = logging.getLogger(__name__)
 
 
 class NonogramDataManager:
     """
     Class for managing nonogram data operations with caching.
+    The catalogue is held in an immutable snapshot that is swapped as a whole
+    on reload; the reload strategy decides when the store is checked and the
+    store decides whether a reload can be applied incrementally.
+    Saving a board within `near_duplicate_ratio` of an existing one of the
+    same size (or with the same clues) is refused; a negative ratio allows
+    duplicates.
+    With `analyze_difficulty`, puzzles loaded without a stored difficulty
+    are analysed before they are published and the results handed back to
+    the store to persist. It defaults to NONOGRAM_DIFFICULTY, and otherwise
+    to whether the store persists analyses: a store that does not would
+    have every worker analyse the same puzzles again on every start (the
+    compiled catalogue carries them instead). Saved puzzles are always
+    analysed.
     """
-    def __init__(self, json_file_path: str, cache_ttl: int = 300):
-        self.json_file_path = json_file_path
-        self._data = {}
-        self._last_load_time = 0
-        self._cache_ttl = cache_ttl  # Cache time-to-live in seconds
-        self._load_data()
-    
-    def _load_data(self) -> None:
-        """Load nonogram data from the JSON file with cache validation"""
-        current_time = time.time()
-        
-        # Check if file has been modified since last load
-        file_modified = False
-        if os.path.exists(self.json_file_path):
-            file_mtime = os.path.getmtime(self.json_file_path)
-            if file_mtime > self._last_load_time:
-                file_modified = True
+    def __init__(self, json_file_path: Optional[str] = None, reload_strategy: Optional[ReloadStrategy] = None,
+                 store: Optional[NonogramStore] = None, near_duplicate_ratio: Optional[float] = None,
+                 analyze_difficulty: Optional[bool] = None):
+        self.store = store or JsonFileStore(json_file_path)
+        self.near_duplicate_ratio = near_duplicate_ratio_from_env() if near_duplicate_ratio is None else near_duplicate_ratio
+        if analyze_difficulty is None:
+            analyze_difficulty = analyze_difficulty_from_env()
+        self.analyze_difficulty = self.store.persists_difficulties if analyze_difficulty is None else analyze_difficulty
+        self.check_sessions = CheckSessions()
+        self._snapshot = CatalogueSnapshot.build({})
+        self._refresh_lock = threading.Lock()
+        self.refresh()
+        self._reload_strategy = reload_strategy or reload_strategy_from_env()
+        self._reload_strategy.attach(self)
+    
+    @property
+    def read_only(self) -> bool:
+        """Whether the store rejects writes"""
+        return self.store.read_only
+    
+    def refresh(self) -> bool:
+        """
+        Reload the catalogue if the store changed since the current snapshot was built.
+        Returns True when a new snapshot was installed.
+        """
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> bool:
+        """refresh() for callers holding _refresh_lock"""
+        try:
+            fingerprint = self.store.fingerprint()
+        except StoreError as e:
+            logger.error("Error checking nonogram store: %s", e)
+            return False
+        # Version 0 is the empty placeholder installed before the first load
+        if self._snapshot.version > 0 and fingerprint == self._snapshot.fingerprint:
+            return False
+        return self._load_data()
+    
+    def _load_data(self) -> bool:
+        """Apply the store's changes, or load it in full, into a new snapshot and swap it in"""
+        snapshot = self._snapshot
+        version = snapshot.version + 1
+        started = time.perf_counter()
+        try:
+            changes = self.store.changes_since(snapshot.fingerprint) if snapshot.version > 0 else None
+            if changes is None:
+                contents = self.store.load()
+        except StoreError as e:
+            logger.error("Error: %s", e)
+            metrics.reload_errors.inc()
+            # Keep the old data if the store cannot be read
+            return False
+        except Exception as e:
+            logger.exception("Error loading data: %s", e)
+            metrics.reload_errors.inc()
+            # Keep the old data if there's an error
+            return False
         
-        # If cache is expired or file has been modified, reload data
-        if (current_time - self._last_load_time > self._cache_ttl) or file_modified:
-            if os.path.exists(self.json_file_path):
-                try:
-                    with open(self.json_file_path, 'r') as f:
-                        self._data = json.load(f)
-                    self._last_load_time = current_time
-                except json.JSONDecodeError:
-                    print(f"Error: Could not parse JSON from {self.json_file_path}")
-                    # Keep the old data if JSON is invalid
-                except Exception as e:
-                    print(f"Error loading data: {str(e)}")
-                    # Keep the old data if there's an error
-            else:
-                print(f"Warning: JSON file not found at {self.json_file_path}")
-                self._data = {}
-                self._last_load_time = current_time
+        self._annotate(changes.upserts if changes is not None else contents.entries)
+        # Build the new snapshot (and its search index) before publishing it
+        if changes is not None:
+            self._snapshot = snapshot.with_changes(
+                changes.upserts, changes.deletes, changes.fingerprint, version, changes.digest
+            )
+        else:
+            self._snapshot = CatalogueSnapshot.from_entries(
+                contents.entries, contents.fingerprint, version, contents.digest
+            )
+        kind = "incremental" if changes is not None else "full"
+        metrics.reloads.inc(kind)
+        metrics.reload_duration.observe(time.perf_counter() - started, kind)
+        return True
+    
+    def _annotate(self, entries: Dict[str, CatalogueEntry]) -> None:
+        """Analyse the difficulty of loaded entries that have none and persist the results"""
+        if not self.analyze_difficulty:
+            return
+        analysed = analyze_missing(entries)
+        if analysed and not self.read_only:
+            try:
+                self.store.save_difficulties(analysed)
+            except StoreError as e:
+                # Still served from memory; the next load analyses them again
+                logger.warning("Could not store puzzle difficulties: %s", e)
+
+    @staticmethod
+    def _difficulty(name: str, descriptors: Dict[str, List[List[int]]]) -> Optional[Difficulty]:
+        try:
+            return analyze(descriptors)
+        except ValueError as e:
+            logger.warning("Could not analyse the difficulty of %s: %s", name, e)
+            return None
+
+    def _current(self) -> CatalogueSnapshot:
+        """Snapshot to serve the current request from"""
+        self._reload_strategy.on_access(self)
+        return self._snapshot
+    
+    def close(self) -> None:
+        """Stop any background reload work and close the store"""
+        self._reload_strategy.close()
+        self.store.close()
     
     def get_all_names(self) -> List[str]:
         """Get a list of all nonogram names"""
-        # Ensure data is fresh
-        self._load_data()
-        return list(self._data.keys())
+        return list(self._current().data.keys())
     
     def get_by_name(self, name: str) -> Optional[Nonogram]:
         """Get a nonogram by name"""
-        # Ensure data is fresh
-        self._load_data()
-        
-        if name in self._data:
-            try:
-                return Nonogram(
-                    name=name,
-                    board=self._data[name].get("board", []),
-                    descriptors=self._data[name].get("descriptors", {})
-                )
-            except Exception as e:
-                print(f"Error creating Nonogram object for {name}: {str(e)}")
-                return None
-        return None
+        cached = self.get_cached(name)
+        return cached.model if cached is not None else None
     
-    def search_by_clue(self, clue_query: str) -> List[str]:
+    def get_descriptors(self, name: str) -> Optional[Dict[str, List[List[int]]]]:
+        """Get the clues of a nonogram by name, as held by the current snapshot"""
+        entry = self._current().data.get(name)
+        return entry.descriptors if entry is not None else None
+
+    def get_cached(self, name: str) -> Optional[CachedNonogram]:
+        """Get a nonogram by name together with its pre-encoded response body"""
+        try:
+            return self._current().get_cached(name)
+        except Exception as e:
+            logger.error("Error creating Nonogram object for %s: %s", name, e)
+            return None
+    
+    def get_compact(self, name: str, encoding: str) -> Optional[CachedResponse]:
+        """Get a nonogram encoded with a compact board (see COMPACT_ENCODINGS)"""
+        return self._current().get_compact(name, encoding)
+    
+    def get_batch_body(self, names: List[str]) -> bytes:
+        """Get the encoded batch result for many names, all from one snapshot"""
+        return self._current().batch_body(names)
+    
+    def get_list_response(self) -> CachedResponse:
+        """Get the encoded list of all nonogram names"""
+        return self._current().list_response()
+    
+    def get_list_page(self, prefix: str = "", cursor: Optional[str] = None, limit: Optional[int] = None,
+                      fields: Tuple[str, ...] = (), sort: str = "name", min_difficulty: Optional[str] = None,
+                      max_difficulty: Optional[str] = None) -> CachedResponse:
         """
-        Search for nonograms with matching clues.
+        Get an encoded page of nonogram names in name order or from easiest
+        to hardest (sort="difficulty"), optionally restricted to a prefix
+        and a band of difficulty levels, and with per-puzzle metadata.
+        Raises ValueError for a malformed cursor or one of another sort.
+        """
+        difficulty = (
+            level_scores(min_difficulty)[0] if min_difficulty else None,
+            level_scores(max_difficulty)[1] if max_difficulty else None
+        )
+        return self._current().list_page(prefix, cursor, limit, fields, sort, difficulty)
+    
+    @staticmethod
+    def _parse_clue(clue_query: str) -> Optional[Clue]:
+        """
+        Parse a clue query into a tuple of integers.
         The clue_query format should be numbers separated by spaces or commas.
         """
-        # Ensure data is fresh
-        self._load_data()
-        
-        matches = []
-        # Parse the query into a list of integers
         try:
             # Handle both comma and space separated values
-            clue = [int(x.strip()) for x in clue_query.replace(',', ' ').split() if x.strip()]
+            return tuple(int(x.strip()) for x in clue_query.replace(',', ' ').split() if x.strip())
         except ValueError:
+            return None
+    
+    def search_by_clue(self, clue_query: str) -> List[str]:
+        """
+        Search for nonograms with matching clues.
+        The clue_query format should be numbers separated by spaces or commas.
+        """
+        clue = self._parse_clue(clue_query)
+        if clue is None:
             # If the query can't be parsed, return empty list
             return []
         
-        # Search through all nonograms
-        for name, data in self._data.items():
-            descriptors = data.get("descriptors", {})
-            
-            # Search in row descriptors
-            row_descriptors = descriptors.get("rows", [])
-            for row in row_descriptors:
-                if row == clue:
-                    matches.append(name)
-                    break
-            
-            # If already matched, skip searching columns
-            if name in matches:
-                continue
-            
-            # Search in column descriptors
-            col_descriptors = descriptors.get("columns", [])
-            for col in col_descriptors:
-                if col == clue:
-                    matches.append(name)
-                    break
-        
-        return matches
+        # Single lookup in the row and column postings
+        return self._current().clue_index.lookup(clue)
+    
+    def get_search_response(self, clue_query: str, sort: str = "catalogue") -> CachedResponse:
+        """Get the encoded search result for a clue query, in catalogue or difficulty order"""
+        return self._current().search_response(self._parse_clue(clue_query), sort)
+    
+    def search(self, query: str) -> List[str]:
+        """
+        Search with the query language of app.core.query, e.g.
+        "row:*,3,1,* size:15x15". Raises ValueError for invalid queries.
+        """
+        return run_query(self._current().clue_index, parse_query(query))
+    
+    def get_query_response(self, query: str, sort: str = "catalogue") -> CachedResponse:
+        """
+        Get the encoded search result for a query, in catalogue or
+        difficulty order; raises ValueError for invalid queries
+        """
+        return self._current().query_response(parse_query(query), sort)
+    
+    def find_similar(self, name: Optional[str] = None, board: Optional[List[List[bool]]] = None,
+                     k: int = 10, metric: str = "board") -> Optional[List[NonogramNeighbour]]:
+        """
+        The k nearest puzzles of the same size to a stored puzzle or a board,
+        nearest first. Returns None if the named puzzle does not exist and
+        raises ValueError for a board that is not rectangular.
+        """
+        snapshot = self._current()
+        if name is not None:
+            cached = snapshot.get_cached(name)
+            if cached is None:
+                return None
+            board, descriptors = cached.model.board, cached.model.descriptors
+        else:
+            descriptors = descriptor_engine.calculate_descriptors(board)
+        packed = PackedBoard.from_rows(board)
+        size = packed.width * packed.height if metric == "board" else packed.width + packed.height
+        return [
+            NonogramNeighbour(name=match.name, distance=match.distance, similarity=round(1 - match.distance / size, 4) if size else 1.0)
+            for match in snapshot.similarity_index().nearest(packed, descriptors, k, metric, exclude=name)
+        ]
+    
+    def check_board(self, name: str, changes: List[CellChange], session: Optional[str] = None,
+                    board_hash: Optional[str] = None,
+                    board: Optional[List[List[bool]]] = None) -> Optional[NonogramCheckResult]:
+        """
+        Apply changed cells to the board of a check session (see
+        app.core.play), or to a new one started from `board`, and report
+        the lines they touched. Returns None if the puzzle does not exist.
+        Raises UnknownBoardError for a session this process does not hold,
+        one started before the puzzle was replaced or whose board is not at
+        `board_hash`, and ValueError for cells or boards that do not fit
+        the puzzle.
+        """
+        entry = self._current().data.get(name)
+        if entry is None:
+            return None
+        cells = [(change.row, change.col, change.filled) for change in changes]
+        if session is not None:
+            state = self.check_sessions.take(name, session, board_hash)
+            if state.descriptors is not entry.descriptors and state.descriptors != entry.descriptors:
+                raise UnknownBoardError(f"Nonogram '{name}' changed since the board was started; send the full board")
+            try:
+                lines = state.apply(cells)
+            finally:
+                # Cells are validated before any is changed, so a refused check leaves the board as it was
+                self.check_sessions.put(state)
+        else:
+            state = PlayState(name, entry.descriptors, board)
+            state.apply(cells)
+            lines = state.all_lines()
+            self.check_sessions.put(state)
+        checks = []
+        for index in lines:
+            axis, position, clue = state.line(index)
+            checks.append(NonogramLineCheck(axis=axis, index=position, status=state.status[index], clue=clue))
+        return NonogramCheckResult(
+            session=state.session,
+            board_hash=state.board_hash,
+            complete=state.complete,
+            satisfied=state.counts["satisfied"],
+            contradicted=state.counts["contradicted"],
+            lines=checks
+        )
     
     @staticmethod
     def calculate_descriptors(board: List[List[bool]]) -> Dict[str, List[List[int]]]:
         """Calculate row and column descriptors from a board"""
-        if not board or not board[0]:
-            return {"rows": [], "columns": []}
-        
-        rows = len(board)
-        cols = len(board[0])
-        
-        # Calculate row descriptors
-        row_descriptors = []
-        for r in range(rows):
-            row_desc = []
-            count = 0
-            for c in range(cols):
-                if board[r][c]:  # If cell is filled
-                    count += 1
-                elif count > 0:  # If we have a filled sequence that just ended
-                    row_desc.append(count)
-                    count = 0
-            
-            # Handle case where sequence continues to the end of the row
-            if count > 0:
-                row_desc.append(count)
-            
-            # If row is empty, add a 0
-            if not row_desc:
-                row_desc = [0]
-                
-            row_descriptors.append(row_desc)
-        
-        # Calculate column descriptors
-        col_descriptors = []
-        for c in range(cols):
-            col_desc = []
-            count = 0
-            for r in range(rows):
-                if board[r][c]:  # If cell is filled
-                    count += 1
-                elif count > 0:  # If we have a filled sequence that just ended
-                    col_desc.append(count)
-                    count = 0
-            
-            # Handle case where sequence continues to the end of the column
-            if count > 0:
-                col_desc.append(count)
-            
-            # If column is empty, add a 0
-            if not col_desc:
-                col_desc = [0]
-                
-            col_descriptors.append(col_desc)
-        
-        return {
-            "rows": row_descriptors,
-            "columns": col_descriptors
-        }
-    
-    def create_nonogram(self, nonogram: NonogramCreate) -> Nonogram:
-        """Create a new nonogram with calculated descriptors"""
-        descriptors = self.calculate_descriptors(nonogram.board)
-        
-        # For now, just create the object without saving to the data store
-        return Nonogram(
-            name=nonogram.name,
-            board=nonogram.board,
-            descriptors=descriptors
+        return descriptor_engine.calculate_descriptors(board)
+    
+    @staticmethod
+    def calculate_descriptors_batch(boards: List[List[List[bool]]]) -> List[Dict[str, List[List[int]]]]:
+        """Calculate row and column descriptors for many boards in one call"""
+        return descriptor_engine.calculate_descriptors_batch(boards)
+    
+    def create_nonogram(self, nonogram: NonogramCreate, validate: Optional[str] = None) -> NonogramCreateResult:
+        """
+        Create a new nonogram with calculated descriptors.
+        With validate="unique" the clues are checked to have a single
+        solution, within the solver's uniqueness budgets.
+        """
+        return jobs.create_nonogram(nonogram, validate)
+    
+    def save_nonogram(self, nonogram: Nonogram, overwrite: bool = False) -> bool:
+        """
+        Write a nonogram to the store and apply it to the current snapshot.
+        Returns True if it was created rather than replaced. Raises
+        ReadOnlyStoreError for read-only stores, NonogramExistsError when
+        the name is taken and `overwrite` is False, and DuplicateNonogramError
+        when another puzzle has the same clues or a nearly identical board.
+        """
+        entry = CatalogueEntry(PackedBoard.from_rows(nonogram.board), nonogram.descriptors)
+        if not self.read_only:
+            # Stored with the puzzle, so no worker has to analyse it again
+            entry.difficulty = self._difficulty(nonogram.name, entry.descriptors)
+        check = None
+        if not self.read_only and self.near_duplicate_ratio >= 0:
+            # Indexed up front, so the check run under the store's write lock only catches up on recent writes
+            self.refresh()
+            self._snapshot.similarity_index()
+            check = partial(self._reject_duplicate, nonogram.name, entry)
+        # Taken before the store's write lock, which refreshes take inside this one
+        with self._refresh_lock:
+            created = self.store.put(nonogram.name, entry, overwrite=overwrite, check=check)
+        # Picks up this write, and any other worker's, without a full reload
+        self.refresh()
+        return created
+    
+    def _reject_duplicate(self, name: str, entry: CatalogueEntry) -> None:
+        """
+        Raise DuplicateNonogramError if a puzzle other than `name` is a
+        duplicate of `entry`. Run by the store while it holds off other
+        writers, so the snapshot it brings up to date is the store as the
+        write will find it, whichever worker wrote last.
+        """
+        self._refresh()
+        cells = entry.width * entry.height
+        duplicate = self._snapshot.similarity_index().find_duplicate(
+            entry.board, entry.descriptors, int(cells * self.near_duplicate_ratio), exclude=name
         )
+        if duplicate is not None:
+            raise DuplicateNonogramError(name, *duplicate)
+
+    def delete_nonogram(self, name: str) -> bool:
+        """Delete a nonogram from the store; returns False if it did not exist"""
+        deleted = self.store.delete(name)
+        if deleted:
+            self.refresh()
+        return deleted
 
 # Create a singleton instance with the correct path
-data_manager = NonogramDataManager(os.path.join(os.path.dirname(__file__), "../data/nonogram-games.json")) 
\ No newline at end of file
+data_manager = NonogramDataManager(store=store_from_env(DEFAULT_JSON_PATH))
+
+# Catalogue size as seen by the current snapshot, read when metrics are rendered
+metrics.registry.gauge(
+    "nonogram_catalogue_puzzles", "Puzzles in the current snapshot", function=lambda: len(data_manager._snapshot.data)
+)
+metrics.registry.gauge(
+    "nonogram_snapshot_version", "Snapshots installed since startup", function=lambda: data_manager._snapshot.version
+)
+metrics.registry.gauge(
+    "nonogram_check_sessions", "Boards in play held for incremental checks", function=lambda: len(data_manager.check_sessions)
+)
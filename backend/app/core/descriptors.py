@@ -0,0 +1,138 @@
+from typing import Dict, Iterable, List, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is an optional speed-up
+    np = None
+
+from .bitboard import PackedBoard
+
+Descriptors = Dict[str, List[List[int]]]
+Board = Union[Sequence[Sequence[bool]], PackedBoard]
+
+# Below this many cells the per-call overhead of NumPy outweighs its speed.
+# List-of-lists boards pay an extra conversion, so they switch over later.
+VECTORIZE_MIN_CELLS = 400
+VECTORIZE_MIN_CELLS_LISTS = 1600
+
+
+def line_clue(line: Iterable[bool]) -> List[int]:
+    """Clue of a single line; an empty line is described as [0]"""
+    clue = []
+    count = 0
+    for cell in line:
+        if cell:
+            count += 1
+        elif count:
+            clue.append(count)
+            count = 0
+    if count:
+        clue.append(count)
+    return clue or [0]
+
+
+def _scalar_descriptors(board: Sequence[Sequence[bool]]) -> Descriptors:
+    """Pure-Python descriptors; columns are read through zip for locality"""
+    return {
+        "rows": [line_clue(row) for row in board],
+        "columns": [line_clue(column) for column in zip(*board)]
+    }
+
+
+def _line_runs(cells: "np.ndarray") -> List[List[int]]:
+    """
+    Clues of every row of a 2-D boolean array.
+    Run starts and ends are the +1/-1 steps of the zero-padded rows; the
+    padding keeps runs from crossing row boundaries in the flattened array.
+    """
+    lines, length = cells.shape
+    padded = np.zeros((lines, length + 2), dtype=np.int8)
+    padded[:, 1:-1] = cells
+    edges = np.diff(padded, axis=1)
+    flat = edges.ravel()
+    starts = np.flatnonzero(flat == 1)
+    lengths = (np.flatnonzero(flat == -1) - starts).tolist()
+    counts = np.count_nonzero(edges == 1, axis=1).tolist()
+
+    clues = []
+    offset = 0
+    for count in counts:
+        clues.append(lengths[offset:offset + count] or [0])
+        offset += count
+    return clues
+
+
+def _to_array(board: Board) -> "np.ndarray":
+    """Boolean (height, width) array of a board"""
+    if isinstance(board, PackedBoard):
+        bits = np.unpackbits(np.frombuffer(board.bits, dtype=np.uint8))
+        return bits.reshape(board.height, -1)[:, :board.width].astype(bool)
+    # bytes() of a list of booleans is one 0/1 byte per cell
+    flat = np.frombuffer(b"".join(map(bytes, board)), dtype=np.uint8)
+    return flat.reshape(len(board), -1).astype(bool)
+
+
+def _board_shape(board: Board):
+    """(height, width) of a board, rejecting ragged list-of-lists boards"""
+    if isinstance(board, PackedBoard):
+        return board.height, board.width
+    width = len(board[0]) if board else 0
+    if any(len(row) != width for row in board):
+        raise ValueError("All rows of a board must have the same length")
+    return len(board), width
+
+
+def calculate_descriptors(board: Board) -> Descriptors:
+    """
+    Calculate row and column descriptors from a list-of-lists or packed board.
+    Large boards are processed with NumPy run detection when it is installed.
+    """
+    height, width = _board_shape(board)
+    if not height or not width:
+        return {"rows": [], "columns": []}
+
+    packed = isinstance(board, PackedBoard)
+    threshold = VECTORIZE_MIN_CELLS if packed else VECTORIZE_MIN_CELLS_LISTS
+    if np is not None and height * width >= threshold:
+        cells = _to_array(board)
+        return {"rows": _line_runs(cells), "columns": _line_runs(cells.T)}
+
+    if packed:
+        board = board.to_rows()
+    return _scalar_descriptors(board)
+
+
+def calculate_descriptors_batch(boards: Iterable[Board]) -> List[Descriptors]:
+    """
+    Calculate descriptors for many boards in one call.
+    With NumPy, boards of the same shape are stacked and their rows and
+    columns handled in a single vectorized pass.
+    """
+    boards = list(boards)
+    if np is None:
+        return [calculate_descriptors(board) for board in boards]
+
+    results: List[Descriptors] = [None] * len(boards)
+    groups: Dict[tuple, List[int]] = {}
+    for position, board in enumerate(boards):
+        groups.setdefault(_board_shape(board), []).append(position)
+
+    for (height, width), positions in groups.items():
+        if not height or not width:
+            for position in positions:
+                results[position] = {"rows": [], "columns": []}
+            continue
+        if len(positions) * height * width < VECTORIZE_MIN_CELLS:
+            for position in positions:
+                results[position] = calculate_descriptors(boards[position])
+            continue
+
+        stack = np.stack([_to_array(boards[position]) for position in positions])
+        rows = _line_runs(stack.reshape(-1, width))
+        columns = _line_runs(stack.transpose(0, 2, 1).reshape(-1, height))
+        for i, position in enumerate(positions):
+            results[position] = {
+                "rows": rows[i * height:(i + 1) * height],
+                "columns": columns[i * width:(i + 1) * width]
+            }
+    return results
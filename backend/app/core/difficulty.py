@@ -0,0 +1,162 @@
+"""
+Difficulty of a nonogram, measured from its clues by the solver.
+
+The analyzer solves the clues (looking for a second solution as well, as a
+player must rule one out) and records what that needed:
+
+- passes: line solves, in units of one sweep over every row and column;
+- probes: cells tentatively set to find a contradiction;
+- branches and depth: guesses made by backtracking and how deeply they nest.
+
+The level is "easy" when line solving alone settles the puzzle, "medium"
+when it also takes probing and "hard" when it takes guessing, or more than
+the analysis budget. The score refines the level into a sortable number:
+each level has its own band of LEVEL_SPAN scores, so ordering by score
+never contradicts the level.
+
+Results are computed once per puzzle when it is loaded or written, kept
+with the catalogue entry and persisted by stores that can (see
+NonogramStore.save_difficulties); identical clues share one analysis.
+"""
+import logging
+import math
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from . import solver
+from .solver import SolveStats
+
+logger = logging.getLogger(__name__)
+
+DIFFICULTY_LEVELS = ("easy", "medium", "hard")
+
+# Scores of one level lie in [rank * LEVEL_SPAN, (rank + 1) * LEVEL_SPAN)
+LEVEL_SPAN = 1000
+
+# Budget of one analysis; puzzles exceeding it are hard with the top score
+DIFFICULTY_NODE_LIMIT = int(os.environ.get("NONOGRAM_DIFFICULTY_NODE_LIMIT", 2000))
+DIFFICULTY_TIME_LIMIT = int(os.environ.get("NONOGRAM_DIFFICULTY_TIME_LIMIT_MS", 200)) / 1000.0
+
+# Distinct clue sets whose analysis is kept in memory
+ANALYSIS_CACHE_SIZE = 1 << 16
+
+
+class Difficulty(NamedTuple):
+    """Measured difficulty of one puzzle"""
+    score: int
+    level: str
+    passes: int
+    probes: int
+    branches: int
+    depth: int
+    # False when the budget ran out before the puzzle was settled
+    settled: bool = True
+
+    def to_json(self) -> Dict[str, Any]:
+        return self._asdict()
+
+    @classmethod
+    def from_json(cls, value: Dict[str, Any]) -> "Difficulty":
+        """Read a stored analysis; raises ValueError if it is malformed"""
+        try:
+            difficulty = cls(**value)
+        except TypeError as e:
+            raise ValueError(f"Invalid difficulty {value!r}: {e}")
+        if difficulty.level not in DIFFICULTY_LEVELS:
+            raise ValueError(f"Unknown difficulty level {difficulty.level!r}")
+        return difficulty
+
+
+def difficulty_level(stats: SolveStats, settled: bool = True) -> str:
+    """Difficulty level of a solver run; runs that hit the budget are hard"""
+    if not settled or stats.branches:
+        return "hard"
+    if stats.probes:
+        return "medium"
+    return "easy"
+
+
+def in_band(level: str, low: Optional[str], high: Optional[str]) -> bool:
+    """Whether a difficulty level lies within [low, high]; None leaves a side open"""
+    rank = DIFFICULTY_LEVELS.index(level)
+    if low is not None and rank < DIFFICULTY_LEVELS.index(low):
+        return False
+    return high is None or rank <= DIFFICULTY_LEVELS.index(high)
+
+
+def level_scores(level: str) -> Tuple[int, int]:
+    """Inclusive range of the scores of a level"""
+    rank = DIFFICULTY_LEVELS.index(level)
+    return rank * LEVEL_SPAN, (rank + 1) * LEVEL_SPAN - 1
+
+
+def from_stats(stats: SolveStats, lines: int, settled: bool = True) -> Difficulty:
+    """Difficulty of a solver run over `lines` rows and columns"""
+    passes = math.ceil(stats.line_solves / lines) if lines else 0
+    level = difficulty_level(stats, settled)
+    if not settled:
+        work = LEVEL_SPAN - 1
+    elif level == "hard":
+        work = stats.branches * max(1, stats.max_depth)
+    elif level == "medium":
+        work = stats.probes
+    else:
+        work = passes
+    score = DIFFICULTY_LEVELS.index(level) * LEVEL_SPAN + min(work, LEVEL_SPAN - 1)
+    return Difficulty(score, level, passes, stats.probes, stats.branches, stats.max_depth, settled)
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def _analyze(rows: Tuple[Tuple[int, ...], ...], columns: Tuple[Tuple[int, ...], ...]) -> Optional[Difficulty]:
+    descriptors = {"rows": [list(clue) for clue in rows], "columns": [list(clue) for clue in columns]}
+    result = solver.solve(descriptors, max_solutions=2, node_limit=DIFFICULTY_NODE_LIMIT,
+                          time_limit=DIFFICULTY_TIME_LIMIT)
+    if result.status == "unsolvable":
+        return None
+    # A search that ran out of budget says nothing about how hard the rest is
+    return from_stats(result.stats, len(rows) + len(columns), settled=result.exhausted or len(result.solutions) > 1)
+
+
+def analyze(descriptors: Dict[str, List[List[int]]]) -> Difficulty:
+    """
+    Measure the difficulty of a puzzle from its clues.
+    Raises ValueError for clues that cannot describe a grid or that no
+    grid satisfies.
+    """
+    rows = tuple(tuple(clue) for clue in descriptors.get("rows", []))
+    columns = tuple(tuple(clue) for clue in descriptors.get("columns", []))
+    difficulty = _analyze(rows, columns)
+    if difficulty is None:
+        raise ValueError("The clues have no solution")
+    return difficulty
+
+
+def analyze_missing(entries: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Analyse, in place, the catalogue entries that have no difficulty yet.
+    Returns the entries that got one; entries whose clues have no solution
+    are logged and left without.
+    """
+    analysed = {}
+    for name, entry in entries.items():
+        if entry.difficulty is None:
+            try:
+                entry.difficulty = analyze(entry.descriptors)
+            except ValueError as e:
+                logger.warning("Could not analyse the difficulty of %s: %s", name, e)
+                continue
+            analysed[name] = entry
+    return analysed
+
+
+def analyze_difficulty_from_env() -> Optional[bool]:
+    """
+    Whether puzzles without a stored difficulty are analysed at load time
+    (NONOGRAM_DIFFICULTY); None for "auto", the default, which leaves it to
+    whether the analyses can be kept.
+    """
+    value = os.environ.get("NONOGRAM_DIFFICULTY", "auto").lower()
+    if value == "auto":
+        return None
+    return value not in ("0", "false", "no")
@@ -0,0 +1,46 @@
+"""
+Wire encodings of response bodies: JSON serialisation and content codings.
+
+`dumps` uses orjson when it is installed and the standard library
+otherwise; both produce the compact JSON pydantic produces, so a body is
+the same bytes (and has the same ETag) whichever encoder made it.
+`compress` applies one of CONTENT_CODINGS: gzip always, brotli ("br") when
+the brotli package is installed.
+"""
+import gzip
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+# Content codings offered, best compression first
+CONTENT_CODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Levels for bodies compressed once and cached; cheap enough for cache misses on a Raspberry Pi
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON of plain Python values"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    """`body` in one of CONTENT_CODINGS; raises ValueError for other codings"""
+    if coding == "gzip":
+        # mtime=0 keeps the output, and so the cached bytes, deterministic
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+    if coding == "br" and brotli is not None:
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    raise ValueError(f"Unsupported content coding {coding!r}")
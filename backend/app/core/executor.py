@@ -0,0 +1,191 @@
+"""
+Executor layer for blocking work.
+
+Request handlers hand I/O-bound work to a thread pool and CPU-bound work
+(descriptor calculation, solving) to a process pool, so the event loop
+keeps serving other requests. Each pool admits a bounded number of jobs;
+when it is full the job is refused straight away with ExecutorSaturated,
+which the API turns into a 503 with Retry-After.
+"""
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Optional
+
+from . import metrics
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a pool already holds its maximum number of jobs"""
+    def __init__(self, pool: str, retry_after: int):
+        super().__init__(f"The {pool} pool is busy, retry in {retry_after}s")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class JobTimeout(Exception):
+    """Raised when a job does not finish within its timeout"""
+
+
+class CancelFlag:
+    """
+    A flag the server sets to stop jobs it no longer needs, polled by the
+    jobs themselves. It is held as a file that exists until the flag is
+    set, so copies pickled to worker processes see it too.
+    """
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix="nonogram-job-")
+        os.close(fd)
+        # Removed with the server's copy if it is dropped without being set
+        weakref.finalize(self, _remove_file, self.path)
+
+    def set(self) -> None:
+        _remove_file(self.path)
+
+    def is_set(self) -> bool:
+        return not os.path.exists(self.path)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class _Pool:
+    """
+    A concurrent.futures executor plus an admission counter.
+    A slot is only released when the job really finishes, so jobs that
+    timed out on the caller's side still count against the limit.
+    """
+    def __init__(self, name: str, factory: Callable[[], Executor], max_pending: int):
+        self.name = name
+        self.max_pending = max_pending
+        self._factory = factory
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, func: Callable, *args: Any, retry_after: int = 1):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                metrics.jobs_rejected.inc(self.name)
+                raise ExecutorSaturated(self.name, retry_after)
+            if self._executor is None:
+                # Created on first use so idle servers and tests start no workers
+                self._executor = self._factory()
+            self._pending += 1
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future) -> None:
+        with self._lock:
+            self._pending -= 1
+            if future is not None and not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                # A crashed worker breaks the whole pool; start a fresh one next time
+                self._executor = None
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class JobExecutor:
+    """
+    Thread pool for I/O-bound jobs and process pool for CPU-bound jobs.
+
+    With `cpu_workers=0` CPU jobs share the thread pool instead, which
+    avoids worker processes on small deployments. Functions sent to the
+    process pool must be picklable, i.e. defined at module level.
+    """
+    def __init__(self, io_workers: int = 4, cpu_workers: int = 1, max_pending: int = 64,
+                 timeout: Optional[float] = 10.0, retry_after: int = 1):
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.cpu_workers = cpu_workers
+        self._io = _Pool(
+            "io",
+            partial(ThreadPoolExecutor, max_workers=io_workers, thread_name_prefix="nonogram-io"),
+            max_pending
+        )
+        if cpu_workers > 0:
+            # spawn: workers never inherit the parent's threads or loaded catalogue
+            self._cpu = _Pool(
+                "cpu",
+                partial(ProcessPoolExecutor, max_workers=cpu_workers, mp_context=multiprocessing.get_context("spawn")),
+                max_pending
+            )
+        else:
+            self._cpu = self._io
+
+    def submit_io(self, func: Callable, *args: Any):
+        """Submit a job to the thread pool; returns a concurrent.futures.Future"""
+        return self._io.submit(func, *args, retry_after=self.retry_after)
+
+    def submit_cpu(self, func: Callable, *args: Any):
+        """Submit a job to the process pool; returns a concurrent.futures.Future"""
+        return self._cpu.submit(func, *args, retry_after=self.retry_after)
+
+    async def run_io(self, func: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run an I/O-bound job on the thread pool and await its result"""
+        return await self._run(self._io, func, args, timeout)
+
+    async def run_cpu(self, func: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run a CPU-bound job on the process pool and await its result"""
+        return await self._run(self._cpu, func, args, timeout)
+
+    async def _run(self, pool: _Pool, func: Callable, args: tuple, timeout: Optional[float]) -> Any:
+        future = pool.submit(func, *args, retry_after=self.retry_after)
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # Only drops jobs that have not started; running ones finish in the background
+            future.cancel()
+            raise JobTimeout(f"Job {getattr(func, '__name__', func)} did not finish within {timeout}s")
+        except BrokenProcessPool:
+            # The pool is replaced on the next submit, so the client may retry
+            raise ExecutorSaturated(pool.name, self.retry_after)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop both pools"""
+        self._io.shutdown(wait)
+        if self._cpu is not self._io:
+            self._cpu.shutdown(wait)
+
+
+def executor_from_env() -> JobExecutor:
+    """
+    Build the executor configured by NONOGRAM_IO_WORKERS, NONOGRAM_CPU_WORKERS
+    (0 runs CPU jobs on the thread pool), NONOGRAM_MAX_PENDING_JOBS,
+    NONOGRAM_JOB_TIMEOUT_MS and NONOGRAM_RETRY_AFTER_S.
+    """
+    return JobExecutor(
+        io_workers=int(os.environ.get("NONOGRAM_IO_WORKERS", 4)),
+        cpu_workers=int(os.environ.get("NONOGRAM_CPU_WORKERS", min(4, os.cpu_count() or 1))),
+        max_pending=int(os.environ.get("NONOGRAM_MAX_PENDING_JOBS", 64)),
+        timeout=int(os.environ.get("NONOGRAM_JOB_TIMEOUT_MS", 10000)) / 1000.0,
+        retry_after=int(os.environ.get("NONOGRAM_RETRY_AFTER_S", 1))
+    )
+
+
+# Shared by the API routes and the background reload
+job_executor = executor_from_env()
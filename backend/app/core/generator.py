@@ -0,0 +1,107 @@
+"""
+Random puzzle generation.
+
+Boards are drawn cell by cell at the requested density and their clues
+computed with calculate_descriptors. A board is kept only if it passes the
+requested filters: a unique solution, and a difficulty level (see
+app.core.difficulty) within a band, both settled by one solver run within
+the uniqueness budgets.
+
+Generation runs in batches on the process pool. Each batch draws its boards
+from a generator seeded with the request's seed and the batch index, and
+names puzzles by their attempt number, so the output is reproducible
+however the batches are scheduled. A batch stopped early by its time limit
+or by cancellation keeps the puzzles found so far.
+"""
+import random
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from . import solver
+from .descriptors import calculate_descriptors
+from .difficulty import difficulty_level, in_band
+from .solver import Board
+
+# A batch holds up to this many puzzles, fewer for large boards
+MAX_BATCH_PUZZLES = 64
+BATCH_CELLS = 4096
+
+# Boards tried per requested puzzle before a request gives up
+DEFAULT_ATTEMPTS_PER_PUZZLE = 20
+
+
+class GenerateSpec(NamedTuple):
+    """What to generate; shared by all batches of one request"""
+    width: int
+    height: int
+    density: float
+    seed: int
+    prefix: str = "generated-"
+    unique: bool = True
+    min_difficulty: Optional[str] = None
+    max_difficulty: Optional[str] = None
+    # Attempt numbers reserved per batch, which keeps names distinct across batches
+    batch_attempts: int = MAX_BATCH_PUZZLES * DEFAULT_ATTEMPTS_PER_PUZZLE
+
+    @property
+    def needs_solver(self) -> bool:
+        return self.unique or self.min_difficulty is not None or self.max_difficulty is not None
+
+
+class GeneratedPuzzle(NamedTuple):
+    name: str
+    board: Board
+    descriptors: Dict[str, List[List[int]]]
+    unique: Optional[bool]
+    difficulty: Optional[str]
+
+
+class GeneratedBatch(NamedTuple):
+    """Puzzles kept by one batch and the number of boards it tried"""
+    puzzles: List[GeneratedPuzzle]
+    attempts: int
+
+
+def batch_size(width: int, height: int) -> int:
+    """Puzzles per batch for boards of this size"""
+    return max(1, min(MAX_BATCH_PUZZLES, BATCH_CELLS // max(1, width * height)))
+
+
+def random_board(width: int, height: int, density: float, rng: random.Random) -> Board:
+    """Board with each cell filled with probability `density`"""
+    return [[rng.random() < density for _ in range(width)] for _ in range(height)]
+
+
+def generate_batch(spec: GenerateSpec, batch: int, wanted: int, max_attempts: int,
+                   time_limit: Optional[float] = None,
+                   cancelled: Optional[Callable[[], bool]] = None) -> GeneratedBatch:
+    """
+    Draw boards until `wanted` pass the filters or `max_attempts` (at most
+    spec.batch_attempts) have been tried, stopping early once `time_limit`
+    seconds have passed or `cancelled()` returns True.
+    """
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
+    rng = random.Random(f"{spec.seed}:{batch}")
+    puzzles: List[GeneratedPuzzle] = []
+    attempts = min(max_attempts, spec.batch_attempts)
+    for attempt in range(attempts):
+        remaining = deadline - time.monotonic() if deadline is not None else solver.UNIQUE_TIME_LIMIT
+        if remaining <= 0 or cancelled is not None and cancelled():
+            return GeneratedBatch(puzzles, attempt)
+        board = random_board(spec.width, spec.height, spec.density, rng)
+        descriptors = calculate_descriptors(board)
+        unique = difficulty = None
+        if spec.needs_solver:
+            # The uniqueness budget, or what is left of the batch's time if less
+            report = solver.check_uniqueness(board, descriptors, time_limit=min(remaining, solver.UNIQUE_TIME_LIMIT))
+            unique = report.status == "unique" if report.status != "timeout" else None
+            difficulty = difficulty_level(report.stats, report.status != "timeout")
+            if spec.unique and not unique:
+                continue
+            if not in_band(difficulty, spec.min_difficulty, spec.max_difficulty):
+                continue
+        name = f"{spec.prefix}{spec.seed}-{batch * spec.batch_attempts + attempt}"
+        puzzles.append(GeneratedPuzzle(name, board, descriptors, unique, difficulty))
+        if len(puzzles) >= wanted:
+            return GeneratedBatch(puzzles, attempt + 1)
+    return GeneratedBatch(puzzles, attempts)
@@ -0,0 +1,151 @@
+"""
+Hints: the next deduction a player can make on a partly filled grid.
+
+The grid is tri-state (filled, empty or unknown). A hint is, in order of
+preference:
+
+- a line the known cells already contradict, so the player can fix it;
+- the cells one line forces on its own, by the overlap logic of the line
+  solver. Of all lines that force something, the one with the fewest
+  unknown cells is the easiest to see and is chosen;
+- a probe: a cell whose one value makes propagation fail, which forces
+  the other value. This only happens when no single line forces anything.
+
+Line results come from the solver's solve_line cache, keyed by clue and
+line state, so repeated hints on the same puzzle mostly hit the cache.
+Probing is bounded by node and time budgets; a grid that needs more, or
+guessing, gets no hint ("stuck").
+"""
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .solver import Contradiction, NonogramSolver, SearchLimitReached, SolveStats, _Grid, solve_line
+
+HINT_TIME_LIMIT = int(os.environ.get("NONOGRAM_HINT_TIME_LIMIT_MS", 500)) / 1000.0
+HINT_NODE_LIMIT = int(os.environ.get("NONOGRAM_HINT_NODE_LIMIT", 2000))
+# Grids of at most this many cells get their line pass on the event loop (a few
+# milliseconds with a cold line cache); larger grids are hinted on the CPU pool
+HINT_INLINE_CELLS = int(os.environ.get("NONOGRAM_HINT_INLINE_CELLS", 1024))
+
+# Cell of a hint: (row, column, filled)
+Cell = Tuple[int, int, bool]
+
+Grid = Sequence[Sequence[Optional[bool]]]
+
+
+class Hint(NamedTuple):
+    """
+    `status` is "hint", "solved", "contradiction" (the known cells
+    contradict `line`) or "stuck". A hint's `cells` are forced by `line`
+    (technique "line") or by `probe` failing (technique "probe"), where
+    `line` is the line that failed under the probe.
+    Lines are numbered rows first, then columns.
+    """
+    status: str
+    technique: Optional[str] = None
+    line: Optional[int] = None
+    cells: List[Cell] = []
+    probe: Optional[Cell] = None
+    stats: Optional[SolveStats] = None
+
+
+def parse_grid(solver: NonogramSolver, grid: Optional[Grid]) -> _Grid:
+    """Known cells of a tri-state grid; None is an all-unknown grid"""
+    known = _Grid(solver.height, solver.width)
+    if grid is None:
+        return known
+    if len(grid) != solver.height or any(len(row) != solver.width for row in grid):
+        raise ValueError(f"Expected a {solver.width}x{solver.height} grid")
+    for r, row in enumerate(grid):
+        for c, cell in enumerate(row):
+            if cell is True:
+                known.rows_filled[r] |= 1 << c
+                known.cols_filled[c] |= 1 << r
+            elif cell is False:
+                known.rows_empty[r] |= 1 << c
+                known.cols_empty[c] |= 1 << r
+    return known
+
+
+def _cells(solver: NonogramSolver, index: int, filled: int, empty: int) -> List[Cell]:
+    """Cells of line `index` set in the `filled` and `empty` masks"""
+    cells = []
+    for mask, value in ((filled, True), (empty, False)):
+        while mask:
+            low = mask & -mask
+            position = low.bit_length() - 1
+            cells.append((index, position, value) if index < solver.height else (position, index - solver.height, value))
+            mask ^= low
+    return sorted(cells)
+
+
+def line_hint(solver: NonogramSolver, grid: _Grid) -> Optional[Hint]:
+    """A contradicted line, or the cheapest line that forces cells; None if no line does"""
+    best = None
+    for index in range(solver.height + solver.width):
+        clue, length, filled, empty = solver._line(grid, index)
+        solver.stats.line_solves += 1
+        result = solve_line(clue, length, filled, empty)
+        if result is None:
+            return Hint("contradiction", line=index, stats=solver.stats)
+        added_filled = result[0] & ~filled
+        added_empty = result[1] & ~empty
+        if not (added_filled or added_empty):
+            continue
+        unknown = length - bin(filled | empty).count("1")
+        if best is None or unknown < best[0]:
+            best = (unknown, index, added_filled, added_empty)
+    if best is None:
+        return None
+    _, index, added_filled, added_empty = best
+    return Hint("hint", "line", index, _cells(solver, index, added_filled, added_empty), stats=solver.stats)
+
+
+def probe_hint(solver: NonogramSolver, grid: _Grid, node_limit: Optional[int] = None,
+               time_limit: Optional[float] = None) -> Hint:
+    """
+    Try both values of unknown cells, nearest to known ones first, until
+    one value leads to a contradiction. Assumes no single line forces a cell.
+    """
+    solver._node_limit = node_limit
+    solver._deadline = time.perf_counter() + time_limit if time_limit is not None else None
+    try:
+        for r, c in solver._frontier(grid):
+            for value in (True, False):
+                solver._check_budget()
+                solver.stats.probes += 1
+                try:
+                    solver.assign(grid.copy(), r, c, value)
+                except Contradiction as e:
+                    return Hint("hint", "probe", e.line, [(r, c, not value)], (r, c, value), solver.stats)
+    except SearchLimitReached:
+        pass
+    return Hint("stuck", stats=solver.stats)
+
+
+def next_hint(descriptors: Dict[str, List[List[int]]], grid: Optional[Grid] = None, probe: bool = True,
+              node_limit: Optional[int] = HINT_NODE_LIMIT, time_limit: Optional[float] = HINT_TIME_LIMIT,
+              lines_exhausted: bool = False) -> Hint:
+    """
+    The next deduction on a partly filled grid. With probe=False a grid on
+    which no single line forces anything is reported "stuck" at once.
+    With lines_exhausted the caller already found that no line forces
+    anything on this unsolved grid (a "stuck" answer with probe=False), and
+    probing starts straight away.
+    Raises ValueError for clues that cannot describe a grid, or a grid of
+    another size.
+    """
+    started = time.perf_counter()
+    solver = NonogramSolver(descriptors)
+    known = parse_grid(solver, grid)
+    hint = None if lines_exhausted else line_hint(solver, known)
+    if hint is None:
+        if not lines_exhausted and solver.is_solved(known):
+            hint = Hint("solved", stats=solver.stats)
+        elif probe:
+            hint = probe_hint(solver, known, node_limit, time_limit)
+        else:
+            hint = Hint("stuck", stats=solver.stats)
+    solver.stats.elapsed_ms = (time.perf_counter() - started) * 1000
+    return hint
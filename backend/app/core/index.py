@@ -0,0 +1,304 @@
+import bisect
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+Clue = Tuple[int, ...]
+
+# Anchors marking the start and end of a clue in n-grams; clue numbers are never negative
+_START = -1
+_END = -2
+
+# Longest n-gram indexed over clue sequences
+GRAM_SIZE = 3
+
+# Per-puzzle attributes with a sorted index, in the order of ClueIndex.attributes
+ATTRIBUTES = ("width", "height", "filled", "difficulty")
+
+
+def _anchored_grams(sequence: Clue, size: int) -> Iterable[Clue]:
+    """Windows of `size` numbers over a sequence"""
+    return (sequence[i:i + size] for i in range(len(sequence) - size + 1))
+
+
+def clue_grams(clue: Clue) -> Set[Clue]:
+    """N-grams of up to GRAM_SIZE numbers of a clue with its start and end anchored"""
+    anchored = (_START,) + clue + (_END,)
+    grams = {gram for size in range(1, GRAM_SIZE + 1) for gram in _anchored_grams(anchored, size)}
+    grams.discard((_START,))
+    grams.discard((_END,))
+    return grams
+
+
+class CluePattern(NamedTuple):
+    """
+    A clue, or part of one: with both ends anchored it must equal a line
+    clue, with one end anchored it is a prefix or suffix, and with neither
+    it is a consecutive run of numbers anywhere in the clue.
+    """
+    numbers: Clue
+    anchor_start: bool = True
+    anchor_end: bool = True
+
+    @property
+    def exact(self) -> bool:
+        return self.anchor_start and self.anchor_end
+
+    def matches(self, clue: Clue) -> bool:
+        """Whether a line clue matches the pattern"""
+        numbers = self.numbers
+        size = len(numbers)
+        if self.exact:
+            return clue == numbers
+        if self.anchor_start:
+            return clue[:size] == numbers
+        if self.anchor_end:
+            return size == 0 or clue[-size:] == numbers
+        return any(clue[i:i + size] == numbers for i in range(len(clue) - size + 1))
+
+    def grams(self) -> List[Clue]:
+        """N-grams every matching clue has, as recorded by clue_grams; empty if any clue may match"""
+        if not self.numbers:
+            return []
+        anchored = ((_START,) if self.anchor_start else ()) + self.numbers + ((_END,) if self.anchor_end else ())
+        return list(_anchored_grams(anchored, min(GRAM_SIZE, len(anchored))))
+
+
+class SortedIndex:
+    """
+    Names ordered by an integer key, answering inclusive range queries by
+    bisection. Like ClueIndex it is never modified in place; with_changes
+    returns an updated copy.
+    """
+    def __init__(self, keys: Mapping[str, Optional[int]]):
+        # Names without a key (None) are left out
+        self._entries: List[Tuple[int, str]] = sorted((key, name) for name, key in keys.items() if key is not None)
+
+    def _bounds(self, low: Optional[int], high: Optional[int]) -> Tuple[int, int]:
+        start = bisect.bisect_left(self._entries, (low, "")) if low is not None else 0
+        end = bisect.bisect_left(self._entries, (high + 1, "")) if high is not None else len(self._entries)
+        return start, max(start, end)
+
+    def count(self, low: Optional[int] = None, high: Optional[int] = None) -> int:
+        """Number of names with a key in [low, high]; None leaves a bound open"""
+        start, end = self._bounds(low, high)
+        return end - start
+
+    def range(self, low: Optional[int] = None, high: Optional[int] = None) -> List[str]:
+        """Names with a key in [low, high], in key order"""
+        start, end = self._bounds(low, high)
+        return [name for _, name in self._entries[start:end]]
+
+    def with_changes(self, removed: Mapping[str, Optional[int]], added: Mapping[str, Optional[int]]) -> "SortedIndex":
+        """New index with the keys of `removed` dropped and those of `added` inserted"""
+        index = SortedIndex.__new__(SortedIndex)
+        entries = list(self._entries)
+        for name, key in removed.items():
+            if key is None:
+                continue
+            position = bisect.bisect_left(entries, (key, name))
+            if position < len(entries) and entries[position] == (key, name):
+                del entries[position]
+        for name, key in added.items():
+            if key is not None:
+                bisect.insort(entries, (key, name))
+        index._entries = entries
+        return index
+
+
+Attributes = Tuple[int, int, int, Optional[int]]
+
+
+def _attributes(clues: Dict[str, List[List[int]]], difficulty: Optional[int] = None) -> Attributes:
+    """
+    (width, height, filled cells, difficulty score) of a nonogram; all but
+    the score, which is None until analysed, are derived from its clues
+    """
+    rows = clues.get("rows", [])
+    return len(clues.get("columns", [])), len(rows), sum(sum(clue) for clue in rows), difficulty
+
+
+class ClueIndex:
+    """
+    Inverted index from a line clue to the names of the nonograms using it.
+    Row and column clues are kept in separate postings so a lookup can be
+    restricted to one axis.
+
+    For partial clue queries the distinct clues are also indexed by their
+    n-grams, so a pattern is first matched against the few clues sharing
+    its n-grams rather than against every puzzle. Width, height, number of
+    filled cells and difficulty score (given in `scores`, where known) are
+    kept in sorted indexes for range queries.
+    """
+    def __init__(self, descriptors: Mapping[str, Dict[str, List[List[int]]]],
+                 scores: Optional[Mapping[str, Optional[int]]] = None):
+        scores = scores or {}
+        self._rows: Dict[Clue, Set[str]] = {}
+        self._columns: Dict[Clue, Set[str]] = {}
+        # Catalogue position of every name, used to keep results in file order
+        self._order: Dict[str, int] = {}
+        self._attributes: Dict[str, Attributes] = {}
+
+        for position, (name, clues) in enumerate(descriptors.items()):
+            self._order[name] = position
+            self._attributes[name] = _attributes(clues, scores.get(name))
+            self._add_postings(self._rows, name, clues.get("rows", []))
+            self._add_postings(self._columns, name, clues.get("columns", []))
+        self._next_position = len(self._order)
+
+        self._grams: Dict[Clue, Set[Clue]] = {}
+        for clue in self._rows.keys() | self._columns.keys():
+            for gram in clue_grams(clue):
+                self._grams.setdefault(gram, set()).add(clue)
+        self._sorted = tuple(
+            SortedIndex({name: values[i] for name, values in self._attributes.items()})
+            for i in range(len(ATTRIBUTES))
+        )
+
+    @staticmethod
+    def _add_postings(postings: Dict[Clue, Set[str]], name: str, clues: Iterable[List[int]]) -> None:
+        """Register every clue of one axis of a nonogram"""
+        for clue in clues:
+            postings.setdefault(tuple(clue), set()).add(name)
+
+    def with_changes(self, removed: Mapping[str, Dict[str, List[List[int]]]],
+                     added: Mapping[str, Dict[str, List[List[int]]]],
+                     scores: Optional[Mapping[str, Optional[int]]] = None) -> "ClueIndex":
+        """
+        New index with the postings of `removed` dropped and those of `added`
+        (with difficulty `scores`, where known) registered, leaving this one
+        untouched. Only the posting sets of the affected clues are copied;
+        all others are shared. A name in both mappings is an update and
+        keeps its catalogue position.
+        """
+        scores = scores or {}
+        index = ClueIndex.__new__(ClueIndex)
+        index._rows = dict(self._rows)
+        index._columns = dict(self._columns)
+        index._order = dict(self._order)
+        index._attributes = dict(self._attributes)
+        index._next_position = self._next_position
+        copied: Set[Tuple[int, Clue]] = set()
+        touched: Set[Clue] = set()
+
+        def edit(axis: int, postings: Dict[Clue, Set[str]], clue: Clue) -> Set[str]:
+            # Copy a shared posting set the first time it is changed
+            touched.add(clue)
+            if (axis, clue) not in copied:
+                copied.add((axis, clue))
+                postings[clue] = set(postings.get(clue, ()))
+            return postings[clue]
+
+        for name, clues in removed.items():
+            for axis, postings, key in ((0, index._rows, "rows"), (1, index._columns, "columns")):
+                for clue in map(tuple, clues.get(key, [])):
+                    names = edit(axis, postings, clue)
+                    names.discard(name)
+                    if not names:
+                        del postings[clue]
+                        copied.discard((axis, clue))
+            index._attributes.pop(name, None)
+            if name not in added:
+                index._order.pop(name, None)
+
+        for name, clues in added.items():
+            for axis, postings, key in ((0, index._rows, "rows"), (1, index._columns, "columns")):
+                for clue in map(tuple, clues.get(key, [])):
+                    edit(axis, postings, clue).add(name)
+            index._attributes[name] = _attributes(clues, scores.get(name))
+            if name not in index._order:
+                index._order[name] = index._next_position
+                index._next_position += 1
+
+        # Clues that entered or left the vocabulary update the n-gram postings
+        index._grams = dict(self._grams)
+        copied_grams: Set[Clue] = set()
+        for clue in touched:
+            before = clue in self._rows or clue in self._columns
+            after = clue in index._rows or clue in index._columns
+            if before == after:
+                continue
+            for gram in clue_grams(clue):
+                if gram not in copied_grams:
+                    copied_grams.add(gram)
+                    index._grams[gram] = set(index._grams.get(gram, ()))
+                clues = index._grams[gram]
+                if after:
+                    clues.add(clue)
+                else:
+                    clues.discard(clue)
+                    if not clues:
+                        del index._grams[gram]
+                        copied_grams.discard(gram)
+
+        old = {name: self._attributes[name] for name in removed if name in self._attributes}
+        new = {name: index._attributes[name] for name in added}
+        index._sorted = tuple(
+            sorted_index.with_changes(
+                {name: values[i] for name, values in old.items()},
+                {name: values[i] for name, values in new.items()}
+            )
+            for i, sorted_index in enumerate(self._sorted)
+        )
+        return index
+
+    def rows(self, clue: Clue) -> Set[str]:
+        """Names of nonograms with the clue in their row descriptors"""
+        return self._rows.get(clue, set())
+
+    def columns(self, clue: Clue) -> Set[str]:
+        """Names of nonograms with the clue in their column descriptors"""
+        return self._columns.get(clue, set())
+
+    def lookup(self, clue: Clue) -> List[str]:
+        """Names of nonograms with the clue in any row or column, in catalogue order"""
+        matches = self.rows(clue) | self.columns(clue)
+        return self.in_order(matches)
+
+    def names(self) -> List[str]:
+        """All indexed names in catalogue order"""
+        return list(self._order)
+
+    def in_order(self, names: Iterable[str]) -> List[str]:
+        """Indexed names in catalogue order"""
+        return sorted(names, key=self._order.__getitem__)
+
+    def matching_clues(self, pattern: CluePattern) -> Set[Clue]:
+        """Distinct clues of any axis that match a pattern"""
+        if pattern.exact:
+            clue = pattern.numbers
+            return {clue} if clue in self._rows or clue in self._columns else set()
+        grams = pattern.grams()
+        if not grams:
+            return self._rows.keys() | self._columns.keys()
+        postings = sorted((self._grams.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return {clue for clue in candidates if pattern.matches(clue)}
+
+    def match(self, pattern: CluePattern, rows: bool = True, columns: bool = True) -> Set[str]:
+        """Names of nonograms with a row and/or column clue matching a pattern"""
+        names: Set[str] = set()
+        for clue in self.matching_clues(pattern):
+            if rows:
+                names |= self.rows(clue)
+            if columns:
+                names |= self.columns(clue)
+        return names
+
+    def attributes(self, name: str) -> Attributes:
+        """Values of ATTRIBUTES for an indexed name"""
+        return self._attributes[name]
+
+    def sorted_by(self, attribute: str) -> SortedIndex:
+        """Sorted index of one of ATTRIBUTES"""
+        return self._sorted[ATTRIBUTES.index(attribute)]
+
+    def in_attribute_order(self, names: Iterable[str], attribute: str) -> List[str]:
+        """Names ordered by one of ATTRIBUTES, then catalogue order; names without a value come last"""
+        position = ATTRIBUTES.index(attribute)
+
+        def key(name: str):
+            value = self._attributes[name][position]
+            return value is None, value or 0, self._order[name]
+        return sorted(names, key=key)
+
+    def __len__(self) -> int:
+        return len(self._order)
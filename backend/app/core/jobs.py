@@ -0,0 +1,101 @@
+"""
+CPU-bound jobs run on the executor's process pool.
+
+These are plain module-level functions taking and returning picklable
+values. The module deliberately does not import crud, so worker processes
+never load the catalogue.
+"""
+from dataclasses import asdict
+from typing import Callable, List, Optional, Tuple
+
+from . import generator, hints, solver
+from .descriptors import calculate_descriptors
+from .models import (
+    CellChange, GeneratedNonogram, NonogramCreate, NonogramCreateResult, NonogramHintRequest, NonogramHintResult,
+    NonogramLine, NonogramSolveRequest, NonogramSolveResult, NonogramUniqueness
+)
+
+
+def create_nonogram(nonogram: NonogramCreate, validate: Optional[str] = None) -> NonogramCreateResult:
+    """
+    Create a new nonogram with calculated descriptors.
+    With validate="unique" the clues are checked to have a single
+    solution, within the solver's uniqueness budgets.
+    """
+    descriptors = calculate_descriptors(nonogram.board)
+
+    uniqueness = None
+    if validate == "unique":
+        report = solver.check_uniqueness(nonogram.board, descriptors)
+        uniqueness = NonogramUniqueness(
+            status=report.status,
+            witness=[list(cell) for cell in report.witness] if report.status == "multiple" else None,
+            stats=asdict(report.stats)
+        )
+
+    return NonogramCreateResult(
+        name=nonogram.name,
+        board=nonogram.board,
+        descriptors=descriptors,
+        uniqueness=uniqueness
+    )
+
+
+def solve_nonogram(request: NonogramSolveRequest) -> NonogramSolveResult:
+    """
+    Solve a nonogram within the server's node and time budgets.
+    Raises ValueError for clues that cannot describe a grid.
+    """
+    result = solver.solve(
+        request.descriptors,
+        max_solutions=request.max_solutions,
+        node_limit=solver.DEFAULT_NODE_LIMIT,
+        time_limit=solver.DEFAULT_TIME_LIMIT
+    )
+    return NonogramSolveResult(
+        status=result.status,
+        unique=result.unique,
+        solutions=result.solutions,
+        stats=asdict(result.stats)
+    )
+
+
+def hint_nonogram(request: NonogramHintRequest, probe: bool = True, lines_exhausted: bool = False) -> NonogramHintResult:
+    """
+    Find the next deduction on a partly filled grid (see app.core.hints).
+    Raises ValueError for clues that cannot describe a grid, or a grid of
+    another size.
+    """
+    hint = hints.next_hint(request.descriptors, request.grid, probe=probe, lines_exhausted=lines_exhausted)
+    line = None
+    if hint.line is not None:
+        rows = request.descriptors.get("rows") or []
+        columns = request.descriptors.get("columns") or []
+        if hint.line < len(rows):
+            line = NonogramLine(axis="row", index=hint.line, clue=rows[hint.line])
+        else:
+            index = hint.line - len(rows)
+            line = NonogramLine(axis="column", index=index, clue=columns[index])
+    return NonogramHintResult(
+        status=hint.status,
+        technique=hint.technique,
+        line=line,
+        cells=[CellChange(row=r, col=c, filled=filled) for r, c, filled in hint.cells],
+        probe=CellChange(row=hint.probe[0], col=hint.probe[1], filled=hint.probe[2]) if hint.probe else None,
+        stats=asdict(hint.stats)
+    )
+
+
+def generate_batch(spec: generator.GenerateSpec, batch: int, wanted: int, max_attempts: int,
+                   time_limit: Optional[float] = None,
+                   cancelled: Optional[Callable[[], bool]] = None) -> Tuple[List[bytes], int]:
+    """
+    Generate one batch of puzzles, encoded as NDJSON lines here in the
+    worker so the server only splices bytes. Returns (lines, attempts).
+    """
+    result = generator.generate_batch(spec, batch, wanted, max_attempts, time_limit, cancelled)
+    lines = [
+        GeneratedNonogram(**puzzle._asdict()).model_dump_json(exclude_none=True).encode("utf-8") + b"\n"
+        for puzzle in result.puzzles
+    ]
+    return lines, result.attempts
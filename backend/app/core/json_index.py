@@ -0,0 +1,135 @@
+"""
+Offset index over the JSON data file.
+
+The file maps names to {"board": [[...], ...], "descriptors": {...}},
+optionally with a stored "difficulty": {...} analysis.
+Instead of parsing every board, the scanner walks the file's structural
+tokens (brackets, braces and strings) with a regular expression and jumps
+over each board in a single search, recording its byte range. Only the
+small descriptor (and difficulty) objects are decoded. Boards are read back from the
+recorded offsets when a puzzle is first used, so startup cost and memory
+follow the number of puzzles rather than the number of cells.
+"""
+import json
+import re
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# Strings, or the brackets and braces that open and close containers
+_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+_COLON = re.compile(rb"\s*:")
+_SPACE = re.compile(rb"\s*")
+# End of a non-empty board: the end of its last row followed by its own end
+_BOARD_END = re.compile(rb"\]\s*\]")
+_ROW = re.compile(rb"\[([^\[\]]*)\]")
+
+
+class IndexedEntry(NamedTuple):
+    """Where one puzzle's board lives in the file, plus its decoded clues"""
+    descriptors: Dict
+    board_span: Optional[Tuple[int, int]]
+    width: int
+    height: int
+    difficulty: Optional[Dict] = None
+
+
+def _key(text: bytes) -> str:
+    """Decode a JSON string token; plain keys skip the JSON decoder"""
+    if b"\\" in text:
+        return json.loads(text)
+    return text[1:-1].decode("utf-8")
+
+
+def _board_shape(board: bytes) -> Tuple[int, int]:
+    """(width, height) of an encoded board, taking the width from its first row"""
+    first = _ROW.search(board)
+    if first is None:
+        return 0, 0
+    cells = first.group(1).strip()
+    return (cells.count(b",") + 1 if cells else 0), board.count(b"[") - 1
+
+
+def scan_catalogue(buffer) -> Dict[str, IndexedEntry]:
+    """
+    Index a JSON data file held in `buffer` (bytes or an mmap).
+    Raises ValueError when the file does not have the expected layout;
+    callers then fall back to parsing it in full.
+    """
+    found = []
+    depth = 0
+    name: Optional[str] = None
+    key: Optional[str] = None
+    descriptors: bytes = b"{}"
+    difficulty: bytes = b"null"
+    board_span: Optional[Tuple[int, int]] = None
+    shape = (0, 0)
+    position = _SPACE.match(buffer).end()
+    if buffer[position:position + 1] != b"{":
+        raise ValueError("The data file is not a JSON object")
+
+    while True:
+        token = _TOKEN.search(buffer, position)
+        if token is None:
+            break
+        text = token.group()
+        position = token.end()
+
+        if text[:1] == b'"':
+            if _COLON.match(buffer, position):
+                if depth == 1:
+                    name = _key(text)
+                elif depth == 2:
+                    key = _key(text)
+            continue
+
+        if text in (b"{", b"["):
+            depth += 1
+            if depth == 2:
+                if text != b"{":
+                    raise ValueError(f"Entry {name!r} is not a JSON object")
+                descriptors, difficulty, board_span, shape = b"{}", b"null", None, (0, 0)
+            elif depth == 3 and key == "board":
+                if text != b"[":
+                    raise ValueError(f"Board of {name!r} is not an array")
+                start = token.start()
+                after = _SPACE.match(buffer, position).end()
+                if buffer[after:after + 1] == b"]":
+                    end = after + 1
+                else:
+                    # Rows hold only literals, so the first "]]" ends the board
+                    board_end = _BOARD_END.search(buffer, position)
+                    if board_end is None:
+                        raise ValueError(f"Board of {name!r} is not terminated")
+                    end = board_end.end()
+                board_span = (start, end)
+                shape = _board_shape(buffer[start:end])
+                position = end
+                depth -= 1
+            elif depth == 3 and key in ("descriptors", "difficulty") and text == b"{":
+                # Neither object nests another, so the first closing brace ends it
+                end = buffer.find(b"}", position)
+                if end < 0:
+                    raise ValueError(f"The {key} object of {name!r} is not terminated")
+                if key == "descriptors":
+                    descriptors = buffer[token.start():end + 1]
+                else:
+                    difficulty = buffer[token.start():end + 1]
+                position = end + 1
+                depth -= 1
+            continue
+
+        depth -= 1
+        if depth == 1:
+            if name is None:
+                raise ValueError("Entry without a name")
+            found.append((name, descriptors, difficulty, board_span, shape))
+            name = None
+        elif depth == 0:
+            # Decode all clue and difficulty objects in one call to the C parser
+            decoded = json.loads(b"[" + b",".join(b"%s,%s" % (entry[1], entry[2]) for entry in found) + b"]")
+            return {
+                name: IndexedEntry(decoded[2 * i], board_span, *shape, decoded[2 * i + 1])
+                for i, (name, _, _, board_span, shape) in enumerate(found)
+            }
+        elif depth < 0:
+            break
+    raise ValueError("The data file is not terminated")
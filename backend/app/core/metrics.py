@@ -0,0 +1,252 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters, gauges and histograms live in a MetricsRegistry and are rendered
+by the /metrics endpoint. Recording is a no-op while the registry is
+disabled (NONOGRAM_METRICS unset or 0), so instrumented code costs one
+attribute check; the request middleware is then not installed at all.
+
+Counts are per process: with several workers, each serves its own
+/metrics and the scraper adds them up.
+"""
+import bisect
+import math
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Upper bounds of the default latency buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the response size buckets, in bytes
+SIZE_BUCKETS = (100, 300, 1000, 3000, 10000, 30000, 100000, 300000, 1000000, 3000000)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric:
+    """Base class of metrics with an optional fixed set of label names"""
+    kind = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str] = ()):
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(suffix, rendered labels, value) for every sample"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_format_value(value)}" for suffix, labels, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(tuple(labels), 0)
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield "", _labels(self.labelnames, key), value
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, or is read from `function` at render time"""
+    kind = "gauge"
+
+    def __init__(self, *args, function: Optional[Callable[[], float]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+        self._function = function
+
+    def set(self, value: float, *labels: str) -> None:
+        if not self._registry.enabled:
+            return
+        self._values[self._key(labels)] = value
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels: str) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(tuple(labels), 0)
+
+    def samples(self):
+        if self._function is not None:
+            yield "", "", self._function()
+            return
+        for key, value in sorted(self._values.items()):
+            yield "", _labels(self.labelnames, key), value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed cumulative buckets"""
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: bucket counts (the last one is +Inf), sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[position] += 1
+            total[0] += value
+
+    def count(self, *labels: str) -> int:
+        counts, _ = self._values.get(tuple(labels), ([0], [0.0]))
+        return sum(counts)
+
+    def samples(self):
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", _labels(self.labelnames + ("le",), key + (_format_value(bound),)), cumulative
+            yield "_sum", _labels(self.labelnames, key), total[0]
+            yield "_count", _labels(self.labelnames, key), cumulative
+
+
+class MetricsRegistry:
+    """Named metrics of one process, rendered together"""
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (),
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(self, name, help, labelnames, function=function))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help, labelnames, buckets=buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(enabled=os.environ.get("NONOGRAM_METRICS", "0").lower() in ("1", "true", "yes"))
+
+# HTTP requests, recorded by MetricsMiddleware
+http_requests_in_flight = registry.gauge(
+    "nonogram_http_requests_in_flight", "Requests currently being served"
+)
+http_request_duration = registry.histogram(
+    "nonogram_http_request_duration_seconds", "Request latency by route", ("method", "route", "status")
+)
+http_response_size = registry.histogram(
+    "nonogram_http_response_size_bytes", "Response body size by route", ("method", "route"), buckets=SIZE_BUCKETS
+)
+
+# Catalogue reloads and caches, recorded by the data manager and snapshots
+reloads = registry.counter(
+    "nonogram_reloads_total", "Snapshots installed, by kind (full or incremental)", ("kind",)
+)
+reload_errors = registry.counter(
+    "nonogram_reload_errors_total", "Reloads that failed and kept the previous snapshot"
+)
+reload_duration = registry.histogram(
+    "nonogram_reload_duration_seconds", "Time to read the store and build a snapshot", ("kind",)
+)
+cache_lookups = registry.counter(
+    "nonogram_cache_lookups_total", "Per-snapshot response cache lookups", ("cache", "result")
+)
+
+# Solver work, reported back by the worker processes
+solver_runs = registry.counter(
+    "nonogram_solver_runs_total", "Solver runs by purpose and outcome", ("purpose", "status")
+)
+solver_nodes = registry.counter(
+    "nonogram_solver_nodes_total", "Solver work by kind of step", ("kind",)
+)
+solver_duration = registry.histogram(
+    "nonogram_solver_duration_seconds", "Solver wall-clock time", ("purpose",)
+)
+
+# Puzzle generation
+generated_puzzles = registry.counter(
+    "nonogram_generated_puzzles_total", "Boards tried by the generator, by outcome (kept or rejected)", ("outcome",)
+)
+
+# Executor admission
+jobs_rejected = registry.counter(
+    "nonogram_jobs_rejected_total", "Jobs refused because their pool was full", ("pool",)
+)
+
+
+def record_solve(purpose: str, status: str, stats) -> None:
+    """Record one solver run from its NonogramSolveStats"""
+    if not registry.enabled:
+        return
+    solver_runs.inc(purpose, status)
+    for kind in ("line_solves", "propagation_rounds", "probes", "branches"):
+        solver_nodes.inc(kind, amount=getattr(stats, kind))
+    solver_duration.observe(stats.elapsed_ms / 1000.0, purpose)
@@ -1,5 +1,5 @@
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional, Union, get_args
+from pydantic import BaseModel, Field, NonNegativeInt, model_validator
 
 
 class Nonogram(BaseModel):
@@ -21,11 +21,54 @@ class Nonogram(BaseModel):
         return len(self.board[0]) if self.rows > 0 else 0
 
 
+class NonogramCompact(BaseModel):
+    """
+    Pydantic model for a Nonogram with a compactly encoded board.
+    """
+    name: str = Field(..., description="The name of the nonogram puzzle")
+    width: int = Field(..., description="Number of columns in the puzzle")
+    height: int = Field(..., description="Number of rows in the puzzle")
+    encoding: str = Field(..., description="Board encoding: 'bitmap' or 'rle'")
+    board: Union[str, List[int]] = Field(
+        ...,
+        description="'bitmap': base64 of the rows, one bit per cell, most significant bit first, each row padded to "
+                    "a whole byte. 'rle': row-major run lengths alternating empty/filled, starting with empty"
+    )
+    descriptors: dict = Field(..., description="Dictionary containing row and column clues")
+
+
+# Upper bound on the page size of paginated listings
+MAX_PAGE_SIZE = 1000
+
+# Metadata a listing can project for each puzzle
+LIST_FIELDS = ("name", "width", "height", "density", "difficulty")
+
+# Difficulty levels, easiest first (see app.core.difficulty)
+Difficulty = Literal["easy", "medium", "hard"]
+
+
+class NonogramSummary(BaseModel):
+    """
+    Pydantic model for the metadata of one puzzle in a listing.
+    Fields that were not requested are left out.
+    """
+    name: str = Field(..., description="Name of the nonogram puzzle")
+    width: Optional[int] = Field(None, description="Number of columns")
+    height: Optional[int] = Field(None, description="Number of rows")
+    density: Optional[float] = Field(None, description="Fraction of filled cells")
+    difficulty: Optional[Difficulty] = Field(None, description="Difficulty level")
+    difficulty_score: Optional[int] = Field(None, description="Difficulty score; higher is harder, ordered consistently with the level")
+
+
 class NonogramList(BaseModel):
     """
     Pydantic model for returning a list of nonogram names.
+    Paginated or projected listings also carry `items` and, when more
+    puzzles follow, a `next_cursor` to pass back for the next page.
     """
     names: List[str] = Field(..., description="List of nonogram puzzle names")
+    items: Optional[List[NonogramSummary]] = Field(None, description="Requested metadata for each listed puzzle")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, absent on the last page")
 
 
 class NonogramSearchResult(BaseModel):
@@ -35,10 +78,293 @@ class NonogramSearchResult(BaseModel):
     matches: List[str] = Field(..., description="List of nonogram names matching the search criteria")
 
 
+# Largest number of names or boards accepted by one batch request
+MAX_BATCH_SIZE = 1000
+
+
+class NonogramBatchRequest(BaseModel):
+    """
+    Pydantic model for fetching many nonograms at once.
+    """
+    names: List[str] = Field(..., max_length=MAX_BATCH_SIZE, description="Names of the nonograms to fetch")
+
+
+class NonogramBatchResult(BaseModel):
+    """
+    Pydantic model for returning many nonograms at once.
+    """
+    nonograms: Dict[str, Nonogram] = Field(..., description="Requested nonograms that exist, by name")
+    missing: List[str] = Field(..., description="Requested names that do not exist")
+
+
+class NonogramDescriptorsBatchRequest(BaseModel):
+    """
+    Pydantic model for calculating descriptors of many boards at once.
+    """
+    boards: List[List[List[bool]]] = Field(..., max_length=MAX_BATCH_SIZE, description="2D boolean boards")
+
+
+class NonogramDescriptorsBatchResult(BaseModel):
+    """
+    Pydantic model for returning descriptors of many boards, in request order.
+    """
+    descriptors: List[dict] = Field(..., description="Row and column clues of each board")
+
+
+# Largest number of cell changes accepted by one check
+MAX_CHECK_CHANGES = 10000
+
+
+class CellChange(BaseModel):
+    """
+    Pydantic model for one changed cell of a board in play.
+    """
+    row: int = Field(..., ge=0, description="Row of the cell")
+    col: int = Field(..., ge=0, description="Column of the cell")
+    filled: bool = Field(..., description="Whether the cell is now filled")
+
+
+class NonogramCheckRequest(BaseModel):
+    """
+    Pydantic model for checking a board in play.
+    `changes` apply to the board of `session` (from the first check), to
+    `board`, or to an empty board when neither is given; the last two
+    start a new session. `board_hash` optionally confirms the session's
+    board before the changes.
+    """
+    session: Optional[str] = Field(None, description="Session of the board the changes apply to, from the first check")
+    board_hash: Optional[str] = Field(None, description="Hash of the session's board from the previous check, to confirm it is in sync")
+    board: Optional[List[List[bool]]] = Field(None, description="Full board to start a new session from")
+    changes: List[CellChange] = Field(default_factory=list, max_length=MAX_CHECK_CHANGES, description="Changed cells")
+
+    @model_validator(mode="after")
+    def check_start(self) -> "NonogramCheckRequest":
+        if self.session is not None and self.board is not None:
+            raise ValueError("Pass either session or board, not both")
+        if self.board_hash is not None and self.session is None:
+            raise ValueError("A board_hash needs the session it belongs to")
+        return self
+
+
+class NonogramLineCheck(BaseModel):
+    """
+    Pydantic model for the status of one line of a board in play.
+    """
+    axis: Literal["row", "column"] = Field(..., description="Whether the line is a row or a column")
+    index: int = Field(..., description="Index of the row or column")
+    status: Literal["satisfied", "contradicted", "open"] = Field(
+        ..., description="Whether the line matches its clue, cannot match it whatever else is filled, or neither yet"
+    )
+    clue: List[int] = Field(..., description="Clue of the line as currently filled")
+
+
+class NonogramCheckResult(BaseModel):
+    """
+    Pydantic model for the result of checking a board in play.
+    `lines` holds the lines the changes touched, or every line when the
+    board was started by this check.
+    """
+    session: str = Field(..., description="Session holding the board, for the next check")
+    board_hash: str = Field(..., description="Hash of the board after the changes, to confirm it on the next check")
+    complete: bool = Field(..., description="Whether every row and column matches its clue")
+    satisfied: int = Field(..., description="Number of lines matching their clue")
+    contradicted: int = Field(..., description="Number of lines that cannot match their clue")
+    lines: List[NonogramLineCheck] = Field(..., description="Status of the lines examined by this check")
+
+
 class NonogramCreate(BaseModel):
     """
     Pydantic model for creating a new nonogram.
     """
     name: str = Field(..., description="The name of the nonogram puzzle")
     board: List[List[bool]] = Field(..., description="2D array of booleans representing the puzzle solution")
-    # Descriptors will be calculated automatically 
\ No newline at end of file
+    # Descriptors will be calculated automatically 
+
+class NonogramUpdate(BaseModel):
+    """
+    Pydantic model for replacing the board of a stored nonogram.
+    """
+    board: List[List[bool]] = Field(..., description="2D array of booleans representing the puzzle solution")
+
+
+class DescriptorsRequest(BaseModel):
+    """
+    Base of requests carrying the clues of a puzzle, validated here so
+    malformed clues are answered 422 before they reach the solver.
+    """
+    descriptors: Dict[Literal["rows", "columns"], List[List[NonNegativeInt]]] = Field(
+        ..., description="Row and column clues; [0] for an empty line"
+    )
+
+    @model_validator(mode="after")
+    def check_descriptors(self) -> "DescriptorsRequest":
+        for axis in ("rows", "columns"):
+            if not self.descriptors.get(axis):
+                raise ValueError(f"descriptors need at least one clue in {axis!r}")
+        return self
+
+
+class NonogramSolveRequest(DescriptorsRequest):
+    """
+    Pydantic model for a solve request.
+    """
+    max_solutions: int = Field(1, ge=1, le=10, description="Stop after finding this many solutions")
+
+
+class NonogramSolveStats(BaseModel):
+    """
+    Pydantic model for the work a solve needed.
+    """
+    line_solves: int = Field(..., description="Number of single-line solves")
+    propagation_rounds: int = Field(..., description="Number of propagation runs")
+    probes: int = Field(..., description="Number of cells tentatively set to look for contradictions")
+    branches: int = Field(..., description="Number of guesses made by the backtracking search")
+    max_depth: int = Field(..., description="Deepest level of nested guesses")
+    elapsed_ms: float = Field(..., description="Wall-clock solve time in milliseconds")
+
+
+class NonogramSolveResult(BaseModel):
+    """
+    Pydantic model for returning solver results.
+    """
+    status: str = Field(..., description="'solved', 'unsolvable', or 'limit' when the search budget ran out")
+    unique: Optional[bool] = Field(None, description="Whether the solution is unique, if known")
+    solutions: List[List[List[bool]]] = Field(..., description="Solutions found, as 2D boolean boards")
+    stats: NonogramSolveStats = Field(..., description="Solver work counters")
+
+
+# Largest number of rows or columns of a grid accepted by a hint request
+MAX_HINT_SIZE = 200
+
+
+class NonogramHintRequest(DescriptorsRequest):
+    """
+    Pydantic model for a hint request on a partly filled grid.
+    """
+    grid: Optional[List[List[Optional[bool]]]] = Field(
+        None, max_length=MAX_HINT_SIZE,
+        description="Cells known so far: true filled, false empty, null unknown; omitted means all unknown"
+    )
+
+    @model_validator(mode="after")
+    def check_size(self) -> "NonogramHintRequest":
+        lines = [len(self.descriptors.get(axis) or []) for axis in ("rows", "columns")]
+        if self.grid is not None:
+            lines += [len(row) for row in self.grid]
+        if max(lines) > MAX_HINT_SIZE:
+            raise ValueError(f"Hints are given on grids of at most {MAX_HINT_SIZE} rows and columns")
+        return self
+
+
+class NonogramLine(BaseModel):
+    """
+    Pydantic model naming one row or column and its clue.
+    """
+    axis: Literal["row", "column"] = Field(..., description="Whether the line is a row or a column")
+    index: int = Field(..., description="Index of the row or column")
+    clue: List[int] = Field(..., description="Clue of the line")
+
+
+class NonogramHintResult(BaseModel):
+    """
+    Pydantic model for a hint.
+    With technique 'line' the cells are forced by `line` alone; with
+    'probe', setting `probe` leads to a contradiction in `line`, which
+    forces the opposite value. A 'contradiction' names a line the known
+    cells already break; 'stuck' means no deduction was found within the
+    budget.
+    """
+    status: Literal["hint", "solved", "contradiction", "stuck"] = Field(..., description="Outcome of the search")
+    technique: Optional[Literal["line", "probe"]] = Field(None, description="How the hinted cells are deduced")
+    line: Optional[NonogramLine] = Field(None, description="Line forcing the cells, or contradicted")
+    cells: List[CellChange] = Field(default_factory=list, description="Cells the hint determines")
+    probe: Optional[CellChange] = Field(None, description="Assumption that fails, for probe hints")
+    stats: NonogramSolveStats = Field(..., description="Solver work counters")
+
+
+class NonogramUniqueness(BaseModel):
+    """
+    Pydantic model for the result of a uniqueness check.
+    """
+    status: Literal["unique", "multiple", "timeout"] = Field(..., description="Whether the board is the only solution of its clues")
+    witness: Optional[List[List[int]]] = Field(None, description="[row, column] cells where another solution differs, for 'multiple'")
+    stats: NonogramSolveStats = Field(..., description="Solver work counters")
+
+
+class NonogramCreateResult(Nonogram):
+    """
+    Pydantic model for a created nonogram, with optional validation results.
+    """
+    uniqueness: Optional[NonogramUniqueness] = Field(None, description="Uniqueness check, when requested with validate=unique")
+
+
+class NonogramSimilarRequest(BaseModel):
+    """
+    Pydantic model for a similarity query, by puzzle name or by board.
+    """
+    name: Optional[str] = Field(None, description="Name of a stored nonogram to find neighbours of")
+    board: Optional[List[List[bool]]] = Field(None, description="2D boolean board to find neighbours of")
+    k: int = Field(10, ge=1, le=100, description="Number of neighbours to return")
+    metric: Literal["board", "clues"] = Field("board", description="'board' counts differing cells, 'clues' differing row and column clues")
+
+    @model_validator(mode="after")
+    def check_query(self) -> "NonogramSimilarRequest":
+        if (self.name is None) == (self.board is None):
+            raise ValueError("Pass exactly one of 'name' or 'board'")
+        return self
+
+
+class NonogramNeighbour(BaseModel):
+    """
+    Pydantic model for one puzzle found by a similarity query.
+    """
+    name: str = Field(..., description="Name of the similar nonogram")
+    distance: int = Field(..., description="Number of differing cells, or of differing clues for metric=clues")
+    similarity: float = Field(..., description="1 minus the distance relative to the number of cells or lines")
+
+
+class NonogramSimilarResult(BaseModel):
+    """
+    Pydantic model for returning similar puzzles, nearest first.
+    Only puzzles of the same width and height are compared.
+    """
+    matches: List[NonogramNeighbour] = Field(..., description="Nearest puzzles, nearest first")
+
+
+# Limits of a single generate request
+MAX_GENERATE_COUNT = 100000
+MAX_GENERATE_SIZE = 100
+
+
+class NonogramGenerateRequest(BaseModel):
+    """
+    Pydantic model for a request to generate random puzzles.
+    """
+    width: int = Field(..., ge=1, le=MAX_GENERATE_SIZE, description="Number of columns")
+    height: int = Field(..., ge=1, le=MAX_GENERATE_SIZE, description="Number of rows")
+    density: float = Field(0.5, ge=0.0, le=1.0, description="Probability of each cell being filled")
+    count: int = Field(1, ge=1, le=MAX_GENERATE_COUNT, description="Number of puzzles to generate")
+    unique: bool = Field(True, description="Only keep boards that are the single solution of their clues")
+    min_difficulty: Optional[Difficulty] = Field(None, description="Easiest difficulty level to keep")
+    max_difficulty: Optional[Difficulty] = Field(None, description="Hardest difficulty level to keep")
+    seed: Optional[int] = Field(None, ge=0, description="Seed for reproducible output; random by default")
+    prefix: str = Field("generated-", max_length=64, description="Prefix of the generated names")
+    max_attempts: Optional[int] = Field(
+        None, ge=1, description="Boards to try before giving up; 20 per requested puzzle by default"
+    )
+
+    @model_validator(mode="after")
+    def check_band(self) -> "NonogramGenerateRequest":
+        levels = get_args(Difficulty)
+        if (self.min_difficulty and self.max_difficulty
+                and levels.index(self.min_difficulty) > levels.index(self.max_difficulty)):
+            raise ValueError("min_difficulty must not be harder than max_difficulty")
+        return self
+
+
+class GeneratedNonogram(Nonogram):
+    """
+    Pydantic model for one generated puzzle, a line of the NDJSON stream.
+    """
+    unique: Optional[bool] = Field(None, description="Whether the board is the single solution, when checked")
+    difficulty: Optional[Difficulty] = Field(None, description="Difficulty level, when checked")
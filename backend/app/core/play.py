@@ -0,0 +1,199 @@
+"""
+Incremental checking of boards in play.
+
+A board being played is held server side as row and column bitmasks (bit i
+is cell i, as in the solver) together with the status of every line
+against the puzzle's clues. A check applies a sparse delta of changed
+cells and re-examines only the rows and columns those cells lie on, so its
+cost follows the number of changed lines rather than the board size.
+
+A board started by a check gets a random session token, which later checks
+name it by. Boards also carry a Zobrist hash: every cell has a fixed 64-bit
+key and a board hashes to the XOR of the keys of its filled cells, so a
+cell change updates the hash with one XOR. The hash only confirms that the
+client and the server agree on the board; it cannot name one, since players
+of the same puzzle often hold identical boards (every fresh board hashes
+to 0). Boards are kept per process in a bounded LRU; a board that was
+evicted, or is held by another worker, is unknown and the client starts
+over by sending the full board.
+"""
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .descriptors import line_clue
+from .solver import Clue, normalize_clue, solve_line
+
+# Boards in play kept per process; the least recently checked go first
+CHECK_SESSIONS = int(os.environ.get("NONOGRAM_CHECK_SESSIONS", 10000))
+# Checks of a session with at most this many changed cells re-examine few enough
+# lines to run on the event loop; starting a board examines every line
+CHECK_INLINE_CHANGES = int(os.environ.get("NONOGRAM_CHECK_INLINE_CHANGES", 64))
+
+LINE_STATUSES = ("satisfied", "contradicted", "open")
+
+_MASK64 = (1 << 64) - 1
+
+
+class UnknownBoardError(LookupError):
+    """Raised when a check names a session not held by this process, or a board hash other than its own"""
+
+
+def cell_key(index: int) -> int:
+    """Zobrist key of the cell at row-major `index` (splitmix64 of the index)"""
+    z = (index + 1) * 0x9E3779B97F4A7C15 & _MASK64
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & _MASK64
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB & _MASK64
+    return z ^ (z >> 31)
+
+
+def mask_clue(mask: int, length: int) -> List[int]:
+    """Clue of a line given as a bitmask, with the run-length logic of calculate_descriptors"""
+    return line_clue(mask >> i & 1 for i in range(length))
+
+
+def normalize_clues(descriptors: Dict[str, List[List[int]]]) -> List[Clue]:
+    """Clues of a puzzle as PlayState indexes its lines: the rows, then the columns"""
+    return [normalize_clue(clue) for clue in descriptors.get("rows", [])] + \
+        [normalize_clue(clue) for clue in descriptors.get("columns", [])]
+
+
+class PlayState:
+    """
+    One board in play for one puzzle: its cells, the status of each line
+    and the number of lines in each status.
+    Line indexes run over the rows first, then the columns.
+    """
+    __slots__ = ("name", "descriptors", "clues", "width", "height", "rows", "columns",
+                 "status", "counts", "hash", "session")
+
+    def __init__(self, name: str, descriptors: Dict[str, List[List[int]]], board: Optional[Sequence[Sequence[bool]]] = None,
+                 clues: Optional[List[Clue]] = None):
+        self.name = name
+        # Kept to tell whether the puzzle was replaced since the board was started
+        self.descriptors = descriptors
+        rows = descriptors.get("rows", [])
+        columns = descriptors.get("columns", [])
+        # Boards of one puzzle may share the clues (see normalize_clues); they are only read
+        self.clues: List[Clue] = clues if clues is not None else normalize_clues(descriptors)
+        self.height = len(rows)
+        self.width = len(columns)
+        self.rows = [0] * self.height
+        self.columns = [0] * self.width
+        self.hash = 0
+        # Token of the check session holding the board, given by CheckSessions
+        self.session: Optional[str] = None
+        if board is not None:
+            if len(board) != self.height or any(len(row) != self.width for row in board):
+                raise ValueError(f"Expected a {self.width}x{self.height} board")
+            for r, row in enumerate(board):
+                for c, filled in enumerate(row):
+                    if filled:
+                        self._toggle(r, c)
+        self.status = [self._line_status(index) for index in range(self.height + self.width)]
+        self.counts = {status: 0 for status in LINE_STATUSES}
+        for status in self.status:
+            self.counts[status] += 1
+
+    @property
+    def board_hash(self) -> str:
+        return f"{self.hash:016x}"
+
+    @property
+    def complete(self) -> bool:
+        """Whether every row and column matches its clue"""
+        return self.counts["satisfied"] == len(self.status)
+
+    def _toggle(self, r: int, c: int) -> None:
+        self.rows[r] ^= 1 << c
+        self.columns[c] ^= 1 << r
+        self.hash ^= cell_key(r * self.width + c)
+
+    def _line_status(self, index: int) -> str:
+        if index < self.height:
+            mask, length = self.rows[index], self.width
+        else:
+            mask, length = self.columns[index - self.height], self.height
+        clue = self.clues[index]
+        if normalize_clue(mask_clue(mask, length)) == clue:
+            return "satisfied"
+        # Unfilled cells may still be filled: contradicted when no arrangement covers the filled ones
+        if solve_line(clue, length, mask, 0) is None:
+            return "contradicted"
+        return "open"
+
+    def apply(self, changes: Iterable[Tuple[int, int, bool]]) -> List[int]:
+        """
+        Set cells (row, column, filled) and update the status of the lines
+        they lie on. Returns the indexes of the lines that were re-examined,
+        in order. Raises ValueError for a cell outside the board, before
+        changing anything.
+        """
+        changes = list(changes)
+        for r, c, _ in changes:
+            if not (0 <= r < self.height and 0 <= c < self.width):
+                raise ValueError(f"Cell ({r}, {c}) is outside the {self.width}x{self.height} board")
+        touched: Set[int] = set()
+        for r, c, filled in changes:
+            if bool(self.rows[r] >> c & 1) != filled:
+                self._toggle(r, c)
+                touched.update((r, self.height + c))
+        for index in touched:
+            status = self._line_status(index)
+            self.counts[self.status[index]] -= 1
+            self.counts[status] += 1
+            self.status[index] = status
+        return sorted(touched)
+
+    def all_lines(self) -> List[int]:
+        return list(range(self.height + self.width))
+
+    def line(self, index: int) -> Tuple[str, int, List[int]]:
+        """(axis, index along the axis, current clue) of a line"""
+        if index < self.height:
+            return "row", index, mask_clue(self.rows[index], self.width)
+        c = index - self.height
+        return "column", c, mask_clue(self.columns[c], self.height)
+
+
+class CheckSessions:
+    """
+    Boards in play, keyed by puzzle name and session token, in LRU order.
+    A board is taken out while a check changes it and put back afterwards,
+    so concurrent checks of one session cannot interleave.
+    """
+    def __init__(self, max_sessions: int = CHECK_SESSIONS):
+        self.max_sessions = max_sessions
+        self._states: "OrderedDict[Tuple[str, str], PlayState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, name: str, session: str, board_hash: Optional[str] = None) -> PlayState:
+        """
+        Remove and return the board of a session. Raises UnknownBoardError
+        if it is not held, or, leaving it held, if `board_hash` is given and
+        is not the board's hash.
+        """
+        with self._lock:
+            state = self._states.pop((name, session), None)
+        if state is None:
+            raise UnknownBoardError(f"Unknown session {session!r} of '{name}'; send the full board")
+        if board_hash is not None and board_hash.lower() != state.board_hash:
+            self.put(state)
+            raise UnknownBoardError(f"Board {board_hash!r} is not the board of session {session!r}; send the full board")
+        return state
+
+    def put(self, state: PlayState) -> None:
+        """Hold a board, under a new session token if it has none yet"""
+        if state.session is None:
+            state.session = secrets.token_urlsafe(16)
+        key = (state.name, state.session)
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._states)
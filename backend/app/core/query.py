@@ -0,0 +1,212 @@
+"""
+Clue search query language.
+
+A query is a list of terms separated by whitespace, all of which must hold:
+
+    row:3,1         a row whose clue is exactly 3 1
+    col:5,*         a column clue starting with 5
+    any:*,1,1       a row or column clue ending with 1 1
+    row:*,3,1,*     a row clue containing 3 1 as consecutive numbers
+    3,1             same as any:3,1
+    size:15x15      width and height; either side may be * or a range
+    width:10..20    inclusive range; also 10.., ..20, >=10, >10, <=20, <20
+    height:<10      number of rows
+    filled:>100     number of filled cells, i.e. the sum of the row clues
+    difficulty:easy difficulty level, or a range of levels such as
+                    easy..medium or >=medium; numbers match the score
+
+A leading `*` may also be written without its comma (`*3,1*`). Clue terms
+are answered from the n-gram and clue postings of the ClueIndex, ranges
+from its sorted indexes; only the smallest candidate set is materialised
+and the remaining range terms are checked per candidate.
+"""
+import re
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+from .difficulty import DIFFICULTY_LEVELS, level_scores
+from .index import ATTRIBUTES, ClueIndex, CluePattern
+
+# Term keys naming a clue axis, mapped to (rows, columns)
+_AXES = {
+    "row": (True, False),
+    "rows": (True, False),
+    "col": (False, True),
+    "column": (False, True),
+    "columns": (False, True),
+    "any": (True, True),
+}
+
+_NUMBER = re.compile(r"\d+")
+_RANGE = re.compile(r"(\d*)\.\.(\d*)")
+_COMPARISON = re.compile(r"(>=|<=|>|<|=)?(\d+)")
+_SIZE_SEPARATOR = re.compile(r"[x×]", re.IGNORECASE)
+_LEVEL = "|".join(DIFFICULTY_LEVELS)
+_LEVEL_RANGE = re.compile(rf"({_LEVEL})?\.\.({_LEVEL})?")
+_LEVEL_COMPARISON = re.compile(rf"(>=|<=|>|<|=)?({_LEVEL})")
+
+# Upper bound on the number of terms in one query
+MAX_TERMS = 16
+
+
+class ClueTerm(NamedTuple):
+    """A clue pattern that some row and/or column must match"""
+    rows: bool
+    columns: bool
+    pattern: CluePattern
+
+
+class RangeTerm(NamedTuple):
+    """Inclusive bounds on one of ATTRIBUTES; None leaves a bound open"""
+    attribute: str
+    low: Optional[int]
+    high: Optional[int]
+
+
+class Query(NamedTuple):
+    """A parsed query: clue terms in query order, then merged range terms"""
+    clues: Tuple[ClueTerm, ...]
+    ranges: Tuple[RangeTerm, ...]
+
+
+def parse_pattern(text: str) -> CluePattern:
+    """Parse a clue pattern such as `3,1`, `5,*`, `*,1` or `*3,1*`"""
+    anchor_start = not text.startswith("*")
+    anchor_end = not text.endswith("*")
+    body = text[0 if anchor_start else 1:len(text) if anchor_end else len(text) - 1].strip(",")
+    parts = body.split(",") if body else []
+    if not all(_NUMBER.fullmatch(part.strip()) for part in parts):
+        raise ValueError(f"Invalid clue pattern {text!r}")
+    numbers = tuple(int(part) for part in parts)
+    if not numbers and anchor_start and anchor_end:
+        raise ValueError("Empty clue pattern")
+    return CluePattern(numbers, anchor_start, anchor_end)
+
+
+def parse_range(attribute: str, text: str) -> RangeTerm:
+    """Parse a bound such as `15`, `10..20`, `10..`, `>=10` or `<20`; `*` is unbounded"""
+    if text == "*":
+        return RangeTerm(attribute, None, None)
+    match = _RANGE.fullmatch(text)
+    if match:
+        low, high = (int(bound) if bound else None for bound in match.groups())
+        return RangeTerm(attribute, low, high)
+    match = _COMPARISON.fullmatch(text)
+    if not match:
+        raise ValueError(f"Invalid {attribute} {text!r}")
+    operator, value = match.group(1) or "=", int(match.group(2))
+    if operator == ">":
+        return RangeTerm(attribute, value + 1, None)
+    if operator == ">=":
+        return RangeTerm(attribute, value, None)
+    if operator == "<":
+        return RangeTerm(attribute, None, value - 1)
+    if operator == "<=":
+        return RangeTerm(attribute, None, value)
+    return RangeTerm(attribute, value, value)
+
+
+def parse_difficulty(text: str) -> RangeTerm:
+    """
+    Parse a difficulty bound: a level (`easy`), a range or comparison of
+    levels (`easy..medium`, `>=medium`), or a score range as for parse_range
+    """
+    text = text.lower()
+    match = _LEVEL_RANGE.fullmatch(text)
+    if match and any(match.groups()):
+        low, high = match.groups()
+        return RangeTerm(
+            "difficulty", level_scores(low)[0] if low else None, level_scores(high)[1] if high else None
+        )
+    match = _LEVEL_COMPARISON.fullmatch(text)
+    if match:
+        operator, level = match.group(1) or "=", match.group(2)
+        low, high = level_scores(level)
+        if operator == ">":
+            return RangeTerm("difficulty", high + 1, None)
+        if operator == ">=":
+            return RangeTerm("difficulty", low, None)
+        if operator == "<":
+            return RangeTerm("difficulty", None, low - 1)
+        if operator == "<=":
+            return RangeTerm("difficulty", None, high)
+        return RangeTerm("difficulty", low, high)
+    return parse_range("difficulty", text)
+
+
+def _merge_ranges(ranges: List[RangeTerm]) -> Tuple[RangeTerm, ...]:
+    """Intersect the ranges given for the same attribute"""
+    merged = {}
+    for term in ranges:
+        current = merged.get(term.attribute)
+        if current is None:
+            merged[term.attribute] = term
+            continue
+        lows = [bound for bound in (current.low, term.low) if bound is not None]
+        highs = [bound for bound in (current.high, term.high) if bound is not None]
+        merged[term.attribute] = RangeTerm(
+            term.attribute, max(lows) if lows else None, min(highs) if highs else None
+        )
+    return tuple(merged[attribute] for attribute in ATTRIBUTES if attribute in merged)
+
+
+def parse_query(text: str) -> Query:
+    """Parse a query; raises ValueError with a readable message on syntax errors"""
+    terms = text.split()
+    if not terms:
+        raise ValueError("Empty query")
+    if len(terms) > MAX_TERMS:
+        raise ValueError(f"A query may have at most {MAX_TERMS} terms")
+
+    clues: List[ClueTerm] = []
+    ranges: List[RangeTerm] = []
+    for term in terms:
+        key, separator, value = term.partition(":")
+        if not separator:
+            key, value = "any", term
+        key = key.lower()
+        if key in _AXES:
+            clues.append(ClueTerm(*_AXES[key], parse_pattern(value)))
+        elif key == "size":
+            sides = _SIZE_SEPARATOR.split(value)
+            if len(sides) != 2:
+                raise ValueError(f"Invalid size {value!r}, expected WIDTHxHEIGHT")
+            ranges.append(parse_range("width", sides[0]))
+            ranges.append(parse_range("height", sides[1]))
+        elif key == "difficulty":
+            ranges.append(parse_difficulty(value))
+        elif key in ATTRIBUTES:
+            ranges.append(parse_range(key, value))
+        else:
+            raise ValueError(f"Unknown search term {key!r}")
+    return Query(tuple(dict.fromkeys(clues)), _merge_ranges(ranges))
+
+
+def run_query(index: ClueIndex, query: Query) -> List[str]:
+    """Names of the nonograms matching every term, in catalogue order"""
+    candidates: Optional[Set[str]] = None
+    for term in query.clues:
+        names = index.match(term.pattern, rows=term.rows, columns=term.columns)
+        candidates = names if candidates is None else candidates & names
+        if not candidates:
+            return []
+
+    ranges = [term for term in query.ranges if term.low is not None or term.high is not None]
+    if candidates is None:
+        if not ranges:
+            return index.names()
+        # Start from the most selective range, counted by bisection alone
+        narrowest = min(ranges, key=lambda term: index.sorted_by(term.attribute).count(term.low, term.high))
+        ranges.remove(narrowest)
+        candidates = set(index.sorted_by(narrowest.attribute).range(narrowest.low, narrowest.high))
+
+    for term in ranges:
+        position = ATTRIBUTES.index(term.attribute)
+        low = term.low if term.low is not None else float("-inf")
+        high = term.high if term.high is not None else float("inf")
+        # Names without a value (puzzles not analysed yet) match no range
+        candidates = {
+            name for name in candidates
+            if index.attributes(name)[position] is not None and low <= index.attributes(name)[position] <= high
+        }
+    return index.in_order(candidates)
+
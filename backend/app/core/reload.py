@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from .executor import ExecutorSaturated, JobExecutor, job_executor
+
+try:
+    import watchfiles
+except ImportError:  # pragma: no cover - watchfiles ships with uvicorn[standard]
+    watchfiles = None
+
+logger = logging.getLogger(__name__)
+
+
+class ReloadStrategy:
+    """
+    Decides when a NonogramDataManager looks at its data file again.
+    The manager calls `attach` once, `on_access` on every read and `close`
+    when it is discarded; reloading itself is done by `manager.refresh()`.
+    """
+    def attach(self, manager) -> None:
+        """Called once the manager has loaded its initial snapshot"""
+
+    def on_access(self, manager) -> None:
+        """Called on the request path before the current snapshot is read"""
+
+    def close(self) -> None:
+        """Release any background resources"""
+
+
+class ManualReloadStrategy(ReloadStrategy):
+    """
+    Never reloads on its own; data only changes through `manager.refresh()`.
+    """
+
+
+class IntervalReloadStrategy(ReloadStrategy):
+    """
+    Checks the data file for changes at most once every `interval_ms`.
+    The check is a single stat() call and the file is only parsed again
+    when its modification time or size differs from the current snapshot.
+    With an `executor` the check runs on its I/O pool and the request that
+    triggered it is served from the current snapshot without waiting.
+    """
+    def __init__(self, interval_ms: int = 1000, executor: Optional[JobExecutor] = None):
+        self._interval = interval_ms / 1000.0
+        self._next_check = 0.0
+        self._executor = executor
+        self._pending = None
+
+    def attach(self, manager) -> None:
+        self._next_check = time.monotonic() + self._interval
+
+    def on_access(self, manager) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self._interval
+        if self._executor is None:
+            manager.refresh()
+            return
+        if self._pending is not None and not self._pending.done():
+            return
+        try:
+            self._pending = self._executor.submit_io(manager.refresh)
+        except ExecutorSaturated:
+            # Try again after the next interval
+            pass
+
+
+class WatcherReloadStrategy(ReloadStrategy):
+    """
+    Watches the store's files from a background thread so request handlers
+    never touch the disk. Uses inotify (through watchfiles) when available and
+    falls back to polling every `poll_interval_ms`.
+    """
+    def __init__(self, poll_interval_ms: int = 1000, use_notify: bool = True):
+        self._poll_interval = poll_interval_ms / 1000.0
+        self._use_notify = use_notify and watchfiles is not None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, manager) -> None:
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(manager,),
+            name="nonogram-reload-watcher",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, manager) -> None:
+        if self._use_notify:
+            self._watch(manager)
+        else:
+            self._poll(manager)
+
+    def _watch(self, manager) -> None:
+        """Wait for filesystem events on the store's files"""
+        targets = set(manager.store.watch_paths())
+        if not targets:
+            self._poll(manager)
+            return
+        directories = sorted({os.path.dirname(target) for target in targets})
+        try:
+            # Editors and deploy scripts often replace the file, so watch the directory
+            for _ in watchfiles.watch(
+                *directories,
+                watch_filter=lambda change, path: os.path.abspath(path) in targets,
+                stop_event=self._stop,
+                recursive=False,
+                debounce=200,
+                rust_timeout=int(self._poll_interval * 1000)
+            ):
+                manager.refresh()
+        except Exception as e:
+            logger.error("Error watching %s, falling back to polling: %s", ", ".join(sorted(targets)), e)
+            self._poll(manager)
+
+    def _poll(self, manager) -> None:
+        """Check the data file on a fixed interval"""
+        while not self._stop.wait(self._poll_interval):
+            manager.refresh()
+
+    def close(self) -> None:
+        self._stop.set()
+
+
+def reload_strategy_from_env() -> ReloadStrategy:
+    """
+    Build the reload strategy selected by NONOGRAM_RELOAD_MODE
+    ("interval", "watch" or "manual") and NONOGRAM_RELOAD_INTERVAL_MS.
+    NONOGRAM_RELOAD_BACKGROUND=1 moves interval checks to the I/O pool.
+    """
+    mode = os.environ.get("NONOGRAM_RELOAD_MODE", "interval").lower()
+    interval_ms = int(os.environ.get("NONOGRAM_RELOAD_INTERVAL_MS", 1000))
+    background = os.environ.get("NONOGRAM_RELOAD_BACKGROUND", "1").lower() in ("1", "true", "yes")
+
+    if mode == "watch":
+        return WatcherReloadStrategy(poll_interval_ms=interval_ms)
+    if mode == "manual":
+        return ManualReloadStrategy()
+    return IntervalReloadStrategy(interval_ms=interval_ms, executor=job_executor if background else None)
@@ -0,0 +1,283 @@
+"""
+Catalogue shared by the worker processes of one host.
+
+Without it every gunicorn worker loads the catalogue on its own and holds
+a private copy of every board. With NONOGRAM_STORE=shared one loader
+compiles the source store (the JSON data file) into a catalogue file (see
+catalogue_file) in a shared directory and publishes it by advancing a
+generation counter. Workers map the file of the current generation, so
+boards are held once, in the page cache, for all of them.
+
+The shared directory holds:
+
+- catalogue-<generation>.bin: compiled catalogues; the current and the
+  previous generation are kept, older ones are removed (workers that still
+  map them keep their pages until they move on);
+- generation: the current generation as an 8-byte little-endian integer.
+  Workers map it, so a reload check is a memory read;
+- published.json: the generation and the source fingerprint it was
+  compiled from, so an unchanged source is not compiled again;
+- lock: serialises loaders.
+
+The loader is the gunicorn master (see gunicorn.conf.py): it publishes
+before forking the workers and republishes whenever the source changes.
+When nothing was published yet, the first worker to take the lock does it
+and the others attach to its result. Workers switch to a new generation at
+their next reload check, so all of them serve it within one reload
+interval of the publish.
+"""
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from typing import List, Optional, Set
+
+from .catalogue_file import CatalogueFile, CatalogueFileError, write_catalogue_file
+from .difficulty import analyze_difficulty_from_env, analyze_missing
+from .snapshot import Fingerprint
+from .storage import DEFAULT_JSON_PATH, JsonFileStore, NonogramStore, StoreContents, StoreError
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows, where workers are not forked
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_COUNTER = struct.Struct("<Q")
+
+_CATALOGUE_NAME = re.compile(r"catalogue-(\d+)\.bin$")
+
+
+def default_shared_directory() -> str:
+    """Shared directory used when NONOGRAM_SHARED_DIR is not set: tmpfs when the host has one"""
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm/nonogram-catalogue"
+    return os.path.join(os.path.dirname(DEFAULT_JSON_PATH), "shared")
+
+
+class _FileLock:
+    """
+    Exclusive lock on a file, held across processes.
+
+    flock() locks belong to the open file, which a forked child shares
+    through its copy of the descriptor: a gunicorn worker forked while the
+    master's publisher holds the lock would keep it locked after the master
+    releases it. Children therefore close the descriptors of the locks held
+    when they were forked (O_CLOEXEC covers children that exec).
+    """
+    _held: Set["_FileLock"] = set()
+
+    def __init__(self, path: str):
+        self._path = path
+        self._fd: Optional[int] = None
+
+    def __enter__(self) -> "_FileLock":
+        self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT | getattr(os, "O_CLOEXEC", 0), 0o644)
+        _FileLock._held.add(self)
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._close()
+                raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Closing the descriptor releases the lock
+        self._close()
+
+    def _close(self) -> None:
+        _FileLock._held.discard(self)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @classmethod
+    def _forget_inherited(cls) -> None:
+        """In a forked child: drop the copies of the parent's held locks"""
+        for lock in list(cls._held):
+            lock._close()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_FileLock._forget_inherited)
+
+
+class SharedCatalogueStore(NonogramStore):
+    """
+    Read-only store serving the catalogue a loader published in `directory`
+    from `source`. Its fingerprint is (generation, 0).
+    With `analyze_difficulty` (the default unless NONOGRAM_DIFFICULTY
+    turns it off) the loader analyses puzzles that have no difficulty yet,
+    so the published catalogue carries them and workers need not analyse
+    anything. That happens once per version of the source, since an
+    unchanged source is not published again.
+    """
+    def __init__(self, directory: str, source: NonogramStore, analyze_difficulty: Optional[bool] = None):
+        self.directory = directory
+        self.source = source
+        if analyze_difficulty is None:
+            analyze_difficulty = analyze_difficulty_from_env()
+        self.analyze_difficulty = analyze_difficulty is not False
+        self._counter: Optional[mmap.mmap] = None
+        self._counter_lock = threading.Lock()
+
+    @property
+    def generation_path(self) -> str:
+        return os.path.join(self.directory, "generation")
+
+    def catalogue_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"catalogue-{generation}.bin")
+
+    def _map_counter(self) -> mmap.mmap:
+        with self._counter_lock:
+            if self._counter is None:
+                os.makedirs(self.directory, exist_ok=True)
+                fd = os.open(self.generation_path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    if os.fstat(fd).st_size < _COUNTER.size:
+                        os.ftruncate(fd, _COUNTER.size)
+                    self._counter = mmap.mmap(fd, _COUNTER.size, access=mmap.ACCESS_READ)
+                finally:
+                    os.close(fd)
+            return self._counter
+
+    def generation(self) -> int:
+        """The published generation; 0 before the first publish"""
+        try:
+            return _COUNTER.unpack_from(self._map_counter())[0]
+        except OSError as e:
+            raise StoreError(f"Cannot read the shared catalogue generation: {e}")
+
+    def fingerprint(self) -> Optional[Fingerprint]:
+        generation = self.generation()
+        return (generation, 0) if generation else None
+
+    def load(self) -> StoreContents:
+        generation = self.generation()
+        if generation == 0:
+            generation = self.publish()
+        try:
+            try:
+                catalogue = CatalogueFile(self.catalogue_path(generation))
+            except FileNotFoundError:
+                # Superseded twice and removed since the counter was read
+                generation = self.generation()
+                catalogue = CatalogueFile(self.catalogue_path(generation))
+            return StoreContents(catalogue.entries(), (generation, 0), catalogue.digest)
+        except (OSError, CatalogueFileError) as e:
+            raise StoreError(f"Cannot read the shared catalogue: {e}")
+
+    def publish(self) -> int:
+        """
+        Compile the source into a new generation unless the current one was
+        compiled from the same version of it. Returns the current generation.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with _FileLock(os.path.join(self.directory, "lock")):
+                return self._publish()
+        except OSError as e:
+            raise StoreError(f"Cannot publish the shared catalogue: {e}")
+
+    def _publish(self) -> int:
+        generation = self.generation()
+        source_fingerprint = self.source.fingerprint()
+        published = self._published()
+        if (generation and published.get("generation") == generation
+                and published.get("fingerprint") == _as_list(source_fingerprint)
+                and os.path.exists(self.catalogue_path(generation))):
+            return generation
+
+        contents = self.source.load()
+        if self.analyze_difficulty:
+            analyze_missing(contents.entries)
+        generation += 1
+        try:
+            write_catalogue_file(self.catalogue_path(generation), contents.entries, contents.digest, contents.fingerprint)
+        except ValueError as e:
+            raise StoreError(f"Cannot compile the catalogue: {e}")
+        self._write_generation(generation)
+        self._write_published(generation, contents.fingerprint)
+        self._prune(generation)
+        logger.info("Published catalogue generation %d (%d puzzles)", generation, len(contents.entries))
+        return generation
+
+    def _write_generation(self, generation: int) -> None:
+        # A plain write rather than through a mapping, so file watchers see it
+        fd = os.open(self.generation_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, _COUNTER.pack(generation), 0)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _published(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, "published.json")) as f:
+                published = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return published if isinstance(published, dict) else {}
+
+    def _write_published(self, generation: int, fingerprint: Optional[Fingerprint]) -> None:
+        path = os.path.join(self.directory, "published.json")
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({"generation": generation, "fingerprint": _as_list(fingerprint)}, f)
+        os.replace(temporary, path)
+
+    def _prune(self, generation: int) -> None:
+        for filename in os.listdir(self.directory):
+            match = _CATALOGUE_NAME.match(filename)
+            if match is not None and int(match.group(1)) < generation - 1:
+                try:
+                    os.unlink(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
+
+    def watch_paths(self) -> List[str]:
+        return [os.path.abspath(self.generation_path)]
+
+    def close(self) -> None:
+        with self._counter_lock:
+            if self._counter is not None:
+                self._counter.close()
+                self._counter = None
+
+
+def _as_list(fingerprint: Optional[Fingerprint]) -> Optional[List[int]]:
+    """A fingerprint as it reads back from JSON"""
+    return list(fingerprint) if fingerprint is not None else None
+
+
+def publish_until(store: SharedCatalogueStore, stop: threading.Event, interval_ms: int = 1000) -> None:
+    """Republish whenever the source changes, checking every `interval_ms`, until `stop` is set"""
+    while not stop.wait(interval_ms / 1000.0):
+        try:
+            store.publish()
+        except StoreError as e:
+            # Workers keep serving the current generation
+            logger.error("Error publishing the shared catalogue: %s", e)
+
+
+def shared_store_from_env(json_file_path: str = DEFAULT_JSON_PATH) -> Optional[SharedCatalogueStore]:
+    """
+    The shared store when NONOGRAM_STORE is "shared", else None. Its
+    directory is NONOGRAM_SHARED_DIR and its source the JSON data file.
+    """
+    if os.environ.get("NONOGRAM_STORE", "json").lower() != "shared":
+        return None
+    directory = os.environ.get("NONOGRAM_SHARED_DIR") or default_shared_directory()
+    return SharedCatalogueStore(directory, JsonFileStore(json_file_path))
+
+
+if __name__ == "__main__":
+    # Publish once, e.g. from a deploy script or cron job: python -m app.core.shared_catalogue
+    logging.basicConfig(level=logging.INFO)
+    directory = os.environ.get("NONOGRAM_SHARED_DIR") or default_shared_directory()
+    print(SharedCatalogueStore(directory, JsonFileStore(DEFAULT_JSON_PATH)).publish())
@@ -0,0 +1,278 @@
+"""
+Similarity search over the catalogue.
+
+Puzzles are compared with others of the same width and height, by one of
+two distances:
+
+- "board": Hamming distance between the bit-packed solutions, i.e. the
+  number of cells that differ;
+- "clues": the number of rows and columns whose clues differ, a clue
+  profile distance that also finds different solutions of the same clues.
+
+Each size group keeps bit-sampling LSH tables for both: every table keys
+a puzzle by a fixed random sample of its cells (or lines), so puzzles at a
+small distance share a key in at least one table with high probability and
+identical ones always do. Queries compute exact distances only for the
+puzzles sharing a key, and small groups are simply scanned.
+"""
+import heapq
+import os
+import random
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .bitboard import PackedBoard
+
+# Number of LSH tables per size group and distance
+LSH_TABLES = 8
+
+# Cells sampled per board table and lines sampled per clue table
+BOARD_SAMPLES = 16
+CLUE_SAMPLES = 4
+
+# Groups up to this size are scanned instead of probed through the tables
+EXACT_SCAN_SIZE = 512
+
+METRICS = ("board", "clues")
+
+# Share of differing cells up to which a saved board counts as a near duplicate
+DEFAULT_NEAR_DUPLICATE_RATIO = 0.02
+
+ClueVector = Tuple[Tuple[int, ...], ...]
+
+
+class Neighbour(NamedTuple):
+    """A puzzle found by a similarity query and its distance to the query"""
+    name: str
+    distance: int
+
+
+class DuplicateNonogramError(Exception):
+    """Raised when a nonogram to be saved duplicates, or nearly duplicates, another one"""
+    def __init__(self, name: str, match: Neighbour, metric: str):
+        if metric == "board":
+            detail = f"{match.distance} cells differ" if match.distance else "same board"
+        else:
+            detail = "same clues"
+        super().__init__(f"Nonogram {name!r} duplicates {match.name!r} ({detail})")
+        self.name = name
+        self.match = match
+        self.metric = metric
+
+
+def clue_vector(descriptors: Mapping[str, List[List[int]]]) -> ClueVector:
+    """Row clues followed by column clues, as one comparable vector"""
+    return tuple(map(tuple, descriptors.get("rows", []))) + tuple(map(tuple, descriptors.get("columns", [])))
+
+
+def board_distance(a: int, b: int) -> int:
+    """Number of differing cells between two boards given as integers of their packed bits"""
+    return bin(a ^ b).count("1")
+
+
+def clue_distance(a: ClueVector, b: ClueVector) -> int:
+    """Number of lines whose clues differ"""
+    return sum(1 for x, y in zip(a, b) if x != y)
+
+
+class _Tables:
+    """
+    LSH tables over vectors of one size group, copy-on-write like the
+    clue index: with_changes shares every bucket it does not touch.
+    """
+    def __init__(self, samples: List[Tuple[int, ...]]):
+        self.samples = samples
+        self.buckets: List[Dict[object, Set[str]]] = [{} for _ in samples]
+
+    def copy(self) -> "_Tables":
+        tables = _Tables.__new__(_Tables)
+        tables.samples = self.samples
+        tables.buckets = [dict(table) for table in self.buckets]
+        return tables
+
+    def candidates(self, keys: Sequence[object]) -> Set[str]:
+        found: Set[str] = set()
+        for table, key in zip(self.buckets, keys):
+            found |= table.get(key, set())
+        return found
+
+    def edit(self, name: str, keys: Sequence[object], add: bool, copied: Set[Tuple[int, object]]) -> None:
+        for i, (table, key) in enumerate(zip(self.buckets, keys)):
+            if (i, key) not in copied:
+                copied.add((i, key))
+                table[key] = set(table.get(key, ()))
+            names = table[key]
+            if add:
+                names.add(name)
+            else:
+                names.discard(name)
+                if not names:
+                    del table[key]
+                    copied.discard((i, key))
+
+
+class _Group:
+    """Puzzles of one width and height with their LSH tables"""
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        stride_bits = PackedBoard.row_bytes(width) * 8
+        total_bits = stride_bits * height
+        # Seeded by the size, so every worker samples the same cells
+        rng = random.Random(f"{width}x{height}")
+        cells = [total_bits - 1 - (r * stride_bits + c) for r in range(height) for c in range(width)]
+        lines = list(range(width + height))
+        self.board_tables = _Tables([
+            tuple(rng.sample(cells, min(BOARD_SAMPLES, len(cells)))) for _ in range(LSH_TABLES)
+        ])
+        self.clue_tables = _Tables([
+            tuple(rng.sample(lines, min(CLUE_SAMPLES, len(lines)))) for _ in range(LSH_TABLES)
+        ])
+        self.boards: Dict[str, int] = {}
+        self.clues: Dict[str, ClueVector] = {}
+
+    def copy(self) -> "_Group":
+        group = _Group.__new__(_Group)
+        group.width = self.width
+        group.height = self.height
+        group.board_tables = self.board_tables.copy()
+        group.clue_tables = self.clue_tables.copy()
+        group.boards = dict(self.boards)
+        group.clues = dict(self.clues)
+        return group
+
+    def board_keys(self, board: int) -> List[int]:
+        return [sum(((board >> bit) & 1) << i for i, bit in enumerate(sample)) for sample in self.board_tables.samples]
+
+    def clue_keys(self, clues: ClueVector) -> List[Tuple]:
+        # Clues that do not match the board's size only miss a few keys
+        return [tuple(clues[line] if line < len(clues) else None for line in sample) for sample in self.clue_tables.samples]
+
+    def add(self, name: str, board: int, clues: ClueVector, copied: Dict[str, Set]) -> None:
+        self.boards[name] = board
+        self.clues[name] = clues
+        self.board_tables.edit(name, self.board_keys(board), True, copied["board"])
+        self.clue_tables.edit(name, self.clue_keys(clues), True, copied["clues"])
+
+    def remove(self, name: str, copied: Dict[str, Set]) -> None:
+        board = self.boards.pop(name)
+        clues = self.clues.pop(name)
+        self.board_tables.edit(name, self.board_keys(board), False, copied["board"])
+        self.clue_tables.edit(name, self.clue_keys(clues), False, copied["clues"])
+
+    def candidates(self, metric: str, board: int, clues: ClueVector, everything: bool) -> Iterable[str]:
+        if everything or len(self.boards) <= EXACT_SCAN_SIZE:
+            return self.boards.keys()
+        if metric == "board":
+            return self.board_tables.candidates(self.board_keys(board))
+        return self.clue_tables.candidates(self.clue_keys(clues))
+
+    def distances(self, metric: str, board: int, clues: ClueVector, names: Iterable[str]) -> Iterable[Neighbour]:
+        if metric == "board":
+            return (Neighbour(name, board_distance(board, self.boards[name])) for name in names)
+        return (Neighbour(name, clue_distance(clues, self.clues[name])) for name in names)
+
+
+def _new_copied() -> Dict[str, Set]:
+    return {"board": set(), "clues": set()}
+
+
+class SimilarityIndex:
+    """
+    Per-size LSH index of boards and clue vectors.
+    Never modified in place; with_changes returns an updated copy that
+    shares all size groups it does not touch.
+    """
+    def __init__(self, entries: Mapping[str, Tuple[PackedBoard, Mapping[str, List[List[int]]]]]):
+        self._groups: Dict[Tuple[int, int], _Group] = {}
+        self._sizes: Dict[str, Tuple[int, int]] = {}
+        copied: Dict[Tuple[int, int], Dict[str, Set]] = {}
+        for name, (board, descriptors) in entries.items():
+            self._add(name, board, descriptors, copied)
+
+    def _group(self, size: Tuple[int, int]) -> _Group:
+        group = self._groups.get(size)
+        if group is None:
+            group = self._groups[size] = _Group(*size)
+        return group
+
+    def _add(self, name: str, board: PackedBoard, descriptors: Mapping[str, List[List[int]]],
+             copied: Dict[Tuple[int, int], Dict[str, Set]]) -> None:
+        size = (board.width, board.height)
+        self._sizes[name] = size
+        self._group(size).add(name, int.from_bytes(board.bits, "big"), clue_vector(descriptors),
+                              copied.setdefault(size, _new_copied()))
+
+    def with_changes(self, removed: Iterable[str],
+                     added: Mapping[str, Tuple[PackedBoard, Mapping[str, List[List[int]]]]]) -> "SimilarityIndex":
+        """New index with `removed` names dropped and `added` (name: (board, descriptors)) inserted"""
+        index = SimilarityIndex.__new__(SimilarityIndex)
+        index._groups = dict(self._groups)
+        index._sizes = dict(self._sizes)
+        copied: Dict[Tuple[int, int], Dict[str, Set]] = {}
+
+        def editable(size: Tuple[int, int]) -> _Group:
+            # Copy a shared group the first time it is changed
+            if size not in copied:
+                copied[size] = _new_copied()
+                if size in index._groups:
+                    index._groups[size] = index._groups[size].copy()
+            return index._group(size)
+
+        for name in set(removed) | set(added):
+            size = index._sizes.pop(name, None)
+            if size is not None:
+                editable(size).remove(name, copied[size])
+        for name, (board, descriptors) in added.items():
+            editable((board.width, board.height))
+            index._add(name, board, descriptors, copied)
+        return index
+
+    def nearest(self, board: PackedBoard, descriptors: Mapping[str, List[List[int]]], k: int = 10,
+                metric: str = "board", exclude: Optional[str] = None) -> List[Neighbour]:
+        """
+        The k puzzles of the same size closest to a board and its clues,
+        nearest first. Large groups are probed through the LSH tables and
+        scanned only when the tables yield fewer than k candidates.
+        """
+        group = self._groups.get((board.width, board.height))
+        if group is None:
+            return []
+        bits = int.from_bytes(board.bits, "big")
+        clues = clue_vector(descriptors)
+        for everything in (False, True):
+            names = [name for name in group.candidates(metric, bits, clues, everything) if name != exclude]
+            if len(names) >= k or everything or len(group.boards) <= EXACT_SCAN_SIZE:
+                break
+        return heapq.nsmallest(k, group.distances(metric, bits, clues, names), key=lambda n: (n.distance, n.name))
+
+    def find_duplicate(self, board: PackedBoard, descriptors: Mapping[str, List[List[int]]],
+                       max_distance: int = 0, exclude: Optional[str] = None) -> Optional[Tuple[Neighbour, str]]:
+        """
+        A puzzle with the same clues, or a board at most `max_distance`
+        cells away, as (neighbour, metric); None if there is none. Exact
+        duplicates are always found; near ones with high probability.
+        """
+        group = self._groups.get((board.width, board.height))
+        if group is None:
+            return None
+        bits = int.from_bytes(board.bits, "big")
+        clues = clue_vector(descriptors)
+        for metric in METRICS:
+            names = [name for name in group.candidates(metric, bits, clues, False) if name != exclude]
+            limit = max_distance if metric == "board" else 0
+            matches = [n for n in group.distances(metric, bits, clues, names) if n.distance <= limit]
+            if matches:
+                return min(matches, key=lambda n: (n.distance, n.name)), metric
+        return None
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+
+def near_duplicate_ratio_from_env() -> float:
+    """
+    Near-duplicate threshold configured by NONOGRAM_NEAR_DUPLICATE_RATIO:
+    the share of cells that may differ, 0 for exact duplicates only and a
+    negative value to accept duplicates.
+    """
+    return float(os.environ.get("NONOGRAM_NEAR_DUPLICATE_RATIO", DEFAULT_NEAR_DUPLICATE_RATIO))
@@ -0,0 +1,476 @@
+import base64
+import bisect
+import binascii
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+from functools import cached_property
+from itertools import islice
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from . import metrics
+from .bitboard import PackedBoard
+from .difficulty import DIFFICULTY_LEVELS, LEVEL_SPAN, Difficulty
+from .encoding import compress, dumps
+from .index import Clue, ClueIndex
+from .query import Query, run_query
+from .similarity import SimilarityIndex
+from .models import Nonogram, NonogramCompact, NonogramList, NonogramSearchResult, NonogramSummary
+
+logger = logging.getLogger(__name__)
+
+# (st_mtime_ns, st_size) of the data file a snapshot was built from
+Fingerprint = Tuple[int, int]
+
+
+# Upper bound on distinct search queries cached per snapshot
+SEARCH_CACHE_SIZE = 1024
+
+# Compact board encodings offered next to the default list-of-lists JSON
+COMPACT_ENCODINGS = ("bitmap", "rle")
+
+# Sort key of puzzles without a difficulty, above every real score
+UNKNOWN_SCORE = len(DIFFICULTY_LEVELS) * LEVEL_SPAN
+
+
+def content_etag(body: bytes) -> str:
+    """Strong ETag for an encoded response body"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def encode_cursor(sort: str, position: str) -> str:
+    """Opaque cursor of a listing in `sort` order, pointing just after `position`"""
+    return base64.urlsafe_b64encode(f"{sort}:{position}".encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> str:
+    """Position a listing cursor points after; raises ValueError for malformed cursors or those of another sort"""
+    try:
+        raw = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True)
+        tag, separator, position = raw.decode("utf-8").partition(":")
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    if not separator or tag != sort:
+        raise ValueError(f"Cursor {cursor!r} does not continue a listing sorted by {sort}")
+    return position
+
+
+def _score_in(score: Optional[int], low: Optional[int], high: Optional[int]) -> bool:
+    """Whether a difficulty score is known and within [low, high]"""
+    return score is not None and (low is None or score >= low) and (high is None or score <= high)
+
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string above every string starting with `prefix`; None if unbounded"""
+    stripped = prefix.rstrip("\U0010ffff")
+    if not stripped:
+        return None
+    return stripped[:-1] + chr(ord(stripped[-1]) + 1)
+
+
+class CatalogueEntry:
+    """
+    One nonogram as held in memory: a bit-packed board, its clues and, once
+    analysed, its difficulty.
+    The board can instead be read on first use by `loader`; the width and
+    height are then given up front so listings never need to load it.
+    The board read is kept, unless `keep_board` is False: a loader that
+    returns a view into shared memory is cheaper to call again than its
+    board is to hold in every process.
+    """
+    __slots__ = ("_board", "_loader", "_keep_board", "descriptors", "width", "height", "difficulty")
+
+    def __init__(self, board: Optional[PackedBoard], descriptors: Dict[str, List[List[int]]],
+                 loader: Optional[Callable[[], PackedBoard]] = None, width: int = 0, height: int = 0,
+                 difficulty: Optional[Difficulty] = None, keep_board: bool = True):
+        if board is None and loader is None:
+            raise ValueError("A catalogue entry needs a board or a loader")
+        self._board = board
+        self._loader = loader
+        self._keep_board = keep_board
+        self.descriptors = descriptors
+        self.width = board.width if board is not None else width
+        self.height = board.height if board is not None else height
+        self.difficulty = difficulty
+
+    @property
+    def difficulty_score(self) -> Optional[int]:
+        return self.difficulty.score if self.difficulty is not None else None
+
+    @property
+    def board(self) -> PackedBoard:
+        """The packed board, loading it on first access (or every access, without keep_board)"""
+        board = self._board
+        if board is None:
+            board = self._loader()
+            if (board.width, board.height) != (self.width, self.height):
+                raise ValueError(f"Expected a {self.width}x{self.height} board, got {board.width}x{board.height}")
+            if self._keep_board:
+                self._board = board
+                self._loader = None
+        return board
+
+    def density(self) -> float:
+        """Fraction of filled cells"""
+        cells = self.width * self.height
+        return self.board.filled_count() / cells if cells else 0.0
+
+    @classmethod
+    def from_json(cls, entry: Dict[str, Any]) -> "CatalogueEntry":
+        """Convert an entry of the JSON data file; a malformed difficulty is dropped, to be analysed again"""
+        difficulty = entry.get("difficulty")
+        if difficulty is not None:
+            try:
+                difficulty = Difficulty.from_json(difficulty)
+            except ValueError as e:
+                logger.warning("Ignoring a stored difficulty: %s", e)
+                difficulty = None
+        return cls(PackedBoard.from_rows(entry.get("board", [])), entry.get("descriptors", {}), difficulty=difficulty)
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """
+    An encoded JSON response body and its ETag.
+    Instances are shared between requests and must not be mutated; the
+    compressed forms of the body are cached on them as they are requested.
+    """
+    body: bytes
+    etag: str
+    _compressed: Dict[str, bytes] = field(default_factory=dict, init=False, compare=False, repr=False)
+
+    def compressed(self, coding: str) -> bytes:
+        """The body in one of encoding.CONTENT_CODINGS, compressed on first use"""
+        body = self._compressed.get(coding)
+        metrics.cache_lookups.inc("compressed", "miss" if body is None else "hit")
+        if body is None:
+            body = self._compressed.setdefault(coding, compress(self.body, coding))
+        return body
+
+
+@dataclass(frozen=True)
+class CachedNonogram(CachedResponse):
+    """
+    A validated Nonogram together with its encoded JSON body and ETag.
+    The ETag is a hash of the body, so it survives reloads that leave the
+    puzzle unchanged.
+    """
+    model: Nonogram
+
+    @classmethod
+    def build(cls, name: str, entry: CatalogueEntry) -> "CachedNonogram":
+        """Validate and encode one catalogue entry"""
+        board = entry.board.to_rows()
+        model = Nonogram(
+            name=name,
+            board=board,
+            descriptors=entry.descriptors
+        )
+        # The validated values, encoded without a second pass through the model
+        body = dumps({"name": model.name, "board": board, "descriptors": model.descriptors})
+        return cls(body=body, etag=content_etag(body), model=model)
+
+
+@dataclass(frozen=True)
+class CatalogueSnapshot:
+    """
+    Immutable view of the nonogram catalogue at one point in time.
+    Reloads build a new snapshot and swap the reference, so readers holding
+    an older snapshot keep a consistent view for the rest of their request.
+    """
+    data: Mapping[str, CatalogueEntry]
+    clue_index: ClueIndex
+    fingerprint: Optional[Fingerprint] = None
+    version: int = 0
+    # Hash of the raw data file, identical across workers serving the same file
+    digest: str = hashlib.sha256(b"").hexdigest()
+    # Lazily filled response caches; they are dropped together with the snapshot
+    _nonograms: Dict[str, CachedNonogram] = field(default_factory=dict, compare=False, repr=False)
+    _responses: Dict[Any, CachedResponse] = field(default_factory=dict, compare=False, repr=False)
+    # Similarity index, built on first use since it needs every board loaded
+    _similarity: List[SimilarityIndex] = field(default_factory=list, compare=False, repr=False)
+
+    def snapshot_etag(self, *parts: str) -> str:
+        """Strong ETag for a response derived from the whole catalogue"""
+        return content_etag(":".join((self.digest,) + parts).encode("utf-8"))
+
+    def _loaded_entry(self, name: str) -> Optional[CatalogueEntry]:
+        """Entry with its board loaded; None if missing or its board cannot be read"""
+        entry = self.data.get(name)
+        if entry is None:
+            return None
+        try:
+            entry.board
+        except (ValueError, TypeError, OSError) as e:
+            logger.error("Error loading nonogram %s: %s", name, e)
+            return None
+        return entry
+
+    def get_cached(self, name: str) -> Optional[CachedNonogram]:
+        """Validated model and encoded body for a nonogram, built on first use"""
+        cached = self._nonograms.get(name)
+        metrics.cache_lookups.inc("nonogram", "miss" if cached is None else "hit")
+        if cached is None:
+            entry = self._loaded_entry(name)
+            if entry is None:
+                return None
+            cached = self._nonograms.setdefault(name, CachedNonogram.build(name, entry))
+        return cached
+
+    def get_compact(self, name: str, encoding: str) -> Optional[CachedResponse]:
+        """Encoded nonogram with its board in one of COMPACT_ENCODINGS"""
+        key = (encoding, name)
+        cached = self._responses.get(key)
+        metrics.cache_lookups.inc("compact", "miss" if cached is None else "hit")
+        if cached is None:
+            entry = self._loaded_entry(name)
+            if entry is None:
+                return None
+            board = entry.board
+            model = NonogramCompact(
+                name=name,
+                width=board.width,
+                height=board.height,
+                encoding=encoding,
+                board=board.to_base64() if encoding == "bitmap" else board.to_rle(),
+                descriptors=entry.descriptors
+            )
+            body = model.model_dump_json().encode("utf-8")
+            cached = self._responses.setdefault(key, CachedResponse(body, content_etag(body)))
+        return cached
+
+    def batch_body(self, names: List[str]) -> bytes:
+        """
+        Encoded NonogramBatchResult for the given names. The cached body of
+        every puzzle is spliced in as-is instead of being encoded again.
+        """
+        parts = []
+        missing = []
+        for name in dict.fromkeys(names):
+            cached = self.get_cached(name)
+            if cached is None:
+                missing.append(name)
+            else:
+                parts.append(dumps(name) + b":" + cached.body)
+        return b'{"nonograms":{' + b",".join(parts) + b'},"missing":' + dumps(missing) + b"}"
+
+    def list_response(self) -> CachedResponse:
+        """Encoded list of all nonogram names"""
+        cached = self._responses.get("list")
+        metrics.cache_lookups.inc("list", "miss" if cached is None else "hit")
+        if cached is None:
+            body = NonogramList(names=list(self.data.keys())).model_dump_json(exclude_none=True).encode("utf-8")
+            cached = self._responses.setdefault("list", CachedResponse(body, self.snapshot_etag("list")))
+        return cached
+
+    @cached_property
+    def sorted_names(self) -> List[str]:
+        """All names in code point order, for paginated and prefix listings"""
+        return sorted(self.data)
+
+    def _summary(self, name: str, fields: Tuple[str, ...]) -> NonogramSummary:
+        entry = self.data[name]
+        summary = NonogramSummary(name=name)
+        if "width" in fields:
+            summary.width = entry.width
+        if "height" in fields:
+            summary.height = entry.height
+        if "density" in fields and self._loaded_entry(name) is not None:
+            # The only projection that needs the board itself
+            summary.density = round(entry.density(), 4)
+        if "difficulty" in fields and entry.difficulty is not None:
+            summary.difficulty = entry.difficulty.level
+            summary.difficulty_score = entry.difficulty.score
+        return summary
+
+    @cached_property
+    def difficulty_order(self) -> List[Tuple[int, str]]:
+        """(score, name) of every puzzle from easiest to hardest; unanalysed ones last, scored UNKNOWN_SCORE"""
+        return sorted(
+            (entry.difficulty.score if entry.difficulty is not None else UNKNOWN_SCORE, name)
+            for name, entry in self.data.items()
+        )
+
+    def _name_page(self, prefix: str, after: Optional[str],
+                   low: Optional[int], high: Optional[int]) -> Iterator[Tuple[str, str]]:
+        """(cursor position, name) of the listed names in name order"""
+        names = self.sorted_names
+        start = bisect.bisect_left(names, prefix)
+        if after is not None:
+            start = max(start, bisect.bisect_right(names, after))
+        upper = _prefix_upper_bound(prefix)
+        end = bisect.bisect_left(names, upper, start) if upper is not None else len(names)
+        for i in range(start, end):
+            name = names[i]
+            if low is None and high is None or _score_in(self.data[name].difficulty_score, low, high):
+                yield name, name
+
+    def _difficulty_page(self, prefix: str, after: Optional[str],
+                         low: Optional[int], high: Optional[int]) -> Iterator[Tuple[str, str]]:
+        """(cursor position, name) of the listed names from easiest to hardest"""
+        order = self.difficulty_order
+        start = bisect.bisect_left(order, (low, "")) if low is not None else 0
+        if after is not None:
+            score, separator, name = after.partition(":")
+            if not separator or not score.isdigit():
+                raise ValueError("Invalid cursor for a listing by difficulty")
+            start = max(start, bisect.bisect_right(order, (int(score), name)))
+        # Unanalysed puzzles only appear in unfiltered listings
+        if low is not None or high is not None:
+            high = UNKNOWN_SCORE - 1 if high is None else min(high, UNKNOWN_SCORE - 1)
+        end = bisect.bisect_left(order, (high + 1, "")) if high is not None else len(order)
+        for i in range(start, end):
+            score, name = order[i]
+            if name.startswith(prefix):
+                yield f"{score}:{name}", name
+
+    def list_page(self, prefix: str = "", cursor: Optional[str] = None, limit: Optional[int] = None,
+                  fields: Tuple[str, ...] = (), sort: str = "name",
+                  difficulty: Tuple[Optional[int], Optional[int]] = (None, None)) -> CachedResponse:
+        """
+        Encoded page of the names starting with `prefix`, in name order or
+        by difficulty (`sort`), beginning after `cursor` and holding at
+        most `limit` names. `difficulty` restricts the page
+        to an inclusive range of scores and `fields` selects the metadata
+        listed under `items`. Raises ValueError for a malformed cursor or
+        one of another sort.
+        """
+        key = ("page", prefix, cursor, limit, fields, sort, difficulty)
+        cached = self._responses.get(key)
+        metrics.cache_lookups.inc("page", "miss" if cached is None else "hit")
+        if cached is None:
+            after = decode_cursor(cursor, sort) if cursor else None
+            pages = self._difficulty_page if sort == "difficulty" else self._name_page
+            listed = pages(prefix, after, *difficulty)
+            # One more than asked tells whether there is a next page
+            page = list(islice(listed, limit + 1)) if limit is not None else list(listed)
+            more = limit is not None and len(page) > limit
+            page = page[:limit]
+            names = [name for _, name in page]
+            listing = NonogramList(
+                names=names,
+                items=[self._summary(name, fields) for name in names] if fields else None,
+                next_cursor=encode_cursor(sort, page[-1][0]) if more else None
+            )
+            body = listing.model_dump_json(exclude_none=True).encode("utf-8")
+            cached = CachedResponse(body, self.snapshot_etag("list", json.dumps(key[1:])))
+            if len(self._responses) < SEARCH_CACHE_SIZE:
+                self._responses[key] = cached
+        return cached
+
+    def _sorted_matches(self, matches: List[str], sort: str) -> List[str]:
+        if sort == "difficulty":
+            return self.clue_index.in_attribute_order(matches, "difficulty")
+        return matches
+
+    def search_response(self, clue: Optional[Clue], sort: str = "catalogue") -> CachedResponse:
+        """
+        Encoded search result for an exact line clue; None matches nothing.
+        Matches are in catalogue order, or from easiest to hardest with
+        sort="difficulty".
+        """
+        key = ("search", clue, sort)
+        cached = self._responses.get(key)
+        metrics.cache_lookups.inc("search", "miss" if cached is None else "hit")
+        if cached is None:
+            matches = self._sorted_matches(self.clue_index.lookup(clue), sort) if clue is not None else []
+            body = NonogramSearchResult(matches=matches).model_dump_json().encode("utf-8")
+            tag = ",".join(map(str, clue)) if clue is not None else "invalid"
+            cached = CachedResponse(body, self.snapshot_etag("search", tag, sort))
+            if len(self._responses) < SEARCH_CACHE_SIZE:
+                self._responses[key] = cached
+        return cached
+
+    def query_response(self, query: Query, sort: str = "catalogue") -> CachedResponse:
+        """Encoded search result for a parsed query (see app.core.query), sorted as for search_response"""
+        key = ("query", query, sort)
+        cached = self._responses.get(key)
+        metrics.cache_lookups.inc("query", "miss" if cached is None else "hit")
+        if cached is None:
+            matches = self._sorted_matches(run_query(self.clue_index, query), sort)
+            body = NonogramSearchResult(matches=matches).model_dump_json().encode("utf-8")
+            cached = CachedResponse(body, self.snapshot_etag("query", repr(query), sort))
+            if len(self._responses) < SEARCH_CACHE_SIZE:
+                self._responses[key] = cached
+        return cached
+
+    def similarity_index(self) -> SimilarityIndex:
+        """Similarity index over all puzzles whose board can be loaded, built on first use"""
+        if not self._similarity:
+            entries = {}
+            for name in self.data:
+                entry = self._loaded_entry(name)
+                if entry is not None:
+                    entries[name] = (entry.board, entry.descriptors)
+            index = SimilarityIndex(entries)
+            if not self._similarity:
+                self._similarity.append(index)
+        return self._similarity[0]
+
+    def with_changes(self, upserts: Mapping[str, CatalogueEntry], deletes: List[str],
+                     fingerprint: Optional[Fingerprint], version: int, digest: str) -> "CatalogueSnapshot":
+        """
+        New snapshot with some puzzles created, replaced or deleted.
+        The search index is updated incrementally and cached responses of
+        untouched puzzles are carried over; catalogue-wide responses are not.
+        """
+        changed = set(upserts) | set(deletes)
+        removed = {name: self.data[name].descriptors for name in changed if name in self.data}
+        entries = dict(self.data)
+        for name in deletes:
+            entries.pop(name, None)
+        # Replaced puzzles keep their place in the catalogue, new ones go to the end
+        entries.update(upserts)
+        snapshot = CatalogueSnapshot(
+            data=MappingProxyType(entries),
+            clue_index=self.clue_index.with_changes(
+                removed,
+                {name: entry.descriptors for name, entry in upserts.items()},
+                {name: entry.difficulty_score for name, entry in upserts.items()}
+            ),
+            fingerprint=fingerprint,
+            version=version,
+            digest=digest
+        )
+        if self._similarity:
+            snapshot._similarity.append(self._similarity[0].with_changes(
+                deletes, {name: (entry.board, entry.descriptors) for name, entry in upserts.items()}
+            ))
+        snapshot._nonograms.update((name, cached) for name, cached in self._nonograms.items() if name not in changed)
+        snapshot._responses.update(
+            (key, cached) for key, cached in self._responses.items()
+            if isinstance(key, tuple) and key[0] in COMPACT_ENCODINGS and key[1] not in changed
+        )
+        return snapshot
+
+    @classmethod
+    def from_entries(cls, entries: Dict[str, CatalogueEntry], fingerprint: Optional[Fingerprint] = None,
+                     version: int = 0, digest: str = hashlib.sha256(b"").hexdigest()) -> "CatalogueSnapshot":
+        """Create a snapshot and its search index from loaded catalogue entries"""
+        return cls(
+            data=MappingProxyType(entries),
+            clue_index=ClueIndex(
+                {name: entry.descriptors for name, entry in entries.items()},
+                {name: entry.difficulty_score for name, entry in entries.items()}
+            ),
+            fingerprint=fingerprint,
+            version=version,
+            digest=digest
+        )
+
+    @classmethod
+    def build(cls, data: Dict[str, Dict[str, Any]], fingerprint: Optional[Fingerprint] = None,
+              version: int = 0, raw: bytes = b"") -> "CatalogueSnapshot":
+        """
+        Create a snapshot and its search index from freshly loaded JSON data.
+        Boards are bit-packed; entries whose board is not rectangular are skipped.
+        """
+        entries: Dict[str, CatalogueEntry] = {}
+        for name, entry in data.items():
+            try:
+                entries[name] = CatalogueEntry.from_json(entry)
+            except (ValueError, TypeError, AttributeError) as e:
+                logger.error("Error loading nonogram %s: %s", name, e)
+        return cls.from_entries(entries, fingerprint, version, hashlib.sha256(raw).hexdigest())
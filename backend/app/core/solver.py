@@ -0,0 +1,574 @@
+"""
+Nonogram solver.
+
+Lines are solved exactly with bitset arithmetic: for every block the set of
+start positions consistent with the known cells is computed with shifts and
+Kogge-Stone fills, once left to right and once right to left. A cell covered
+by every surviving placement (the overlap of the left-most and right-most
+placements and everything in between) is forced filled; a cell no placement
+covers is forced empty.
+
+The grid solver propagates line results through a dirty-line work queue, so
+only lines crossing newly determined cells are solved again. When
+propagation stalls it probes frontier cells for contradictions and finally
+branches, depth first, within optional node and time budgets.
+"""
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .descriptors import calculate_descriptors
+
+Clue = Tuple[int, ...]
+Board = List[List[bool]]
+
+# Distinct (clue, line state) results kept by the line-solver cache
+LINE_CACHE_SIZE = 1 << 16
+
+# Frontier cells probed per round before the solver falls back to branching
+PROBE_LIMIT = 48
+
+# Budgets applied to solves requested over the API
+DEFAULT_TIME_LIMIT = int(os.environ.get("NONOGRAM_SOLVE_TIME_LIMIT_MS", 2000)) / 1000.0
+DEFAULT_NODE_LIMIT = int(os.environ.get("NONOGRAM_SOLVE_NODE_LIMIT", 20000))
+
+# Tighter budgets for uniqueness checks, which run inline when creating puzzles
+UNIQUE_TIME_LIMIT = int(os.environ.get("NONOGRAM_UNIQUE_TIME_LIMIT_MS", 500)) / 1000.0
+UNIQUE_NODE_LIMIT = int(os.environ.get("NONOGRAM_UNIQUE_NODE_LIMIT", 5000))
+
+
+def _popcount(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+class Contradiction(Exception):
+    """
+    Raised when the known cells cannot satisfy the clues; `line` is the
+    line (rows first, then columns) found to have no arrangement, if known
+    """
+    def __init__(self, line: Optional[int] = None):
+        super().__init__(line)
+        self.line = line
+
+
+class SearchLimitReached(Exception):
+    """Raised when a solve runs out of its node or time budget"""
+
+
+def _spread_up(gen: int, pro: int, length: int) -> int:
+    """
+    Positions reachable from `gen` by moving towards higher bits, where a
+    move may only land on positions in `pro` (Kogge-Stone occluded fill).
+    """
+    shift = 1
+    while shift <= length:
+        gen |= pro & (gen << shift)
+        pro &= pro << shift
+        shift <<= 1
+    return gen
+
+
+def _spread_down(gen: int, pro: int, length: int) -> int:
+    """Mirror image of `_spread_up`, moving towards lower bits"""
+    shift = 1
+    while shift <= length:
+        gen |= pro & (gen >> shift)
+        pro &= pro >> shift
+        shift <<= 1
+    return gen
+
+
+def _run_starts(cells: int, run: int) -> int:
+    """Positions s such that bits s..s+run-1 of `cells` are all set"""
+    span = 1
+    while span < run:
+        step = min(span, run - span)
+        cells &= cells >> step
+        span += step
+    return cells
+
+
+def _extend(starts: int, run: int) -> int:
+    """Union of [s, s+run) over all s in `starts`"""
+    covered = starts
+    span = 1
+    while span < run:
+        step = min(span, run - span)
+        covered |= covered << step
+        span += step
+    return covered
+
+
+@lru_cache(maxsize=LINE_CACHE_SIZE)
+def solve_line(clue: Clue, length: int, filled: int, empty: int) -> Optional[Tuple[int, int]]:
+    """
+    Solve one line exactly.
+
+    `filled` and `empty` are bitmasks of the known cells (bit i is cell i).
+    Returns the (filled, empty) masks extended with every cell that has the
+    same value in all arrangements of the clue, or None when no arrangement
+    fits the known cells.
+    """
+    full = (1 << length) - 1
+    blocks = [block for block in clue if block > 0]
+    if not blocks:
+        return None if filled else (0, full)
+
+    passable = full & ~filled   # cells that may be part of a gap
+    open_cells = full & ~empty  # cells that may be part of a block
+
+    # Left to right: starts of each block consistent with everything before it
+    starts = []
+    reach = _spread_up(1, passable << 1, length)
+    for j, block in enumerate(blocks):
+        if j:
+            reach = _spread_up(starts[-1] << (blocks[j - 1] + 1), passable << 1, length)
+        fits = _run_starts(open_cells, block) & ~(filled >> block) & ~(filled << 1) & full
+        candidates = fits & reach
+        if not candidates:
+            return None
+        starts.append(candidates)
+
+    # Right to left: keep starts that also leave room for everything after them
+    valid = [0] * len(blocks)
+    back = _spread_down(1 << length, passable, length)
+    for j in range(len(blocks) - 1, -1, -1):
+        gap = 0 if j == len(blocks) - 1 else 1
+        valid[j] = starts[j] & (back >> (blocks[j] + gap))
+        if not valid[j]:
+            return None
+        back = _spread_down(valid[j], passable, length)
+
+    can_fill = 0
+    for j, block in enumerate(blocks):
+        can_fill |= _extend(valid[j], block)
+
+    # A cell can be empty when it lies in a gap of some arrangement
+    after = _spread_up(1 & passable, passable, length)
+    can_empty = 0
+    for j, block in enumerate(blocks):
+        before = _spread_down((valid[j] >> 1) & passable, passable, length)
+        can_empty |= after & before
+        after = _spread_up((valid[j] << block) & passable, passable, length)
+    can_empty |= after & _spread_down((1 << (length - 1)) & passable, passable, length)
+
+    forced_filled = full & ~can_empty
+    forced_empty = full & ~can_fill
+    if forced_filled & empty or forced_empty & filled:
+        return None
+    return filled | forced_filled, empty | forced_empty
+
+
+def normalize_clue(clue: Sequence[int]) -> Clue:
+    """Clue as a tuple without the [0] used for empty lines"""
+    return tuple(block for block in clue if block)
+
+
+@dataclass
+class SolveStats:
+    """Counters describing how much work a solve needed"""
+    line_solves: int = 0
+    propagation_rounds: int = 0
+    probes: int = 0
+    branches: int = 0
+    max_depth: int = 0
+    elapsed_ms: float = 0.0
+
+    @property
+    def nodes(self) -> int:
+        """Search nodes: probes plus branching decisions"""
+        return self.probes + self.branches
+
+
+@dataclass
+class SolveResult:
+    """
+    Outcome of a solve.
+
+    `status` is "solved" when at least one solution was found, "unsolvable"
+    when the clues admit none and "limit" when the budget ran out first.
+    `exhausted` tells whether the whole search space was explored, so a
+    single solution with exhausted=True is known to be unique.
+    """
+    status: str
+    solutions: List[Board] = field(default_factory=list)
+    exhausted: bool = False
+    stats: SolveStats = field(default_factory=SolveStats)
+
+    @property
+    def unique(self) -> Optional[bool]:
+        """True/False when uniqueness is known, None otherwise"""
+        if len(self.solutions) > 1:
+            return False
+        if self.exhausted:
+            return len(self.solutions) == 1
+        return None
+
+
+@dataclass
+class UniquenessReport:
+    """
+    Whether a board is the only solution of its clues.
+
+    `status` is "unique", "multiple" or "timeout" when the budget ran out
+    before the question was settled. For "multiple", `witness` lists the
+    (row, column) cells where a second solution differs from the board.
+    """
+    status: str
+    witness: List[Tuple[int, int]] = field(default_factory=list)
+    stats: SolveStats = field(default_factory=SolveStats)
+
+
+class _Grid:
+    """
+    Partially solved grid: known filled and empty cells per row (bit c is
+    column c) and per column (bit r is row r), kept in sync.
+    """
+    __slots__ = ("rows_filled", "rows_empty", "cols_filled", "cols_empty")
+
+    def __init__(self, height: int, width: int):
+        self.rows_filled = [0] * height
+        self.rows_empty = [0] * height
+        self.cols_filled = [0] * width
+        self.cols_empty = [0] * width
+
+    def copy(self) -> "_Grid":
+        grid = _Grid.__new__(_Grid)
+        grid.rows_filled = self.rows_filled[:]
+        grid.rows_empty = self.rows_empty[:]
+        grid.cols_filled = self.cols_filled[:]
+        grid.cols_empty = self.cols_empty[:]
+        return grid
+
+    def cell(self, r: int, c: int) -> Optional[bool]:
+        """True/False for known cells, None for unknown ones"""
+        if self.rows_filled[r] >> c & 1:
+            return True
+        if self.rows_empty[r] >> c & 1:
+            return False
+        return None
+
+    def to_board(self) -> Board:
+        width = len(self.cols_filled)
+        return [[bool(mask >> c & 1) for c in range(width)] for mask in self.rows_filled]
+
+
+def _parse_clues(axis: str, clues: object) -> List[Clue]:
+    """
+    Normalised clues of one axis. Raises ValueError unless `clues` is a
+    list of lists of integers, since jobs reach the solver without the API's
+    request validation.
+    """
+    if not isinstance(clues, list):
+        raise ValueError(f"{axis} clues must be a list of clues")
+    for index, clue in enumerate(clues):
+        # bool is an int subclass but not a block length
+        if not isinstance(clue, list) or any(type(block) is not int for block in clue):
+            raise ValueError(f"{axis} {index}: a clue must be a list of integers")
+    return [normalize_clue(clue) for clue in clues]
+
+
+class NonogramSolver:
+    """
+    Solver for one set of clues.
+
+    `descriptors` uses the data file format: {"rows": [[...], ...],
+    "columns": [[...], ...]} with [0] for empty lines.
+    """
+    def __init__(self, descriptors: Dict[str, List[List[int]]]):
+        if not isinstance(descriptors, dict):
+            raise ValueError("Descriptors must be an object with rows and columns")
+        self.row_clues = _parse_clues("row", descriptors.get("rows") or [])
+        self.col_clues = _parse_clues("column", descriptors.get("columns") or [])
+        self.height = len(self.row_clues)
+        self.width = len(self.col_clues)
+        self._validate()
+        self.stats = SolveStats()
+        self._deadline: Optional[float] = None
+        self._node_limit: Optional[int] = None
+
+    def _validate(self) -> None:
+        """Reject clues that cannot describe a grid of this size"""
+        for axis, clues, length in (("row", self.row_clues, self.width), ("column", self.col_clues, self.height)):
+            for index, clue in enumerate(clues):
+                if any(block < 0 for block in clue):
+                    raise ValueError(f"{axis} {index}: clue values must not be negative")
+                if sum(clue) + len(clue) - 1 > length:
+                    raise ValueError(f"{axis} {index}: clue {list(clue)} does not fit in {length} cells")
+
+    # Propagation
+
+    def _line(self, grid: _Grid, index: int) -> Tuple[Clue, int, int, int]:
+        """Clue, length and known masks of line `index` (rows first, then columns)"""
+        if index < self.height:
+            return self.row_clues[index], self.width, grid.rows_filled[index], grid.rows_empty[index]
+        c = index - self.height
+        return self.col_clues[c], self.height, grid.cols_filled[c], grid.cols_empty[c]
+
+    def propagate(self, grid: _Grid, dirty: Optional[List[int]] = None) -> None:
+        """
+        Solve lines until nothing changes, starting from `dirty` (all lines
+        by default). Raises Contradiction when a line has no arrangement.
+        """
+        height = self.height
+        queue = deque(range(height + self.width) if dirty is None else dirty)
+        queued = set(queue)
+        self.stats.propagation_rounds += 1
+
+        while queue:
+            index = queue.popleft()
+            queued.discard(index)
+            clue, length, filled, empty = self._line(grid, index)
+            self.stats.line_solves += 1
+            result = solve_line(clue, length, filled, empty)
+            if result is None:
+                raise Contradiction(index)
+            new_filled, new_empty = result
+            added_filled = new_filled & ~filled
+            added_empty = new_empty & ~empty
+            if not (added_filled or added_empty):
+                continue
+
+            if index < height:
+                grid.rows_filled[index] = new_filled
+                grid.rows_empty[index] = new_empty
+                row_bit = 1 << index
+                for masks, added in ((grid.cols_filled, added_filled), (grid.cols_empty, added_empty)):
+                    while added:
+                        low = added & -added
+                        c = low.bit_length() - 1
+                        masks[c] |= row_bit
+                        added ^= low
+                        if height + c not in queued:
+                            queued.add(height + c)
+                            queue.append(height + c)
+            else:
+                c = index - height
+                grid.cols_filled[c] = new_filled
+                grid.cols_empty[c] = new_empty
+                col_bit = 1 << c
+                for masks, added in ((grid.rows_filled, added_filled), (grid.rows_empty, added_empty)):
+                    while added:
+                        low = added & -added
+                        r = low.bit_length() - 1
+                        masks[r] |= col_bit
+                        added ^= low
+                        if r not in queued:
+                            queued.add(r)
+                            queue.append(r)
+
+    def assign(self, grid: _Grid, r: int, c: int, value: bool) -> None:
+        """Set one cell and propagate its row and column"""
+        if value:
+            grid.rows_filled[r] |= 1 << c
+            grid.cols_filled[c] |= 1 << r
+        else:
+            grid.rows_empty[r] |= 1 << c
+            grid.cols_empty[c] |= 1 << r
+        self.propagate(grid, [r, self.height + c])
+
+    def is_solved(self, grid: _Grid) -> bool:
+        full = (1 << self.width) - 1
+        return all((f | e) == full for f, e in zip(grid.rows_filled, grid.rows_empty))
+
+    # Search
+
+    def _check_budget(self) -> None:
+        if self._node_limit is not None and self.stats.nodes >= self._node_limit:
+            raise SearchLimitReached()
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchLimitReached()
+
+    def _frontier(self, grid: _Grid) -> List[Tuple[int, int]]:
+        """Unknown cells next to known ones, which are the most likely to yield to probing"""
+        full = (1 << self.width) - 1
+        cells = []
+        for r in range(self.height):
+            known = grid.rows_filled[r] | grid.rows_empty[r]
+            unknown = full & ~known
+            if not unknown:
+                continue
+            neighbours = (known << 1) | (known >> 1)
+            if r > 0:
+                neighbours |= grid.rows_filled[r - 1] | grid.rows_empty[r - 1]
+            if r + 1 < self.height:
+                neighbours |= grid.rows_filled[r + 1] | grid.rows_empty[r + 1]
+            candidates = unknown & neighbours or unknown
+            while candidates:
+                low = candidates & -candidates
+                cells.append((r, low.bit_length() - 1))
+                candidates ^= low
+        return cells
+
+    def _probe(self, grid: _Grid) -> Optional[Tuple[int, int]]:
+        """
+        Try both values of frontier cells. A value that leads to a
+        contradiction fixes the cell to the other one, and cells on which
+        both values agree are fixed as well. The grid is updated in place;
+        returns the cell to branch on (the one whose weaker probe determined
+        the most cells), or None once the grid is solved.
+        """
+        while not self.is_solved(grid):
+            best: Optional[Tuple[int, int]] = None
+            best_score = -1
+            progress = False
+            for r, c in self._frontier(grid)[:PROBE_LIMIT]:
+                if grid.cell(r, c) is not None:
+                    continue
+                trials = []
+                for value in (True, False):
+                    self._check_budget()
+                    self.stats.probes += 1
+                    trial = grid.copy()
+                    try:
+                        self.assign(trial, r, c, value)
+                    except Contradiction:
+                        self.assign(grid, r, c, not value)
+                        progress = True
+                        break
+                    trials.append(trial)
+                else:
+                    if self._merge_agreement(grid, *trials):
+                        progress = True
+                        continue
+                    score = min(sum(_popcount(f | e) for f, e in zip(t.rows_filled, t.rows_empty)) for t in trials)
+                    if score > best_score:
+                        best, best_score = (r, c), score
+            if not progress:
+                return best
+        return None
+
+    def _merge_agreement(self, grid: _Grid, first: _Grid, second: _Grid) -> bool:
+        """Fix the cells two consistent trial grids agree on; True if any was new"""
+        dirty = []
+        for r in range(self.height):
+            filled = first.rows_filled[r] & second.rows_filled[r]
+            empty = first.rows_empty[r] & second.rows_empty[r]
+            if filled != grid.rows_filled[r] or empty != grid.rows_empty[r]:
+                grid.rows_filled[r] = filled
+                grid.rows_empty[r] = empty
+                dirty.append(r)
+        if not dirty:
+            return False
+        for c in range(self.width):
+            filled = first.cols_filled[c] & second.cols_filled[c]
+            empty = first.cols_empty[c] & second.cols_empty[c]
+            if filled != grid.cols_filled[c] or empty != grid.cols_empty[c]:
+                grid.cols_filled[c] = filled
+                grid.cols_empty[c] = empty
+                dirty.append(self.height + c)
+        self.propagate(grid, dirty)
+        return True
+
+    def solve(self, max_solutions: int = 1, node_limit: Optional[int] = None,
+              time_limit: Optional[float] = None, probing: bool = True,
+              stop: Optional[Callable[[Board], bool]] = None) -> SolveResult:
+        """
+        Find up to `max_solutions` solutions, or fewer when `stop` returns
+        True for the solution just found.
+        `time_limit` is in seconds; limits are checked between search nodes.
+        """
+        start = time.perf_counter()
+        self.stats = SolveStats()
+        self._node_limit = node_limit
+        self._deadline = start + time_limit if time_limit is not None else None
+        solutions: List[Board] = []
+        exhausted = False
+
+        try:
+            root = _Grid(self.height, self.width)
+            try:
+                # Rows and columns must describe the same number of filled cells
+                if sum(map(sum, self.row_clues)) != sum(map(sum, self.col_clues)):
+                    raise Contradiction()
+                self.propagate(root)
+                stack = [(root, 0)]
+            except Contradiction:
+                stack = []
+
+            while stack:
+                grid, depth = stack.pop()
+                self.stats.max_depth = max(self.stats.max_depth, depth)
+                try:
+                    if not self.is_solved(grid):
+                        cell = self._probe(grid) if probing else None
+                        if cell is None and not self.is_solved(grid):
+                            cell = self._first_unknown(grid)
+                except Contradiction:
+                    continue
+                if self.is_solved(grid):
+                    solutions.append(grid.to_board())
+                    if len(solutions) >= max_solutions or (stop is not None and stop(solutions[-1])):
+                        break
+                    continue
+
+                r, c = cell
+                self._check_budget()
+                self.stats.branches += 1
+                for value in (False, True):
+                    branch = grid.copy()
+                    try:
+                        self.assign(branch, r, c, value)
+                    except Contradiction:
+                        continue
+                    stack.append((branch, depth + 1))
+            else:
+                exhausted = True
+        except SearchLimitReached:
+            pass
+
+        self.stats.elapsed_ms = (time.perf_counter() - start) * 1000
+        if solutions:
+            status = "solved"
+        elif exhausted:
+            status = "unsolvable"
+        else:
+            status = "limit"
+        return SolveResult(status=status, solutions=solutions, exhausted=exhausted, stats=self.stats)
+
+    def _first_unknown(self, grid: _Grid) -> Tuple[int, int]:
+        full = (1 << self.width) - 1
+        for r in range(self.height):
+            unknown = full & ~(grid.rows_filled[r] | grid.rows_empty[r])
+            if unknown:
+                return r, (unknown & -unknown).bit_length() - 1
+        raise AssertionError("grid is already solved")
+
+
+def solve(descriptors: Dict[str, List[List[int]]], max_solutions: int = 1,
+          node_limit: Optional[int] = None, time_limit: Optional[float] = None,
+          stop: Optional[Callable[[Board], bool]] = None) -> SolveResult:
+    """Solve a nonogram given its descriptors"""
+    return NonogramSolver(descriptors).solve(max_solutions=max_solutions, node_limit=node_limit,
+                                             time_limit=time_limit, stop=stop)
+
+
+def check_uniqueness(board: Board, descriptors: Optional[Dict[str, List[List[int]]]] = None,
+                     node_limit: Optional[int] = UNIQUE_NODE_LIMIT,
+                     time_limit: Optional[float] = UNIQUE_TIME_LIMIT) -> UniquenessReport:
+    """
+    Check that `board` is the only solution of its clues.
+    The search stops at the second solution; since the board itself is a
+    solution, any solution that differs from it settles the answer early.
+    """
+    if descriptors is None:
+        descriptors = calculate_descriptors(board)
+    board = [[bool(cell) for cell in row] for row in board]
+    result = solve(descriptors, max_solutions=2, node_limit=node_limit, time_limit=time_limit,
+                   stop=lambda solution: solution != board)
+
+    for solution in result.solutions:
+        if solution != board:
+            witness = [
+                (r, c)
+                for r, (expected, found) in enumerate(zip(board, solution))
+                for c, (a, b) in enumerate(zip(expected, found))
+                if a != b
+            ]
+            return UniquenessReport(status="multiple", witness=witness, stats=result.stats)
+    if result.unique:
+        return UniquenessReport(status="unique", stats=result.stats)
+    return UniquenessReport(status="timeout", stats=result.stats)
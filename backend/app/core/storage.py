@@ -0,0 +1,499 @@
+"""
+Storage backends for the nonogram catalogue.
+
+A store hands the data manager whole catalogues (`load`) and, where it
+can, the changes made since a given fingerprint (`changes_since`), so a
+reload only touches the puzzles that changed. JsonFileStore serves the
+bundled read-only data file, from its compiled form when there is an up to
+date one (see compile_catalogue); SQLiteStore keeps puzzles in a SQLite
+database in WAL mode that several worker processes can read and write at
+the same time.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import random
+import sqlite3
+import threading
+import weakref
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .bitboard import PackedBoard
+from .catalogue_file import CatalogueFile, CatalogueFileError
+from .difficulty import Difficulty
+from .json_index import IndexedEntry, scan_catalogue
+from .snapshot import CatalogueEntry, Fingerprint
+
+logger = logging.getLogger(__name__)
+
+# The bundled catalogue
+DEFAULT_JSON_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), "../data/nonogram-games.json"))
+
+# Changelog rows kept for workers catching up; older rows are pruned
+CHANGELOG_KEEP = 10000
+
+# Names per query when fetching changed rows (SQLite limits bound parameters)
+_FETCH_CHUNK = 500
+
+
+class StoreError(Exception):
+    """Raised when a store cannot be read or written"""
+
+
+class ReadOnlyStoreError(StoreError):
+    """Raised when writing to a store that does not support writes"""
+
+
+class NonogramExistsError(StoreError):
+    """Raised when creating a nonogram under a name that is already taken"""
+
+
+@dataclass
+class StoreContents:
+    """A whole catalogue as loaded from a store"""
+    entries: Dict[str, CatalogueEntry]
+    fingerprint: Optional[Fingerprint]
+    digest: str
+
+
+@dataclass
+class StoreChanges:
+    """
+    Puzzles created, updated or deleted since an earlier fingerprint.
+    `upserts` holds the current version of created and updated puzzles.
+    """
+    upserts: Dict[str, CatalogueEntry] = field(default_factory=dict)
+    deletes: List[str] = field(default_factory=list)
+    fingerprint: Optional[Fingerprint] = None
+    digest: str = ""
+
+
+class NonogramStore:
+    """
+    Base class of catalogue stores.
+    `fingerprint` must be cheap: it is called on every reload check.
+    """
+    read_only = True
+    # Whether save_difficulties keeps analyses for later loads
+    persists_difficulties = False
+
+    def fingerprint(self) -> Optional[Fingerprint]:
+        """Value that changes whenever the stored catalogue changes"""
+        raise NotImplementedError
+
+    def load(self) -> StoreContents:
+        """Read the whole catalogue"""
+        raise NotImplementedError
+
+    def changes_since(self, fingerprint: Optional[Fingerprint]) -> Optional[StoreChanges]:
+        """Changes made after `fingerprint`, or None when a full load is needed"""
+        return None
+
+    def put(self, name: str, entry: CatalogueEntry, overwrite: bool = False,
+            check: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Store a nonogram; returns True if it was created rather than replaced.
+        `check` is called just before the write, with writes by every process
+        held off until it is done; an exception it raises cancels the write.
+        Reads of the store from within `check` see every earlier write.
+        """
+        raise ReadOnlyStoreError("The nonogram store is read-only")
+
+    def delete(self, name: str) -> bool:
+        """Delete a nonogram; returns False if it did not exist"""
+        raise ReadOnlyStoreError("The nonogram store is read-only")
+
+    def save_difficulties(self, entries: Dict[str, CatalogueEntry]) -> None:
+        """
+        Persist difficulties analysed after loading, so later loads skip the
+        analysis. Not a change to the catalogue: the fingerprint stays the
+        same. Stores that cannot persist them ignore the call.
+        """
+
+    def watch_paths(self) -> List[str]:
+        """Files whose modification signals a change, for file watchers"""
+        return []
+
+    def close(self) -> None:
+        """Release open handles"""
+
+
+class _BoardSource:
+    """
+    Reads boards back from one version of the JSON data file.
+    The file stays open for as long as entries referring to it are alive;
+    reads are refused once the file changed on disk, since the recorded
+    offsets no longer apply (the next reload builds a new source).
+    """
+    def __init__(self, f, fingerprint: Fingerprint):
+        self._file = f
+        self._fingerprint = fingerprint
+        self._lock = threading.Lock()
+        weakref.finalize(self, f.close)
+
+    def read(self, span: Tuple[int, int]) -> PackedBoard:
+        start, end = span
+        with self._lock:
+            stat = os.fstat(self._file.fileno())
+            if (stat.st_mtime_ns, stat.st_size) != self._fingerprint:
+                raise ValueError("The data file changed since it was indexed")
+            self._file.seek(start)
+            raw = self._file.read(end - start)
+        return PackedBoard.from_rows(json.loads(raw))
+
+
+def compiled_path_for(json_file_path: str) -> str:
+    """Where the compiled form of a JSON data file is looked for: next to it, with a .bin extension"""
+    return os.path.splitext(json_file_path)[0] + ".bin"
+
+
+class JsonFileStore(NonogramStore):
+    """
+    Read-only catalogue in a single JSON file, reloaded whenever its
+    modification time or size changes.
+
+    With `compiled` (the default) a catalogue file compiled from this very
+    version of the JSON file (see compile_catalogue) is mapped instead of
+    reading the JSON, when one exists at compiled_path_for(json_file_path).
+    A compiled file from another version of the JSON, or one that cannot be
+    read, is ignored with a warning.
+
+    With `lazy` (the default) a load only indexes the file: descriptors are
+    decoded for the search index, while each board is read from its recorded
+    offsets the first time the puzzle is used. Files the scanner does not
+    understand are parsed in full instead. A board that turns out to be
+    malformed only fails when it is first used, and the puzzle is then
+    reported as missing.
+    """
+    def __init__(self, json_file_path: str, lazy: bool = True, compiled: bool = True):
+        self.json_file_path = json_file_path
+        self.lazy = lazy
+        self.compiled_path = compiled_path_for(json_file_path) if compiled else None
+
+    def fingerprint(self) -> Optional[Fingerprint]:
+        try:
+            stat = os.stat(self.json_file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self) -> StoreContents:
+        if self.compiled_path is not None:
+            contents = self._load_compiled()
+            if contents is not None:
+                return contents
+        try:
+            f = open(self.json_file_path, 'rb')
+        except FileNotFoundError:
+            logger.warning("JSON file not found at %s", self.json_file_path)
+            return StoreContents({}, None, hashlib.sha256(b"").hexdigest())
+
+        try:
+            stat = os.fstat(f.fileno())
+            fingerprint = (stat.st_mtime_ns, stat.st_size)
+            if self.lazy and stat.st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    digest = hashlib.sha256(buffer).hexdigest()
+                    try:
+                        index = scan_catalogue(buffer)
+                    except ValueError:
+                        index = None
+                if index is not None:
+                    source = _BoardSource(f, fingerprint)
+                    f = None
+                    return StoreContents(self._lazy_entries(index, source), fingerprint, digest)
+                f.seek(0)
+            raw = f.read()
+        finally:
+            if f is not None:
+                f.close()
+
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            raise StoreError(f"Could not parse JSON from {self.json_file_path}")
+
+        entries: Dict[str, CatalogueEntry] = {}
+        for name, entry in data.items():
+            try:
+                entries[name] = CatalogueEntry.from_json(entry)
+            except (ValueError, TypeError, AttributeError) as e:
+                logger.error("Error loading nonogram %s: %s", name, e)
+        return StoreContents(entries, fingerprint, hashlib.sha256(raw).hexdigest())
+
+    def _load_compiled(self) -> Optional[StoreContents]:
+        """The catalogue from the compiled file, or None to read the JSON instead"""
+        try:
+            catalogue = CatalogueFile(self.compiled_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, CatalogueFileError) as e:
+            logger.warning("Ignoring the compiled catalogue %s: %s", self.compiled_path, e)
+            return None
+        fingerprint = self.fingerprint()
+        if fingerprint is None or catalogue.source_fingerprint != fingerprint:
+            logger.warning("Ignoring the compiled catalogue %s: it was not compiled from the current %s",
+                           self.compiled_path, self.json_file_path)
+            return None
+        try:
+            entries = catalogue.entries()
+        except CatalogueFileError as e:
+            logger.warning("Ignoring the compiled catalogue %s: %s", self.compiled_path, e)
+            return None
+        return StoreContents(entries, fingerprint, catalogue.digest)
+
+    @staticmethod
+    def _lazy_entries(index: Dict[str, IndexedEntry], source: _BoardSource) -> Dict[str, CatalogueEntry]:
+        entries: Dict[str, CatalogueEntry] = {}
+        empty = PackedBoard.from_rows([])
+        for name, indexed in index.items():
+            difficulty = None
+            if indexed.difficulty is not None:
+                try:
+                    difficulty = Difficulty.from_json(indexed.difficulty)
+                except ValueError as e:
+                    # Stale or foreign analyses are redone rather than trusted
+                    logger.warning("Ignoring the stored difficulty of %s: %s", name, e)
+            if indexed.board_span is None or indexed.height == 0:
+                entries[name] = CatalogueEntry(empty, indexed.descriptors, difficulty=difficulty)
+            else:
+                entries[name] = CatalogueEntry(
+                    None, indexed.descriptors, loader=partial(source.read, indexed.board_span),
+                    width=indexed.width, height=indexed.height, difficulty=difficulty
+                )
+        return entries
+
+    def watch_paths(self) -> List[str]:
+        return [os.path.abspath(self.json_file_path)]
+
+
+class SQLiteStore(NonogramStore):
+    """
+    Catalogue in a SQLite database in WAL mode.
+
+    Every write runs in its own immediate transaction, which serialises
+    writers across processes, and appends the puzzle name to a changelog.
+    Reads made by the writing thread during a write (such as a put's
+    check) join its transaction.
+    The fingerprint is (generation, store id), where the generation is the
+    last changelog row; other workers compare it on their reload checks
+    and fetch only the puzzles named in newer changelog rows.
+    A new database is seeded from `seed_path` (a JSON data file) if given.
+    """
+    read_only = False
+    persists_difficulties = True
+
+    def __init__(self, path: str, seed_path: Optional[str] = None, busy_timeout_ms: int = 5000):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000.0, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._store_id = self._initialize(seed_path)
+
+    def _initialize(self, seed_path: Optional[str]) -> int:
+        """Create the schema and seed a new database, once across all workers"""
+        with self._transaction(immediate=True) as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS nonograms ("
+                "name TEXT PRIMARY KEY, width INTEGER NOT NULL, height INTEGER NOT NULL, "
+                "board BLOB NOT NULL, descriptors TEXT NOT NULL)"
+            )
+            cursor.execute("CREATE TABLE IF NOT EXISTS changelog (generation INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL)")
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(nonograms)")}
+            if "difficulty" not in columns:
+                # Databases created before difficulties were stored
+                cursor.execute("ALTER TABLE nonograms ADD COLUMN difficulty TEXT")
+            row = cursor.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()
+            if row is not None:
+                return int(row[0])
+
+            store_id = random.getrandbits(62)
+            cursor.execute("INSERT INTO meta (key, value) VALUES ('store_id', ?)", (str(store_id),))
+            if seed_path and os.path.exists(seed_path):
+                for name, entry in JsonFileStore(seed_path).load().entries.items():
+                    self._write(cursor, name, entry)
+            return store_id
+
+    def _transaction(self, immediate: bool = False):
+        return _Transaction(self._conn, self._lock, immediate)
+
+    @staticmethod
+    def _write(cursor: sqlite3.Cursor, name: str, entry: CatalogueEntry) -> None:
+        cursor.execute(
+            "INSERT INTO nonograms (name, width, height, board, descriptors, difficulty) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET width = excluded.width, height = excluded.height, "
+            "board = excluded.board, descriptors = excluded.descriptors, difficulty = excluded.difficulty",
+            (name, entry.board.width, entry.board.height, entry.board.bits, json.dumps(entry.descriptors),
+             _difficulty_json(entry))
+        )
+        cursor.execute("INSERT INTO changelog (name) VALUES (?)", (name,))
+
+    @staticmethod
+    def _entry(width: int, height: int, board: bytes, descriptors: str, difficulty: Optional[str]) -> CatalogueEntry:
+        analysis = None
+        if difficulty is not None:
+            try:
+                analysis = Difficulty.from_json(json.loads(difficulty))
+            except ValueError as e:
+                logger.warning("Ignoring a stored difficulty: %s", e)
+        return CatalogueEntry(PackedBoard(width, height, board), json.loads(descriptors), difficulty=analysis)
+
+    @staticmethod
+    def _generation(cursor: sqlite3.Cursor) -> int:
+        return cursor.execute("SELECT COALESCE(MAX(generation), 0) FROM changelog").fetchone()[0]
+
+    def _state(self, generation: int):
+        """Fingerprint and ETag digest for a generation of this database"""
+        digest = hashlib.sha256(f"sqlite:{self._store_id}:{generation}".encode("utf-8")).hexdigest()
+        return (generation, self._store_id), digest
+
+    def fingerprint(self) -> Optional[Fingerprint]:
+        with self._transaction() as cursor:
+            return self._state(self._generation(cursor))[0]
+
+    def load(self) -> StoreContents:
+        with self._transaction() as cursor:
+            generation = self._generation(cursor)
+            rows = cursor.execute("SELECT name, width, height, board, descriptors, difficulty FROM nonograms ORDER BY rowid").fetchall()
+        entries = {name: self._entry(*values) for name, *values in rows}
+        return StoreContents(entries, *self._state(generation))
+
+    def changes_since(self, fingerprint: Optional[Fingerprint]) -> Optional[StoreChanges]:
+        if fingerprint is None or fingerprint[1] != self._store_id:
+            return None
+        since = fingerprint[0]
+        with self._transaction() as cursor:
+            oldest = cursor.execute("SELECT MIN(generation) FROM changelog").fetchone()[0]
+            if oldest is not None and oldest > since + 1:
+                # The rows we would need were pruned
+                return None
+            generation = self._generation(cursor)
+            names = [name for (name,) in cursor.execute(
+                "SELECT DISTINCT name FROM changelog WHERE generation > ?", (since,)
+            )]
+            upserts = {}
+            for chunk in _chunks(names, _FETCH_CHUNK):
+                placeholders = ",".join("?" * len(chunk))
+                for name, *values in cursor.execute(
+                    f"SELECT name, width, height, board, descriptors, difficulty FROM nonograms WHERE name IN ({placeholders}) ORDER BY rowid",
+                    chunk
+                ):
+                    upserts[name] = self._entry(*values)
+        deletes = [name for name in names if name not in upserts]
+        return StoreChanges(upserts, deletes, *self._state(generation))
+
+    def put(self, name: str, entry: CatalogueEntry, overwrite: bool = False,
+            check: Optional[Callable[[], None]] = None) -> bool:
+        with self._transaction(immediate=True) as cursor:
+            exists = cursor.execute("SELECT 1 FROM nonograms WHERE name = ?", (name,)).fetchone() is not None
+            if exists and not overwrite:
+                raise NonogramExistsError(f"Nonogram with name '{name}' already exists")
+            if check is not None:
+                check()
+            self._write(cursor, name, entry)
+            self._prune(cursor)
+        return not exists
+
+    def delete(self, name: str) -> bool:
+        with self._transaction(immediate=True) as cursor:
+            if cursor.execute("DELETE FROM nonograms WHERE name = ?", (name,)).rowcount == 0:
+                return False
+            cursor.execute("INSERT INTO changelog (name) VALUES (?)", (name,))
+            self._prune(cursor)
+        return True
+
+    def save_difficulties(self, entries: Dict[str, CatalogueEntry]) -> None:
+        # Rows rewritten meanwhile no longer match the analysed clues and keep their own value
+        with self._transaction(immediate=True) as cursor:
+            cursor.executemany(
+                "UPDATE nonograms SET difficulty = ? WHERE name = ? AND descriptors = ?",
+                [(_difficulty_json(entry), name, json.dumps(entry.descriptors)) for name, entry in entries.items()]
+            )
+
+    @staticmethod
+    def _prune(cursor: sqlite3.Cursor) -> None:
+        """Drop changelog rows older than CHANGELOG_KEEP generations"""
+        generation = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        if generation % 1000 == 0:
+            cursor.execute("DELETE FROM changelog WHERE generation <= ?", (generation - CHANGELOG_KEEP,))
+
+    def watch_paths(self) -> List[str]:
+        path = os.path.abspath(self.path)
+        return [path, path + "-wal"]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _Transaction:
+    """
+    Context manager running one transaction on a shared connection.
+    Immediate transactions take the write lock up front, so concurrent
+    writers wait for each other (up to the busy timeout) instead of failing.
+    A transaction entered by the thread already running one joins it: it
+    neither begins nor ends anything, and its errors end the outer one.
+    """
+    def __init__(self, conn: sqlite3.Connection, lock: threading.RLock, immediate: bool):
+        self._conn = conn
+        self._lock = lock
+        self._immediate = immediate
+        self._nested = False
+
+    def __enter__(self) -> sqlite3.Cursor:
+        self._lock.acquire()
+        # Only the thread holding the lock can have a transaction open
+        self._nested = self._conn.in_transaction
+        if self._nested:
+            return self._conn.cursor()
+        try:
+            self._conn.execute("BEGIN IMMEDIATE" if self._immediate else "BEGIN")
+        except sqlite3.Error as e:
+            self._lock.release()
+            raise StoreError(f"Could not start a transaction: {str(e)}")
+        return self._conn.cursor()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._nested:
+            self._lock.release()
+            return
+        try:
+            self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._lock.release()
+        if exc_type is not None and issubclass(exc_type, sqlite3.Error):
+            raise StoreError(f"Database error: {str(exc)}") from exc
+
+
+def _difficulty_json(entry: CatalogueEntry) -> Optional[str]:
+    return json.dumps(entry.difficulty.to_json()) if entry.difficulty is not None else None
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def store_from_env(json_file_path: str) -> NonogramStore:
+    """
+    Build the store selected by NONOGRAM_STORE ("json", "sqlite" or
+    "shared"). The SQLite database lives at NONOGRAM_DB_PATH and is seeded
+    from the JSON data file when it is first created; the shared store
+    serves the JSON data file compiled into NONOGRAM_SHARED_DIR (see
+    shared_catalogue).
+    """
+    kind = os.environ.get("NONOGRAM_STORE", "json").lower()
+    if kind == "shared":
+        from .shared_catalogue import shared_store_from_env
+        return shared_store_from_env(json_file_path)
+    if kind == "sqlite":
+        default_path = os.path.join(os.path.dirname(json_file_path), "nonograms.db")
+        return SQLiteStore(os.environ.get("NONOGRAM_DB_PATH", default_path), seed_path=json_file_path)
+    return JsonFileStore(json_file_path)
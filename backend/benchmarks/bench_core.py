@@ -0,0 +1,124 @@
+"""
+Micro-benchmarks of the catalogue hot paths on synthetic catalogues:
+calculate_descriptors and difficulty analysis by board size, and
+_load_data, get_by_name (first access after a load and repeated) and
+search_by_clue by catalogue size. Loads skip the difficulty analysis, which
+is timed on its own since it runs once per puzzle rather than per load.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_core
+    python -m benchmarks.bench_core --puzzles 100,10k,1m --output before.json
+    python -m benchmarks.bench_core --compare before.json
+
+Catalogues are written to a temporary directory; with --compare the run
+exits with status 1 when any benchmark is slower than the baseline by more
+than --threshold.
+"""
+import argparse
+import os
+import random
+import tempfile
+
+from app.core import difficulty
+from app.core.descriptors import calculate_descriptors
+from app.core.crud import NonogramDataManager
+from app.core.reload import ManualReloadStrategy
+from app.core.storage import JsonFileStore
+
+from .common import (
+    DEFAULT_SIZES, Results, add_output_arguments, finish, parse_counts, random_board, result, timed, write_catalogue
+)
+
+BOARD_SIZES = "5,10,15,25,50,100"
+
+
+def bench_descriptors(sizes, repeat: int) -> Results:
+    rng = random.Random(0)
+    results: Results = {}
+    print(f"{'board':>10} {'calculate_descriptors':>22}")
+    for size in sizes:
+        board = random_board(size, size, 0.55, rng)
+        number = max(1, 20000 // (size * size))
+        seconds = timed(lambda: calculate_descriptors(board), repeat=repeat, number=number)
+        results[f"calculate_descriptors/{size}x{size}"] = result(seconds * 1e6, "us")
+        print(f"{f'{size}x{size}':>10} {seconds * 1e6:>19.1f} us")
+    return results
+
+
+def bench_difficulty(sizes, repeat: int) -> Results:
+    rng = random.Random(1)
+    results: Results = {}
+    print(f"\n{'board':>10} {'analyze':>22}")
+    for size in sizes:
+        clues = [calculate_descriptors(random_board(size, size, 0.55, rng)) for _ in range(10)]
+
+        def analyze_all():
+            # Bypass the per-clue cache so every run measures the solver
+            difficulty._analyze.cache_clear()
+            for descriptors in clues:
+                try:
+                    difficulty.analyze(descriptors)
+                except ValueError:
+                    pass
+
+        seconds = timed(analyze_all, repeat=repeat) / len(clues)
+        results[f"difficulty/{size}x{size}"] = result(seconds * 1e3, "ms")
+        print(f"{f'{size}x{size}':>10} {seconds * 1e3:>19.2f} ms")
+    return results
+
+
+def bench_catalogue(count: int, sizes, repeat: int, directory: str) -> Results:
+    path = os.path.join(directory, f"catalogue-{count}.json")
+    sample = write_catalogue(path, count, sizes)
+    names = sample["names"]
+    clues = [" ".join(map(str, clue)) for clue in sample["clues"]]
+    manager = NonogramDataManager(store=JsonFileStore(path), reload_strategy=ManualReloadStrategy(),
+                                  analyze_difficulty=False)
+    try:
+        load = cold = float("inf")
+        for _ in range(repeat):
+            load = min(load, timed(manager._load_data, repeat=1))
+            # Boards are read from the data file on first access after a load
+            cold = min(cold, timed(lambda: [manager.get_by_name(name) for name in names], repeat=1) / len(names))
+        warm = timed(lambda: [manager.get_by_name(name) for name in names], repeat=repeat) / len(names)
+        search = timed(lambda: [manager.search_by_clue(clue) for clue in clues], repeat=repeat) / len(clues)
+    finally:
+        manager.close()
+
+    print(f"{count:>10} {sample['size'] / 1e6:>9.1f} MB {load:>9.3f} s {cold * 1e6:>11.1f} us "
+          f"{warm * 1e6:>11.1f} us {search * 1e6:>11.1f} us")
+    return {
+        f"load_data/{count}": result(load, "s"),
+        f"get_by_name_cold/{count}": result(cold * 1e6, "us"),
+        f"get_by_name/{count}": result(warm * 1e6, "us"),
+        f"search_by_clue/{count}": result(search * 1e6, "us"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puzzles", default="100,1k,10k", help="Catalogue sizes, e.g. 100,10k,1m")
+    parser.add_argument("--board-sizes", default=BOARD_SIZES, help="Board sizes for calculate_descriptors")
+    parser.add_argument("--catalogue-sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Board sizes mixed into the synthetic catalogues")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the best one counts")
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
+    board_sizes = [int(s) for s in args.board_sizes.split(",")]
+    results = bench_descriptors(board_sizes, args.repeat)
+    results.update(bench_difficulty([size for size in board_sizes if size <= 25], args.repeat))
+
+    catalogue_sizes = [int(s) for s in args.catalogue_sizes.split(",")]
+    print(f"\n{'puzzles':>10} {'file':>12} {'_load_data':>11} {'first get':>14} "
+          f"{'get_by_name':>14} {'search':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in parse_counts(args.puzzles):
+            results.update(bench_catalogue(count, catalogue_sizes, args.repeat, directory))
+
+    finish(args, results)
+
+
+if __name__ == "__main__":
+    main()
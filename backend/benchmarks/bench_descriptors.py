@@ -0,0 +1,93 @@
+"""
+Benchmark the descriptor engine (list-of-lists, packed and batched input)
+against the original nested-loop implementation.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_descriptors
+"""
+import argparse
+import random
+import timeit
+from typing import Dict, List
+
+from app.core.bitboard import PackedBoard
+from app.core.descriptors import calculate_descriptors, calculate_descriptors_batch
+
+SIZES = [5, 10, 15, 25, 50, 100, 200]
+
+
+def legacy_calculate_descriptors(board: List[List[bool]]) -> Dict[str, List[List[int]]]:
+    """The cell-by-cell implementation NonogramDataManager used before the bitwise engine"""
+    if not board or not board[0]:
+        return {"rows": [], "columns": []}
+
+    rows = len(board)
+    cols = len(board[0])
+
+    row_descriptors = []
+    for r in range(rows):
+        row_desc = []
+        count = 0
+        for c in range(cols):
+            if board[r][c]:
+                count += 1
+            elif count > 0:
+                row_desc.append(count)
+                count = 0
+        if count > 0:
+            row_desc.append(count)
+        row_descriptors.append(row_desc or [0])
+
+    col_descriptors = []
+    for c in range(cols):
+        col_desc = []
+        count = 0
+        for r in range(rows):
+            if board[r][c]:
+                count += 1
+            elif count > 0:
+                col_desc.append(count)
+                count = 0
+        if count > 0:
+            col_desc.append(count)
+        col_descriptors.append(col_desc or [0])
+
+    return {"rows": row_descriptors, "columns": col_descriptors}
+
+
+def random_board(size: int, density: float, rng: random.Random) -> List[List[bool]]:
+    """Square board with roughly `density` of its cells filled"""
+    return [[rng.random() < density for _ in range(size)] for _ in range(size)]
+
+
+def best_of(func, repeat: int, number: int) -> float:
+    """Best time per call in microseconds"""
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--density", type=float, default=0.5, help="Fraction of filled cells")
+    parser.add_argument("--batch", type=int, default=100, help="Boards per batch call")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'size':>8} {'legacy us':>12} {'lists us':>12} {'packed us':>12} {'batch us/board':>15} {'lists x':>8} {'packed x':>9}")
+    for size in SIZES:
+        board = random_board(size, args.density, rng)
+        packed = PackedBoard.from_rows(board)
+        batch = [random_board(size, args.density, rng) for _ in range(args.batch)]
+        assert calculate_descriptors(board) == legacy_calculate_descriptors(board)
+
+        number = max(1, 20000 // (size * size))
+        legacy = best_of(lambda: legacy_calculate_descriptors(board), args.repeat, number)
+        lists = best_of(lambda: calculate_descriptors(board), args.repeat, number)
+        bits = best_of(lambda: calculate_descriptors(packed), args.repeat, number)
+        batched = best_of(lambda: calculate_descriptors_batch(batch), args.repeat, 1) / args.batch
+        print(f"{size:>4}x{size:<3} {legacy:>12.1f} {lists:>12.1f} {bits:>12.1f} {batched:>15.1f} {legacy / lists:>7.1f}x {legacy / bits:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
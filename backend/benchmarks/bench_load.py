@@ -0,0 +1,145 @@
+"""
+In-process load generator: drives the ASGI app through httpx with a
+number of concurrent clients over a synthetic catalogue and reports
+throughput and p50/p99 latency per kind of request.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_load
+    python -m benchmarks.bench_load --puzzles 100k --concurrency 32 --output before.json
+    python -m benchmarks.bench_load --mix get=1 --compare before.json
+
+No server or sockets are involved, so the numbers measure the application
+(routing, validation, caches, encoding) rather than the network stack.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+from app.api import nonograms as nonograms_api
+from app.core.crud import NonogramDataManager
+from app.core.reload import ManualReloadStrategy
+from app.core.storage import JsonFileStore
+from main import app
+
+from .common import DEFAULT_SIZES, Results, add_output_arguments, finish, parse_counts, percentile, result, write_catalogue
+
+DEFAULT_MIX = "get=50,page=15,search=20,query=10,similar=5"
+
+
+def request_factory(sample: Dict[str, object], rng: random.Random):
+    """Functions building (method, url, json body) for each kind of request"""
+    names = sample["names"]
+    clues = [",".join(map(str, clue)) for clue in sample["clues"]]
+    sizes = DEFAULT_SIZES
+    return {
+        "get": lambda: ("GET", f"/api/nonograms/{rng.choice(names)}", None),
+        "page": lambda: ("GET", f"/api/nonograms/list?limit=100&prefix=puzzle-{rng.randrange(10)}", None),
+        "search": lambda: ("GET", f"/api/nonograms/search?clue={rng.choice(clues)}", None),
+        "query": lambda: ("GET", f"/api/nonograms/search?q=row:*,{rng.choice(clues)},* width:{rng.choice(sizes)}", None),
+        "similar": lambda: ("POST", "/api/nonograms/similar", {"name": rng.choice(names), "k": 5}),
+    }
+
+
+def parse_mix(text: str) -> List[Tuple[str, int]]:
+    mix = []
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        mix.append((kind.strip(), int(weight or 1)))
+    return mix
+
+
+async def prime(factories, kinds: List[str]) -> None:
+    """One request of each kind in turn, so lazily built indexes are built before the clients start"""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for kind in kinds:
+            method, url, body = factories[kind]()
+            await client.request(method, url, json=body)
+
+
+async def run_load(requests: int, concurrency: int, mix: List[Tuple[str, int]], factories, rng: random.Random):
+    """Send `requests` requests from `concurrency` clients; returns latencies by kind, failures and elapsed time"""
+    kinds = [kind for kind, _ in mix]
+    weights = [weight for _, weight in mix]
+    plan = rng.choices(kinds, weights, k=requests)
+    latencies: Dict[str, List[float]] = {kind: [] for kind in kinds}
+    failures = 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(offset: int):
+            nonlocal failures
+            for kind in plan[offset::concurrency]:
+                method, url, body = factories[kind]()
+                started = time.perf_counter()
+                response = await client.request(method, url, json=body)
+                latencies[kind].append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    failures += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, failures, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puzzles", default="10k", help="Size of the synthetic catalogue")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted request kinds (default {DEFAULT_MIX})")
+    parser.add_argument("--warmup", type=int, default=200, help="Requests sent before measuring")
+    parser.add_argument("--seed", type=int, default=1)
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    count = parse_counts(args.puzzles)[0]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalogue.json")
+        sample = write_catalogue(path, count)
+        factories = request_factory(sample, rng)
+        unknown = [kind for kind, _ in mix if kind not in factories]
+        if unknown:
+            parser.error(f"Unknown request kinds {unknown}, choose from {sorted(factories)}")
+
+        manager = NonogramDataManager(store=JsonFileStore(path), reload_strategy=ManualReloadStrategy())
+        # The routes look the manager up in their module, so point them at the synthetic catalogue
+        nonograms_api.data_manager = manager
+        try:
+            asyncio.run(prime(factories, [kind for kind, _ in mix]))
+            asyncio.run(run_load(args.warmup, args.concurrency, mix, factories, rng))
+            latencies, failures, elapsed = asyncio.run(
+                run_load(args.requests, args.concurrency, mix, factories, rng)
+            )
+        finally:
+            manager.close()
+
+    throughput = args.requests / elapsed
+    print(f"{count} puzzles, {args.requests} requests from {args.concurrency} clients in {elapsed:.2f} s: "
+          f"{throughput:.0f} requests/s, {failures} failed\n")
+    print(f"{'request':>10} {'count':>8} {'p50':>10} {'p99':>10}")
+    results: Results = {"load/throughput": result(throughput, "requests/s", higher_is_better=True)}
+    for kind, values in latencies.items():
+        if not values:
+            continue
+        p50, p99 = percentile(values, 0.5) * 1000, percentile(values, 0.99) * 1000
+        results[f"load/{kind}/p50"] = result(p50, "ms")
+        results[f"load/{kind}/p99"] = result(p99, "ms")
+        print(f"{kind:>10} {len(values):>8} {p50:>7.2f} ms {p99:>7.2f} ms")
+    if failures:
+        print(f"\n{failures} requests did not return 200")
+
+    finish(args, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark the nonogram solver on the bundled catalogue and on random boards.
+
+Every puzzle is solved with max_solutions=2, which is what a uniqueness
+check needs. Run from the backend directory:
+
+    python -m benchmarks.bench_solver
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+
+from app.core.descriptors import calculate_descriptors
+from app.core.solver import solve
+
+CATALOGUE = os.path.join(os.path.dirname(__file__), "../app/data/nonogram-games.json")
+RANDOM_SIZES = [10, 15, 20, 25, 30, 40, 50]
+
+
+def report(label: str, results) -> None:
+    """Print timing percentiles and status counts for a group of solves"""
+    times = sorted(result.stats.elapsed_ms for result in results)
+    statuses = {}
+    for result in results:
+        if result.status == "solved":
+            key = "unique" if result.unique else "multiple"
+        else:
+            key = result.status
+        statuses[key] = statuses.get(key, 0) + 1
+    summary = ", ".join(f"{key}={count}" for key, count in sorted(statuses.items()))
+    print(f"{label:<22} {len(results):>6} {sum(times):>10.1f} {statistics.median(times):>9.2f} {times[-1]:>9.2f}  {summary}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--density", type=float, default=0.6, help="Fraction of filled cells in random boards")
+    parser.add_argument("--boards", type=int, default=10, help="Random boards per size")
+    parser.add_argument("--time-limit", type=float, default=5.0, help="Seconds allowed per solve")
+    args = parser.parse_args()
+
+    print(f"{'puzzles':<22} {'count':>6} {'total ms':>10} {'p50 ms':>9} {'max ms':>9}  statuses")
+    with open(CATALOGUE) as f:
+        catalogue = json.load(f)
+    report("catalogue", [
+        solve(entry["descriptors"], max_solutions=2, time_limit=args.time_limit)
+        for entry in catalogue.values()
+    ])
+
+    rng = random.Random(42)
+    for size in RANDOM_SIZES:
+        results = []
+        for _ in range(args.boards):
+            board = [[rng.random() < args.density for _ in range(size)] for _ in range(size)]
+            results.append(solve(calculate_descriptors(board), max_solutions=2, time_limit=args.time_limit))
+        report(f"random {size}x{size}", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Startup cost of the catalogue loaders: the JSON data file against its
+compiled catalogue file (app/core/compile_catalogue.py), on synthetic
+catalogues.
+
+Every measurement runs in a fresh Python process. It imports the app,
+builds a NonogramDataManager over the catalogue and reports the time that
+took (startup), the part of it spent reading the store (load, the rest
+being the snapshot and its search indexes) and the process RSS afterwards,
+less the RSS of a process that only imported the app. Loads skip the
+difficulty analysis unless --difficulty is given (the compiled file then
+carries the analyses, while the JSON loader runs them at every start).
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --puzzles 10k,100k --output before.json
+    python -m benchmarks.bench_startup --compare before.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from .common import DEFAULT_SIZES, Results, add_output_arguments, finish, parse_counts, result, write_catalogue
+
+LOADERS = ("json", "compiled")
+
+_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process (peak RSS where /proc is not available)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _measure(path: str, loader: str, analyze_difficulty: bool) -> None:
+    """Child process: load the catalogue and print the time taken and the RSS as JSON"""
+    from app.core.crud import NonogramDataManager
+    from app.core.reload import ManualReloadStrategy
+    from app.core.storage import JsonFileStore
+
+    before = rss_bytes()
+    if loader == "none":
+        print(json.dumps({"seconds": 0.0, "load": 0.0, "rss": before, "puzzles": 0}))
+        return
+    store = JsonFileStore(path, compiled=loader == "compiled")
+    load = store.load
+    load_seconds = []
+
+    def timed_load():
+        started = time.perf_counter()
+        contents = load()
+        load_seconds.append(time.perf_counter() - started)
+        return contents
+
+    store.load = timed_load
+    started = time.perf_counter()
+    manager = NonogramDataManager(store=store, reload_strategy=ManualReloadStrategy(), analyze_difficulty=analyze_difficulty)
+    seconds = time.perf_counter() - started
+    print(json.dumps({"seconds": seconds, "load": sum(load_seconds), "rss": rss_bytes(),
+                      "puzzles": len(manager.get_all_names())}))
+
+
+def run_child(path: str, loader: str, analyze_difficulty: bool) -> dict:
+    command = [sys.executable, "-m", "benchmarks.bench_startup", "--child", loader, path]
+    if analyze_difficulty:
+        command.append("--difficulty")
+    output = subprocess.run(command, cwd=_BACKEND, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_startup(count: int, sizes, repeat: int, directory: str, analyze_difficulty: bool) -> Results:
+    from app.core.compile_catalogue import compile_catalogue
+    from app.core.storage import compiled_path_for
+
+    path = os.path.join(directory, f"catalogue-{count}.json")
+    sample = write_catalogue(path, count, sizes)
+    started = time.perf_counter()
+    compile_catalogue(path, analyze_difficulty=analyze_difficulty)
+    compile_seconds = time.perf_counter() - started
+    compiled_size = os.path.getsize(compiled_path_for(path))
+
+    baseline = min(run_child(path, "none", analyze_difficulty)["rss"] for _ in range(repeat))
+    results: Results = {f"compile/{count}": result(compile_seconds, "s")}
+    row = [f"{count:>10}", f"{sample['size'] / 1e6:>9.1f} MB", f"{compiled_size / 1e6:>9.1f} MB"]
+    for loader in LOADERS:
+        runs = [run_child(path, loader, analyze_difficulty) for _ in range(repeat)]
+        assert all(run["puzzles"] == count for run in runs)
+        seconds = min(run["seconds"] for run in runs)
+        load = min(run["load"] for run in runs)
+        rss = min(run["rss"] for run in runs) - baseline
+        results[f"startup_{loader}/{count}"] = result(seconds, "s")
+        results[f"load_{loader}/{count}"] = result(load, "s")
+        results[f"rss_{loader}/{count}"] = result(rss / 1e6, "MB")
+        row += [f"{load:>9.3f} s", f"{seconds:>9.3f} s", f"{rss / 1e6:>9.1f} MB"]
+    print(" ".join(row))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puzzles", default="1k,10k,100k", help="Catalogue sizes, e.g. 1k,100k")
+    parser.add_argument("--catalogue-sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Board sizes mixed into the synthetic catalogues")
+    parser.add_argument("--repeat", type=int, default=3, help="Processes per measurement; the best one counts")
+    parser.add_argument("--difficulty", action="store_true", help="Analyse difficulties as a default start does")
+    parser.add_argument("--child", nargs=2, metavar=("LOADER", "PATH"), help=argparse.SUPPRESS)
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        _measure(args.child[1], args.child[0], args.difficulty)
+        return
+
+    catalogue_sizes = [int(s) for s in args.catalogue_sizes.split(",")]
+    print(f"{'puzzles':>10} {'json file':>12} {'compiled':>12} {'json load':>11} {'json start':>11} {'json RSS':>12} "
+          f"{'bin load':>11} {'bin start':>11} {'bin RSS':>12}")
+    results: Results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for count in parse_counts(args.puzzles):
+            results.update(bench_startup(count, catalogue_sizes, args.repeat, directory, args.difficulty))
+
+    finish(args, results)
+
+
+if __name__ == "__main__":
+    main()
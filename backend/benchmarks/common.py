@@ -0,0 +1,160 @@
+"""
+Shared pieces of the benchmark suite: synthetic catalogues, and saving
+and comparing results as JSON.
+
+A results file holds run metadata and a flat mapping from benchmark name
+to {"value", "unit"}. Values are costs, so lower is better, unless the
+result is marked "higher_is_better" (throughput). Compare a run against a
+saved baseline with --compare to catch regressions.
+"""
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from app.core.descriptors import calculate_descriptors
+
+# Board sizes mixed into synthetic catalogues by default
+DEFAULT_SIZES = (5, 10, 15, 20, 25)
+
+Results = Dict[str, Dict[str, object]]
+
+
+def parse_counts(text: str) -> List[int]:
+    """Parse a comma separated list of counts such as "100,10k,1m" """
+    counts = []
+    for part in text.split(","):
+        part = part.strip().lower()
+        factor = {"k": 1000, "m": 1000000}.get(part[-1:], 1)
+        counts.append(int(part[:-1] if factor > 1 else part) * factor)
+    return counts
+
+
+def random_board(width: int, height: int, density: float, rng: random.Random) -> List[List[bool]]:
+    """Board with roughly `density` of its cells filled"""
+    return [[rng.random() < density for _ in range(width)] for _ in range(height)]
+
+
+def _random_rows(size: int, rng: random.Random) -> List[List[bool]]:
+    # Half-filled rows from one random integer each, fast enough for a million boards
+    return [[bits >> c & 1 == 1 for c in range(size)] for bits in (rng.getrandbits(size) for _ in range(size))]
+
+
+def write_catalogue(path: str, count: int, sizes: Sequence[int] = DEFAULT_SIZES, seed: int = 42) -> Dict[str, object]:
+    """
+    Write a synthetic JSON data file of `count` random square puzzles with
+    sizes taken in turn from `sizes`. It is streamed, so million-puzzle
+    catalogues do not need to fit in memory. Returns the file size and a
+    sample of names and first-row clues for the lookups the benchmarks make.
+    """
+    rng = random.Random(seed)
+    names: List[str] = []
+    clues: List[Tuple[int, ...]] = []
+    step = max(1, count // 100)
+    with open(path, "w") as f:
+        f.write("{")
+        for i in range(count):
+            board = _random_rows(sizes[i % len(sizes)], rng)
+            descriptors = calculate_descriptors(board)
+            name = f"puzzle-{i:07d}"
+            entry = {"board": board, "descriptors": descriptors}
+            f.write(("," if i else "") + json.dumps(name) + ":" + json.dumps(entry, separators=(",", ":")))
+            if i % step == 0:
+                names.append(name)
+                clues.append(tuple(descriptors["rows"][0]))
+        f.write("}")
+    return {"names": names, "clues": clues, "size": os.path.getsize(path)}
+
+
+def timed(func, repeat: int = 5, number: int = 1) -> float:
+    """Best wall-clock time per call over `repeat` runs of `number` calls, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty sequence"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def metadata() -> Dict[str, object]:
+    """Where a run was made: commit, Python and machine"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(__file__), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "argv": sys.argv[1:],
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def save_results(path: str, results: Results) -> None:
+    """Write results and run metadata to a JSON file"""
+    with open(path, "w") as f:
+        json.dump({"meta": metadata(), "results": results}, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {path}")
+
+
+def compare(baseline_path: str, results: Results, threshold: float) -> bool:
+    """
+    Print each benchmark next to its baseline value and return False when
+    any got worse by more than `threshold` (0.1 for 10%).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('meta', {}).get('commit')}):")
+    print(f"{'benchmark':<48} {'baseline':>12} {'current':>12} {'change':>8}")
+    ok = True
+    for name, current in sorted(results.items()):
+        before = baseline.get("results", {}).get(name)
+        if before is None or not before["value"]:
+            continue
+        change = current["value"] / before["value"] - 1
+        worse = -change if current.get("higher_is_better") else change
+        flag = ""
+        if worse > threshold:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{name:<48} {before['value']:>12.4g} {current['value']:>12.4g} {change:>+7.1%}{flag}")
+    return ok
+
+
+def add_output_arguments(parser) -> None:
+    """--output, --compare and --threshold options shared by the benchmarks"""
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Compare with results saved by an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Change for the worse reported as a regression (0.1 = 10%%)")
+
+
+def finish(args, results: Results) -> None:
+    """Save and compare results as requested; exits with status 1 on a regression"""
+    if args.output:
+        save_results(args.output, results)
+    if args.compare and not compare(args.compare, results, args.threshold):
+        sys.exit(1)
+
+
+def result(value: float, unit: str, higher_is_better: bool = False) -> Dict[str, object]:
+    """One benchmark result"""
+    if higher_is_better:
+        return {"value": value, "unit": unit, "higher_is_better": True}
+    return {"value": value, "unit": unit}
@@ -0,0 +1,35 @@
+"""
+Gunicorn settings, read from the working directory when gunicorn starts.
+
+With NONOGRAM_STORE=shared the master process is the catalogue loader: it
+publishes the shared catalogue before forking the workers and republishes
+it whenever the data file changes, checking every
+NONOGRAM_RELOAD_INTERVAL_MS. Other stores need nothing from the master.
+"""
+import os
+import threading
+
+from app.core.shared_catalogue import publish_until, shared_store_from_env
+
+_shared_store = shared_store_from_env()
+_stop_publishing = threading.Event()
+
+
+def on_starting(server):
+    if _shared_store is not None:
+        generation = _shared_store.publish()
+        server.log.info("Serving shared catalogue generation %d from %s", generation, _shared_store.directory)
+
+
+def when_ready(server):
+    if _shared_store is not None:
+        # Workers forked while this thread holds the publish lock drop their copy of it (see _FileLock)
+        interval_ms = int(os.environ.get("NONOGRAM_RELOAD_INTERVAL_MS", 1000))
+        threading.Thread(
+            target=publish_until, args=(_shared_store, _stop_publishing, interval_ms),
+            name="catalogue-publisher", daemon=True
+        ).start()
+
+
+def on_exit(server):
+    _stop_publishing.set()
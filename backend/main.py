@@ -1,16 +1,40 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api.coop import evict_idle_sessions, router as coop_router
+from app.api.http_cache import CompressionMiddleware
+from app.api.metrics import MetricsMiddleware, router as metrics_router
 from app.api.nonograms import router as nonograms_router
+from app.core import metrics
+from app.core.crud import data_manager
+from app.core.executor import job_executor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Evict idle co-op sessions while running; stop background reloads and worker pools on shutdown"""
+    eviction = asyncio.create_task(evict_idle_sessions())
+    yield
+    eviction.cancel()
+    data_manager.close()
+    job_executor.shutdown(wait=False)
+
 
 # Create the FastAPI app
 app = FastAPI(
     title="Nonogram Editor API",
     description="API for managing nonogram puzzles for a web-based editor",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Compress the responses that are not served from the per-snapshot caches
+# (those are compressed once and cached, and pass through untouched)
+app.add_middleware(CompressionMiddleware)
+
 # Set up CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -20,8 +44,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics cost nothing unless enabled with NONOGRAM_METRICS=1
+if metrics.registry.enabled:
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(nonograms_router, prefix="/api/nonograms", tags=["nonograms"])
+app.include_router(coop_router, prefix="/api/nonograms", tags=["coop"])
+app.include_router(metrics_router)
 
 # Root endpoint
 @app.get("/", tags=["root"])
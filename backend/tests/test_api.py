@@ -6,7 +6,14 @@ import unittest
 from unittest import mock
 
 # Import the app and necessary modules
+from app.api.http_cache import CompressionMiddleware, negotiate_coding
+from app.core import hints
 from app.core.crud import NonogramDataManager
+from app.core.descriptors import calculate_descriptors
+from app.core.encoding import CONTENT_CODINGS
+from app.core.executor import ExecutorSaturated
+from app.core.reload import ManualReloadStrategy
+from app.core.storage import SQLiteStore
 from main import app
 
 
@@ -43,28 +50,23 @@ class TestNonogramAPI(unittest.TestCase):
             }
         }
         
-        # Mock the data_manager in the nonograms module
-        self.patcher = mock.patch('app.api.nonograms.data_manager')
-        self.mock_data_manager = self.patcher.start()
-        
-        # Configure mock to return our test data
-        self.mock_data_manager.get_all_names.return_value = list(self.test_data.keys())
-        self.mock_data_manager.get_by_name.side_effect = lambda name: (
-            mock.MagicMock(
-                name=name, 
-                board=self.test_data[name]["board"],
-                descriptors=self.test_data[name]["descriptors"]
-            ) if name in self.test_data else None
-        )
-        self.mock_data_manager.search_by_clue.side_effect = lambda clue: (
-            ["test_nonogram"] if clue == "3" else 
-            ["another_test"] if clue == "2" else []
-        )
+        # Write the test data to a temporary file backing a real data manager
+        self.temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.json')
+        self.temp_file.close()
+        with open(self.temp_file.name, 'w') as f:
+            json.dump(self.test_data, f)
+        self.data_manager = NonogramDataManager(self.temp_file.name, reload_strategy=ManualReloadStrategy())
+        
+        # Replace the data_manager in the nonograms module
+        self.patcher = mock.patch('app.api.nonograms.data_manager', self.data_manager)
+        self.patcher.start()
     
     def tearDown(self):
         """Tear down test fixtures."""
         # Stop the patcher
         self.patcher.stop()
+        self.data_manager.close()
+        os.unlink(self.temp_file.name)
     
     def test_root(self):
         """Test the root endpoint."""
@@ -78,6 +80,159 @@ class TestNonogramAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"names": ["test_nonogram", "another_test"]})
     
+    def test_get_nonogram_list_pages(self):
+        """Test paginated, filtered and projected listings."""
+        response = self.client.get("/api/nonograms/list", params={"limit": 1, "fields": "dimensions,density"})
+        self.assertEqual(response.status_code, 200)
+        page = response.json()
+        self.assertEqual(page["names"], ["another_test"])
+        self.assertEqual(page["items"], [{"name": "another_test", "width": 2, "height": 2, "density": 1.0}])
+        
+        response = self.client.get("/api/nonograms/list", params={"limit": 1, "cursor": page["next_cursor"]})
+        self.assertEqual(response.json(), {"names": ["test_nonogram"]})
+        
+        response = self.client.get("/api/nonograms/list", params={"prefix": "test", "fields": "name"})
+        self.assertEqual(response.json(), {"names": ["test_nonogram"], "items": [{"name": "test_nonogram"}]})
+        self.assertEqual(self.client.get("/api/nonograms/list", params={"prefix": "zzz"}).json(), {"names": []})
+        
+        self.assertEqual(self.client.get("/api/nonograms/list", params={"cursor": "!"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/nonograms/list", params={"fields": "board"}).status_code, 422)
+        self.assertEqual(self.client.get("/api/nonograms/list", params={"limit": 0}).status_code, 422)
+    
+    def test_list_and_search_by_difficulty(self):
+        """Test sorting and filtering listings and searches by precomputed difficulty."""
+        self.test_data["diagonal"] = {
+            "board": [[True, False], [False, True]],
+            "descriptors": {"rows": [[1], [1]], "columns": [[1], [1]]}
+        }
+        # Clues without a solution have no difficulty
+        self.test_data["broken"] = {"board": [[True]], "descriptors": {"rows": [[1]], "columns": [[0]]}}
+        with open(self.temp_file.name, 'w') as f:
+            json.dump(self.test_data, f)
+        # The JSON store does not keep analyses, so analysing it at load time is opt-in
+        self.data_manager.analyze_difficulty = True
+        self.data_manager.refresh()
+
+        response = self.client.get("/api/nonograms/list", params={"sort": "difficulty", "fields": "difficulty"})
+        self.assertEqual(response.status_code, 200)
+        listing = response.json()
+        self.assertEqual(listing["names"][2:], ["diagonal", "broken"])
+        self.assertEqual(sorted(listing["names"][:2]), ["another_test", "test_nonogram"])
+        self.assertEqual(listing["items"][2]["difficulty"], "hard")
+        self.assertGreaterEqual(listing["items"][2]["difficulty_score"], 2000)
+        self.assertEqual(listing["items"][3], {"name": "broken"})
+
+        pages, cursor = [], None
+        while True:
+            page = self.client.get("/api/nonograms/list", params={"sort": "difficulty", "limit": 1, "cursor": cursor}).json()
+            pages.extend(page["names"])
+            cursor = page.get("next_cursor")
+            if cursor is None:
+                break
+        self.assertEqual(pages, listing["names"])
+
+        response = self.client.get("/api/nonograms/list", params={"min_difficulty": "medium"})
+        self.assertEqual(response.json(), {"names": ["diagonal"]})
+        response = self.client.get("/api/nonograms/list", params={"max_difficulty": "easy", "sort": "difficulty"})
+        self.assertEqual(response.json()["names"], listing["names"][:2])
+        self.assertEqual(self.client.get("/api/nonograms/list", params={"min_difficulty": "fiendish"}).status_code, 422)
+        # A name cursor does not continue a listing by difficulty
+        name_cursor = self.client.get("/api/nonograms/list", params={"limit": 1}).json()["next_cursor"]
+        self.assertEqual(self.client.get("/api/nonograms/list", params={"sort": "difficulty", "cursor": name_cursor}).status_code, 400)
+        # Nor does a cursor by difficulty continue a listing in name order
+        difficulty_cursor = self.client.get("/api/nonograms/list", params={"sort": "difficulty", "limit": 1}).json()["next_cursor"]
+        response = self.client.get("/api/nonograms/list", params={"cursor": difficulty_cursor})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("sorted by name", response.json()["detail"])
+
+        response = self.client.get("/api/nonograms/search", params={"clue": "1", "sort": "difficulty"})
+        self.assertEqual(response.json()["matches"], ["test_nonogram", "diagonal", "broken"])
+        response = self.client.get("/api/nonograms/search", params={"q": "difficulty:hard"})
+        self.assertEqual(response.json()["matches"], ["diagonal"])
+        response = self.client.get("/api/nonograms/search", params={"q": "difficulty:<=medium", "sort": "difficulty"})
+        self.assertEqual(sorted(response.json()["matches"]), ["another_test", "test_nonogram"])
+
+    def test_check_board(self):
+        """Test starting a board in play, sending deltas and detecting completion."""
+        url = "/api/nonograms/test_nonogram/check"
+        response = self.client.post(url, json={})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertFalse(result["complete"])
+        self.assertEqual(len(result["lines"]), 6)
+        self.assertEqual(result["satisfied"], 0)
+
+        session, board_hash = result["session"], result["board_hash"]
+        cells = [(r, c) for r, row in enumerate(self.test_data["test_nonogram"]["board"]) for c, filled in enumerate(row) if filled]
+        for r, c in cells:
+            response = self.client.post(url, json={"session": session, "board_hash": board_hash, "changes": [{"row": r, "col": c, "filled": True}]})
+            result = response.json()
+            self.assertEqual(result["session"], session)
+            board_hash = result["board_hash"]
+            # Only the row and column of the changed cell are reported
+            self.assertEqual({(line["axis"], line["index"]) for line in result["lines"]}, {("row", r), ("column", c)})
+        self.assertTrue(result["complete"])
+        self.assertEqual(result["satisfied"], 6)
+
+        response = self.client.post(url, json={"board": self.test_data["test_nonogram"]["board"]})
+        self.assertEqual(response.json()["board_hash"], board_hash)
+        self.assertNotEqual(response.json()["session"], session)
+        stale_hash = board_hash
+        response = self.client.post(url, json={"session": session, "changes": [{"row": 0, "col": 0, "filled": True}]})
+        result = response.json()
+        self.assertFalse(result["complete"])
+        self.assertEqual(result["contradicted"], 2)
+        self.assertEqual(result["lines"][0], {"axis": "row", "index": 0, "status": "contradicted", "clue": [2]})
+
+        # A hash the board has moved on from is out of sync
+        self.assertEqual(self.client.post(url, json={"session": session, "board_hash": stale_hash}).status_code, 409)
+        self.assertEqual(self.client.post(url, json={"session": session, "board_hash": result["board_hash"]}).status_code, 200)
+        self.assertEqual(self.client.post(url, json={"session": "unknown"}).status_code, 409)
+        self.assertEqual(self.client.post(url, json={"board": [[True]]}).status_code, 400)
+        self.assertEqual(self.client.post(url, json={"changes": [{"row": 3, "col": 0, "filled": True}]}).status_code, 400)
+        self.assertEqual(self.client.post(url, json={"session": session, "board": [[True]]}).status_code, 422)
+        self.assertEqual(self.client.post(url, json={"board_hash": board_hash}).status_code, 422)
+        self.assertEqual(self.client.post("/api/nonograms/missing/check", json={}).status_code, 404)
+
+    def test_check_starts_on_io_pool(self):
+        """Test that starting a board runs on the I/O pool while small deltas are checked in place."""
+        url = "/api/nonograms/test_nonogram/check"
+        run_io = mock.AsyncMock(side_effect=lambda func, *args: func(*args))
+        with mock.patch("app.api.nonograms.job_executor.run_io", run_io), \
+                mock.patch("app.api.nonograms.CHECK_INLINE_CHANGES", 1):
+            started = self.client.post(url, json={"board": self.test_data["test_nonogram"]["board"]}).json()
+            self.assertEqual(run_io.await_count, 1)
+            self.assertEqual(run_io.await_args.args[0], self.data_manager.check_board)
+            change = {"row": 0, "col": 0, "filled": True}
+            self.client.post(url, json={"session": started["session"], "changes": [change]})
+            self.assertEqual(run_io.await_count, 1)
+            response = self.client.post(url, json={"session": started["session"], "changes": [change, {"row": 2, "col": 2, "filled": True}]})
+            self.assertEqual(run_io.await_count, 2)
+        self.assertEqual(response.json()["contradicted"], 4)
+
+    def test_check_boards_of_concurrent_players(self):
+        """Test that players of the same puzzle with identical boards keep separate sessions."""
+        url = "/api/nonograms/test_nonogram/check"
+        first, second = self.client.post(url, json={}).json(), self.client.post(url, json={}).json()
+        self.assertEqual(first["board_hash"], second["board_hash"])
+        self.assertNotEqual(first["session"], second["session"])
+
+        # Moves interleave, and both players make the same first move
+        moves = [
+            (first, {"row": 1, "col": 1, "filled": True}),
+            (second, {"row": 1, "col": 1, "filled": True}),
+            (second, {"row": 0, "col": 1, "filled": True}),
+            (first, {"row": 1, "col": 0, "filled": True}),
+        ]
+        for player, change in moves:
+            response = self.client.post(url, json={"session": player["session"], "board_hash": player["board_hash"], "changes": [change]})
+            self.assertEqual(response.status_code, 200)
+            player.update(response.json())
+        self.assertEqual(self.client.post(url, json={"board": [[False, False, False], [True, True, False], [False, False, False]]}).json()["board_hash"],
+                         first["board_hash"])
+        self.assertEqual(self.client.post(url, json={"board": [[False, True, False], [False, True, False], [False, False, False]]}).json()["board_hash"],
+                         second["board_hash"])
+
     def test_get_nonogram_by_name(self):
         """Test getting a specific nonogram by name."""
         response = self.client.get("/api/nonograms/test_nonogram")
@@ -86,10 +241,32 @@ class TestNonogramAPI(unittest.TestCase):
         self.assertEqual(data["name"], "test_nonogram")
         self.assertEqual(data["board"], self.test_data["test_nonogram"]["board"])
         self.assertEqual(data["descriptors"], self.test_data["test_nonogram"]["descriptors"])
+        self.assertTrue(response.headers["etag"].startswith('"'))
+    
+    def test_get_nonogram_compact_formats(self):
+        """Test the compact board encodings selected by query or Accept header."""
+        response = self.client.get("/api/nonograms/test_nonogram?format=bitmap")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["width"], data["height"], data["encoding"]), (3, 3, "bitmap"))
+        # Rows 010, 111, 010 padded to one byte each
+        self.assertEqual(data["board"], "QOBA")
+        self.assertEqual(data["descriptors"], self.test_data["test_nonogram"]["descriptors"])
+        
+        response = self.client.get(
+            "/api/nonograms/test_nonogram",
+            headers={"Accept": "application/vnd.nonogram.rle+json"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/vnd.nonogram.rle+json")
+        self.assertEqual(response.json()["board"], [1, 1, 1, 3, 1, 1, 1])
+        self.assertIn("Accept", response.headers["vary"])
+        
+        response = self.client.get("/api/nonograms/test_nonogram?format=png")
+        self.assertEqual(response.status_code, 422)
     
     def test_get_nonogram_not_found(self):
         """Test getting a nonogram that doesn't exist."""
-        self.mock_data_manager.get_by_name.return_value = None
         response = self.client.get("/api/nonograms/nonexistent")
         self.assertEqual(response.status_code, 404)
         self.assertIn("detail", response.json())
@@ -111,18 +288,39 @@ class TestNonogramAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"matches": []})
     
+    def test_search_query(self):
+        """Test the search query language."""
+        response = self.client.get("/api/nonograms/search", params={"q": "row:3 size:3x3"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"matches": ["test_nonogram"]})
+        self.assertIn("etag", response.headers)
+        
+        response = self.client.get("/api/nonograms/search", params={"q": "col:2,* width:<=3"})
+        self.assertEqual(response.json(), {"matches": ["another_test"]})
+        response = self.client.get("/api/nonograms/search", params={"q": "filled:>=4"})
+        self.assertEqual(response.json(), {"matches": ["test_nonogram", "another_test"]})
+        response = self.client.get("/api/nonograms/search", params={"q": "row:*,1,* filled:4"})
+        self.assertEqual(response.json(), {"matches": []})
+        
+        self.assertEqual(self.client.get("/api/nonograms/search", params={"q": "row:3,,1"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/nonograms/search").status_code, 422)
+        self.assertEqual(self.client.get("/api/nonograms/search", params={"q": "3", "clue": "3"}).status_code, 422)
+    
+    def test_find_similar(self):
+        """Test similarity queries by name and by board."""
+        response = self.client.post("/api/nonograms/similar", json={"board": [[True, True, True], [True, True, True], [False, True, False]]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"matches": [{"name": "test_nonogram", "distance": 2, "similarity": 0.7778}]})
+        
+        response = self.client.post("/api/nonograms/similar", json={"name": "test_nonogram", "metric": "clues"})
+        self.assertEqual(response.json(), {"matches": []})
+        
+        self.assertEqual(self.client.post("/api/nonograms/similar", json={"name": "nonexistent"}).status_code, 404)
+        self.assertEqual(self.client.post("/api/nonograms/similar", json={"k": 3}).status_code, 422)
+        self.assertEqual(self.client.post("/api/nonograms/similar", json={"board": [[True], [True, False]]}).status_code, 422)
+    
     def test_create_nonogram(self):
         """Test creating a new nonogram."""
-        # Mock the create_nonogram method
-        self.mock_data_manager.create_nonogram.return_value = mock.MagicMock(
-            name="new_test",
-            board=[[True, False], [False, True]],
-            descriptors={
-                "rows": [[1], [1]],
-                "columns": [[1], [1]]
-            }
-        )
-        
         # Test creating a nonogram
         response = self.client.post(
             "/api/nonograms/",
@@ -140,7 +338,331 @@ class TestNonogramAPI(unittest.TestCase):
             "rows": [[1], [1]],
             "columns": [[1], [1]]
         })
+        self.assertNotIn("uniqueness", data)
+    
+    def test_create_nonogram_validate_unique(self):
+        """Test the uniqueness check when creating a nonogram."""
+        response = self.client.post(
+            "/api/nonograms/?validate=unique",
+            json={"name": "plus", "board": self.test_data["test_nonogram"]["board"]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["uniqueness"]["status"], "unique")
+        self.assertNotIn("witness", response.json()["uniqueness"])
+        
+        # The diagonal board has the same clues as the anti-diagonal one
+        response = self.client.post(
+            "/api/nonograms/?validate=unique",
+            json={"name": "diagonal", "board": [[True, False], [False, True]]}
+        )
+        self.assertEqual(response.status_code, 200)
+        uniqueness = response.json()["uniqueness"]
+        self.assertEqual(uniqueness["status"], "multiple")
+        self.assertEqual(sorted(uniqueness["witness"]), [[0, 0], [0, 1], [1, 0], [1, 1]])
+        
+        response = self.client.post(
+            "/api/nonograms/?validate=other",
+            json={"name": "diagonal", "board": [[True, False], [False, True]]}
+        )
+        self.assertEqual(response.status_code, 422)
+
+    
+    def test_conditional_get(self):
+        """Test ETag and If-None-Match handling on the read endpoints."""
+        for url in ("/api/nonograms/list", "/api/nonograms/test_nonogram", "/api/nonograms/search?clue=3"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response.headers["etag"]
+            self.assertIn("cache-control", response.headers)
+            
+            response = self.client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b"")
+            self.assertEqual(response.headers["etag"], etag)
+            
+            response = self.client.get(url, headers={"If-None-Match": '"stale"'})
+            self.assertEqual(response.status_code, 200)
+    
+    def test_compressed_responses(self):
+        """Test content negotiation and per-snapshot caching of compressed bodies."""
+        board = [[(r * 7 + c * 3) % 5 < 2 for c in range(50)] for r in range(50)]
+        self.test_data["large"] = {"board": board, "descriptors": calculate_descriptors(board)}
+        with open(self.temp_file.name, 'w') as f:
+            json.dump(self.test_data, f)
+        self.data_manager.refresh()
+        url = "/api/nonograms/large"
+
+        plain = self.client.get(url, headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", plain.headers)
+        self.assertIn("Accept-Encoding", plain.headers["vary"])
+
+        response = self.client.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertLess(int(response.headers["content-length"]), len(plain.content) // 4)
+        self.assertEqual(response.json(), plain.json())
+        self.assertEqual(response.json()["board"], board)
+        etag = response.headers["etag"]
+        self.assertEqual(etag, plain.headers["etag"][:-1] + '-gzip"')
+        self.assertEqual(response.headers["vary"].split(", ").count("Accept-Encoding"), 1)
+        self.assertEqual(self.client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code, 304)
+        self.assertEqual(self.client.get(url, headers={"Accept-Encoding": "identity", "If-None-Match": etag}).status_code, 200)
+
+        # Compressed once per snapshot
+        with mock.patch("app.core.snapshot.compress") as compress:
+            self.client.get(url, headers={"Accept-Encoding": "gzip"})
+        compress.assert_not_called()
+
+        # Small bodies are sent as they are
+        small = self.client.get("/api/nonograms/test_nonogram", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("content-encoding", small.headers)
+
+        # Responses built per request are compressed by the middleware
+        response = self.client.post("/api/nonograms/descriptors:batch", json={"boards": [board] * 4},
+                                    headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+
+    def test_compression_middleware(self):
+        """Test that already encoded and streamed responses pass the middleware untouched."""
+        async def asgi(scope, receive, send):
+            content_type, encoding = scope["path"].strip("/").split("/")
+            headers = [(b"content-type", content_type.replace("+", "/").encode())]
+            if encoding != "none":
+                headers.append((b"content-encoding", encoding.encode()))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b"x" * 2000, "more_body": True})
+            await send({"type": "http.response.body", "body": b"x" * 2000})
+
+        client = TestClient(CompressionMiddleware(asgi, minimum_size=500))
+        gzip = {"Accept-Encoding": "gzip"}
 
+        plain = client.get("/text+plain/none", headers=gzip)
+        self.assertEqual(plain.headers["content-encoding"], "gzip")
+        self.assertEqual(plain.headers["vary"], "Accept-Encoding")
+        self.assertEqual(plain.content, b"x" * 4000)
+
+        # Not decoded by the client, so the raw body shows it was not recompressed
+        encoded = client.get("/text+plain/br", headers=gzip)
+        self.assertEqual(encoded.headers["content-encoding"], "br")
+        self.assertEqual(encoded.content, b"x" * 4000)
+
+        streamed = client.get("/application+x-ndjson/none", headers=gzip)
+        self.assertNotIn("content-encoding", streamed.headers)
+
+        identity = client.get("/text+plain/none", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", identity.headers)
+        self.assertEqual(identity.headers["vary"], "Accept-Encoding")
+
+    def test_negotiate_coding(self):
+        """Test Accept-Encoding negotiation."""
+        self.assertIsNone(negotiate_coding(None))
+        self.assertIsNone(negotiate_coding("identity"))
+        self.assertIsNone(negotiate_coding("gzip;q=0"))
+        self.assertEqual(negotiate_coding("deflate, GZIP;q=0.5"), "gzip")
+        self.assertEqual(negotiate_coding("*"), CONTENT_CODINGS[0])
+        self.assertEqual(negotiate_coding("*, gzip;q=0"), "br" if "br" in CONTENT_CODINGS else None)
+        self.assertEqual(negotiate_coding("gzip;q=0.9, br;q=0.1"), "gzip")
+        self.assertIsNone(negotiate_coding("gzip;q=bad"))
+
+    def test_list_etag_changes_with_data(self):
+        """Test that the list ETag follows the data snapshot."""
+        etag = self.client.get("/api/nonograms/list").headers["etag"]
+        puzzle_etag = self.client.get("/api/nonograms/test_nonogram").headers["etag"]
+        
+        del self.test_data["another_test"]
+        with open(self.temp_file.name, 'w') as f:
+            json.dump(self.test_data, f)
+        self.data_manager.refresh()
+        
+        response = self.client.get("/api/nonograms/list", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"names": ["test_nonogram"]})
+        self.assertNotEqual(response.headers["etag"], etag)
+        
+        # The unchanged puzzle keeps its content-hash ETag
+        response = self.client.get("/api/nonograms/test_nonogram", headers={"If-None-Match": puzzle_etag})
+        self.assertEqual(response.status_code, 304)
+    
+    def test_solve_nonogram(self):
+        """Test solving a nonogram from its descriptors."""
+        descriptors = self.test_data["test_nonogram"]["descriptors"]
+        response = self.client.post("/api/nonograms/solve", json={"descriptors": descriptors, "max_solutions": 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["status"], "solved")
+        self.assertEqual(data["solutions"], [self.test_data["test_nonogram"]["board"]])
+        self.assertTrue(data["unique"])
+        self.assertIn("elapsed_ms", data["stats"])
+        
+        response = self.client.post("/api/nonograms/solve", json={"descriptors": {"rows": [[5]], "columns": [[1]]}})
+        self.assertEqual(response.status_code, 422)
+        # Malformed clues are refused by request validation rather than failing in the solver
+        for descriptors in ({"rows": [["a"]], "columns": [[1]]}, {"rows": 5, "columns": [[1]]},
+                            {"rows": [[1.5]], "columns": [[1]]}, {"rows": [[-1]], "columns": [[1]]},
+                            {"rows": [[1]], "diagonals": [[1]]}, {"rows": [[1]]}, {}):
+            response = self.client.post("/api/nonograms/solve", json={"descriptors": descriptors})
+            self.assertEqual(response.status_code, 422, descriptors)
+    
+    def test_hint_nonogram(self):
+        """Test hints from line solving and probing, and contradicted grids."""
+        descriptors = self.test_data["test_nonogram"]["descriptors"]
+        response = self.client.post("/api/nonograms/hint", json={"descriptors": descriptors})
+        self.assertEqual(response.status_code, 200)
+        hint = response.json()
+        self.assertEqual((hint["status"], hint["technique"]), ("hint", "line"))
+        self.assertEqual(hint["line"], {"axis": "row", "index": 1, "clue": [3]})
+        self.assertEqual(hint["cells"], [{"row": 1, "col": c, "filled": True} for c in range(3)])
+
+        grid = [[None, True, None], [True, True, True], [None, True, None]]
+        response = self.client.post("/api/nonograms/hint", json={"descriptors": descriptors, "grid": grid})
+        self.assertEqual(response.json()["line"], {"axis": "row", "index": 0, "clue": [1]})
+        grid[0][0] = True
+        hint = self.client.post("/api/nonograms/hint", json={"descriptors": descriptors, "grid": grid}).json()
+        self.assertEqual((hint["status"], hint["line"]["index"]), ("contradiction", 0))
+
+        # Line solving stalls on this one; the probe runs on the CPU pool
+        probing = {"rows": [[1], [1], [1, 1], [2], [1]], "columns": [[1], [2, 1], [1], [1, 1], [0]]}
+        known = [[None, None, None, None, False], [False, True, False, False, False],
+                 [None, None, None, None, False], [None, None, None, None, False], [None, None, None, None, False]]
+        hint = self.client.post("/api/nonograms/hint", json={"descriptors": probing, "grid": known}).json()
+        self.assertEqual((hint["status"], hint["technique"]), ("hint", "probe"))
+        self.assertEqual(hint["cells"][0]["filled"], not hint["probe"]["filled"])
+
+        self.assertEqual(self.client.post("/api/nonograms/hint", json={"descriptors": descriptors, "grid": [[True]]}).status_code, 422)
+
+        # Malformed clues and oversized grids are refused by request validation
+        for descriptors in ({"rows": [["a"]], "columns": [[1]]}, {"rows": 5, "columns": [[1]]},
+                            {"rows": [[None]], "columns": [[1]]}, {"rows": [[1]]},
+                            {"rows": [[0]] * 201, "columns": [[0]]}):
+            response = self.client.post("/api/nonograms/hint", json={"descriptors": descriptors})
+            self.assertEqual(response.status_code, 422, descriptors)
+            self.assertNotIn("NonogramLine", response.text)
+
+    def test_hint_on_cpu_pool(self):
+        """Test that large grids are hinted on the CPU pool, and stuck grids probe without a second line pass."""
+        descriptors = self.test_data["test_nonogram"]["descriptors"]
+        run_cpu = mock.AsyncMock(side_effect=lambda func, *args: func(*args))
+        with mock.patch("app.api.nonograms.job_executor.run_cpu", run_cpu), \
+                mock.patch("app.api.nonograms.HINT_INLINE_CELLS", 4):
+            hint = self.client.post("/api/nonograms/hint", json={"descriptors": descriptors}).json()
+        self.assertEqual((hint["status"], hint["technique"]), ("hint", "line"))
+        self.assertEqual(run_cpu.await_args.args[2:], ())
+
+        probing = {"rows": [[1], [1], [1, 1], [2], [1]], "columns": [[1], [2, 1], [1], [1, 1], [0]]}
+        known = [[None, None, None, None, False], [False, True, False, False, False],
+                 [None, None, None, None, False], [None, None, None, None, False], [None, None, None, None, False]]
+        run_cpu.reset_mock()
+        with mock.patch("app.api.nonograms.job_executor.run_cpu", run_cpu), \
+                mock.patch("app.core.hints.line_hint", wraps=hints.line_hint) as line_hint:
+            hint = self.client.post("/api/nonograms/hint", json={"descriptors": probing, "grid": known}).json()
+        self.assertEqual((hint["status"], hint["technique"]), ("hint", "probe"))
+        self.assertEqual(run_cpu.await_args.args[2:], (True, True))
+        self.assertEqual(line_hint.call_count, 1)
+        self.assertGreater(hint["stats"]["line_solves"], 0)
+
+    def test_generate_nonograms(self):
+        """Test streaming generated puzzles as NDJSON."""
+        request = {"width": 5, "height": 4, "count": 3, "seed": 9, "max_difficulty": "medium"}
+        response = self.client.post("/api/nonograms/generate", json=request)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        self.assertEqual(response.headers["x-nonogram-seed"], "9")
+        puzzles = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(len(puzzles), 3)
+        for puzzle in puzzles:
+            self.assertTrue(puzzle["name"].startswith("generated-9-"))
+            self.assertEqual((len(puzzle["board"]), len(puzzle["board"][0])), (4, 5))
+            self.assertTrue(puzzle["unique"])
+            self.assertIn(puzzle["difficulty"], ("easy", "medium"))
+        self.assertEqual(self.client.post("/api/nonograms/generate", json=request).text, response.text)
+        
+        request.update(min_difficulty="hard", max_difficulty="easy")
+        self.assertEqual(self.client.post("/api/nonograms/generate", json=request).status_code, 422)
+    
+    def test_get_nonogram_batch(self):
+        """Test fetching several nonograms in one request."""
+        response = self.client.post(
+            "/api/nonograms/batch",
+            json={"names": ["another_test", "missing", "test_nonogram", "another_test"]}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(list(data["nonograms"]), ["another_test", "test_nonogram"])
+        self.assertEqual(data["nonograms"]["test_nonogram"], {"name": "test_nonogram", **self.test_data["test_nonogram"]})
+        self.assertEqual(data["missing"], ["missing"])
+        
+        response = self.client.post("/api/nonograms/batch", json={"names": []})
+        self.assertEqual(response.json(), {"nonograms": {}, "missing": []})
+    
+    def test_calculate_descriptors_batch(self):
+        """Test calculating descriptors for several boards in one request."""
+        boards = [self.test_data["test_nonogram"]["board"], self.test_data["another_test"]["board"], []]
+        response = self.client.post("/api/nonograms/descriptors:batch", json={"boards": boards})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["descriptors"], [
+            self.test_data["test_nonogram"]["descriptors"],
+            self.test_data["another_test"]["descriptors"],
+            {"rows": [], "columns": []}
+        ])
+        
+        response = self.client.post("/api/nonograms/descriptors:batch", json={"boards": [[[True], [True, False]]]})
+        self.assertEqual(response.status_code, 422)
+    
+    def test_write_endpoints_on_read_only_store(self):
+        """Test that writes to the JSON file store are refused."""
+        response = self.client.put("/api/nonograms/test_nonogram", json={"board": [[True]]})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.delete("/api/nonograms/test_nonogram")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post("/api/nonograms/?save=true", json={"name": "x", "board": [[True]]})
+        self.assertEqual(response.status_code, 403)
+    
+    def test_write_endpoints(self):
+        """Test creating, replacing and deleting nonograms in a writable store."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        manager = NonogramDataManager(
+            store=SQLiteStore(os.path.join(directory.name, "nonograms.db"), seed_path=self.temp_file.name),
+            reload_strategy=ManualReloadStrategy()
+        )
+        self.addCleanup(manager.close)
+        
+        with mock.patch('app.api.nonograms.data_manager', manager):
+            response = self.client.post("/api/nonograms/?save=true", json={"name": "corner", "board": [[True, False]]})
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()["descriptors"], {"rows": [[1]], "columns": [[1], [0]]})
+            self.assertEqual(self.client.get("/api/nonograms/corner").json()["board"], [[True, False]])
+            self.assertIn("corner", self.client.get("/api/nonograms/list").json()["names"])
+            
+            response = self.client.post("/api/nonograms/?save=true", json={"name": "corner", "board": [[True]]})
+            self.assertEqual(response.status_code, 409)
+            
+            response = self.client.put("/api/nonograms/corner", json={"board": [[False, True]]})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.client.get("/api/nonograms/corner").json()["board"], [[False, True]])
+            response = self.client.put("/api/nonograms/bar", json={"board": [[True, True]]})
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(self.client.get("/api/nonograms/search?clue=2").json()["matches"], ["another_test", "bar"])
+            
+            response = self.client.put("/api/nonograms/copy", json={"board": [[True, True]]})
+            self.assertEqual(response.status_code, 409)
+            self.assertIn("'bar'", response.json()["detail"])
+            
+            self.assertEqual(self.client.delete("/api/nonograms/corner").status_code, 204)
+            self.assertEqual(self.client.delete("/api/nonograms/corner").status_code, 404)
+            self.assertEqual(self.client.get("/api/nonograms/corner").status_code, 404)
+    
+    def test_cpu_pool_saturated(self):
+        """Test that a saturated CPU pool answers 503 with Retry-After."""
+        busy = mock.AsyncMock(side_effect=ExecutorSaturated("cpu", 2))
+        with mock.patch("app.api.nonograms.job_executor.run_cpu", busy):
+            response = self.client.post("/api/nonograms/", json={"name": "x", "board": [[True]]})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "2")
+        
+        with mock.patch("app.api.nonograms.job_executor.submit_cpu", side_effect=ExecutorSaturated("cpu", 2)):
+            response = self.client.post("/api/nonograms/generate", json={"width": 5, "height": 5})
+        self.assertEqual(response.status_code, 503)
 
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,77 @@
+import pickle
+import unittest
+
+from app.core.bitboard import PackedBoard
+
+
+class TestPackedBoard(unittest.TestCase):
+    """Test cases for the bit-packed board representation."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        # 10 columns, so every row spills into a second byte
+        self.rows = [
+            [True, False, False, False, False, False, False, False, True, True],
+            [False] * 10,
+            [True] * 10
+        ]
+        self.board = PackedBoard.from_rows(self.rows)
+    
+    def test_round_trip(self):
+        """Test packing and unpacking a board."""
+        self.assertEqual(self.board.width, 10)
+        self.assertEqual(self.board.height, 3)
+        self.assertEqual(len(self.board.bits), 6)
+        self.assertEqual(self.board.to_rows(), self.rows)
+        self.assertEqual(self.board.filled_count(), 13)
+    
+    def test_row_masks(self):
+        """Test that the first column is the most significant bit of a row."""
+        self.assertEqual(self.board.row_mask(0), 0b1000000011)
+        self.assertEqual(self.board.row_masks(), [0b1000000011, 0, 0b1111111111])
+        self.assertEqual(PackedBoard.from_row_masks(10, self.board.row_masks()), self.board)
+    
+    def test_base64(self):
+        """Test the base64 bitmap wire format."""
+        encoded = self.board.to_base64()
+        self.assertEqual(PackedBoard.from_base64(encoded, 10, 3), self.board)
+    
+    def test_rle(self):
+        """Test the run-length wire format."""
+        runs = self.board.to_rle()
+        self.assertEqual(runs, [0, 1, 7, 2, 10, 10])
+        self.assertEqual(PackedBoard.from_rle(runs, 10, 3), self.board)
+        
+        with self.assertRaises(ValueError):
+            PackedBoard.from_rle([1, 2], 10, 3)
+    
+    def test_invalid_boards(self):
+        """Test that ragged boards and wrong sizes are rejected."""
+        with self.assertRaises(ValueError):
+            PackedBoard.from_rows([[True, False], [True]])
+        with self.assertRaises(ValueError):
+            PackedBoard(10, 3, b"\x00")
+    
+    def test_memoryview_bits(self):
+        """Test that a read-only view is used in place and behaves like the bytes it views."""
+        data = b"\x00" + self.board.bits
+        view = memoryview(data)[1:]
+        board = PackedBoard(10, 3, view)
+        self.assertIs(board.bits, view)
+        self.assertEqual(board, self.board)
+        self.assertEqual(hash(board), hash(self.board))
+        self.assertEqual(board.to_rows(), self.board.to_rows())
+        self.assertEqual(pickle.loads(pickle.dumps(board)), self.board)
+        # Writable buffers are copied, so the board stays immutable
+        self.assertIsInstance(PackedBoard(10, 3, bytearray(self.board.bits)).bits, bytes)
+
+    def test_empty_board(self):
+        """Test the degenerate empty board."""
+        board = PackedBoard.from_rows([])
+        self.assertEqual((board.width, board.height), (0, 0))
+        self.assertEqual(board.to_rows(), [])
+        self.assertEqual(PackedBoard.from_rle(board.to_rle(), 0, 0), board)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,249 @@
+import base64
+import json
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api import coop as coop_api
+from app.core.coop import CROSSED, FILLED, UNKNOWN, CoopSession, CoopSessions, CoopSessionsFull, TriStateGrid
+from app.core.crud import NonogramDataManager
+from app.core.descriptors import calculate_descriptors
+from app.core.play import PlayState
+from app.core.reload import ManualReloadStrategy
+
+# 3x2 board: filled cells at indexes 0, 1 and 5
+CROSS_DESCRIPTORS = {"rows": [[2], [1]], "columns": [[1], [1], [1]]}
+
+
+class TestCoopSession(unittest.TestCase):
+    """Test cases for shared boards of co-op sessions."""
+
+    def test_grid_packs_two_bits_per_cell(self):
+        """Test that cells keep their own state, four to a byte."""
+        grid = TriStateGrid(5, 3)
+        self.assertEqual(len(grid.cells), 4)
+        rng = random.Random(2)
+        states = [rng.choice((UNKNOWN, FILLED, CROSSED)) for _ in range(15)]
+        for index, state in enumerate(states):
+            self.assertEqual(grid.set(index, state), UNKNOWN)
+        self.assertEqual([grid.get(index) for index in range(15)], states)
+        self.assertEqual(grid.set(7, CROSSED), states[7])
+        self.assertEqual(grid.get(6), states[6])
+        self.assertEqual(grid.get(8), states[8])
+        self.assertEqual(base64.b64decode(grid.encode()), bytes(grid.cells))
+
+    def test_deltas_coalesce_changes(self):
+        """Test that a delta carries the last state of every cell changed since the previous one."""
+        session = CoopSession("p", "s", CROSS_DESCRIPTORS, 0.0)
+        self.assertIsNone(session.take_delta())
+        session.apply([0, FILLED, 3, CROSSED])
+        session.apply([3, UNKNOWN, 1, FILLED, 0, FILLED])
+        delta = session.take_delta()
+        self.assertEqual(delta["seq"], 1)
+        self.assertEqual(dict(zip(delta["cells"][::2], delta["cells"][1::2])), {0: FILLED, 3: UNKNOWN, 1: FILLED})
+        # Row 0 and columns 0 and 1 were re-examined, and are satisfied (status 0)
+        self.assertEqual(delta["lines"], [0, 0, 2, 0, 3, 0])
+        self.assertFalse(delta["complete"])
+        self.assertIsNone(session.take_delta())
+
+        session.apply([5, FILLED])
+        delta = session.take_delta()
+        self.assertEqual(delta["seq"], 2)
+        self.assertTrue(delta["complete"])
+        self.assertEqual(delta["satisfied"], 5)
+
+    def test_crossed_cells_do_not_fill(self):
+        """Test that crossing or clearing a cell counts as empty for the line checks."""
+        session = CoopSession("p", "s", CROSS_DESCRIPTORS, 0.0)
+        session.apply([0, FILLED])
+        session.take_delta()
+        session.apply([0, CROSSED])
+        delta = session.take_delta()
+        self.assertEqual(delta["cells"], [0, CROSSED])
+        self.assertEqual(session.play.rows, [0, 0])
+        # Filled to crossed changes the lines; crossed to unknown does not
+        session.apply([0, UNKNOWN])
+        self.assertEqual(session.take_delta()["lines"], [])
+
+    def test_incremental_state_matches_full_check(self):
+        """Test that line statuses after random deltas match a board checked in full."""
+        rng = random.Random(5)
+        solution = [[rng.random() < 0.5 for _ in range(6)] for _ in range(4)]
+        descriptors = calculate_descriptors(solution)
+        session = CoopSession("p", "s", descriptors, 0.0)
+        board = [[False] * 6 for _ in range(4)]
+        for _ in range(100):
+            cells = []
+            for _ in range(rng.randint(1, 4)):
+                index, state = rng.randrange(24), rng.choice((UNKNOWN, FILLED, CROSSED))
+                cells += (index, state)
+                board[index // 6][index % 6] = state == FILLED
+            session.apply(cells)
+            full = PlayState("p", descriptors, board)
+            self.assertEqual(session.play.status, full.status)
+            self.assertEqual(session.state()["complete"], full.complete)
+
+    def test_invalid_changes_change_nothing(self):
+        """Test that malformed changes are refused before any cell is set."""
+        session = CoopSession("p", "s", CROSS_DESCRIPTORS, 0.0)
+        for cells in ([0], [0, FILLED, 6, FILLED], [0, 3], [True, FILLED], "01", [0, FILLED] * 7):
+            with self.assertRaises(ValueError):
+                session.apply(cells)
+        self.assertEqual(bytes(session.grid.cells), bytes(2))
+        self.assertIsNone(session.take_delta())
+
+    def test_state_message(self):
+        """Test the state sent to joining players."""
+        session = CoopSession("p", "s", CROSS_DESCRIPTORS, 0.0)
+        session.apply([1, FILLED, 2, CROSSED])
+        state = session.state()
+        self.assertEqual((state["width"], state["height"], state["seq"]), (3, 2, 0))
+        self.assertEqual(base64.b64decode(state["cells"]), bytes([FILLED << 2 | CROSSED << 4, 0]))
+        self.assertEqual(len(state["lines"]), 5)
+
+
+class TestCoopSessions(unittest.TestCase):
+    """Test cases for the bounded set of co-op sessions."""
+
+    def test_join_shares_and_resets_sessions(self):
+        """Test that a session is shared by its id and reset when the puzzle changes."""
+        sessions = CoopSessions()
+        session, reset = sessions.join("p", "a", CROSS_DESCRIPTORS, 0.0)
+        self.assertFalse(reset)
+        session.apply([0, FILLED])
+        self.assertIs(sessions.join("p", "a", dict(CROSS_DESCRIPTORS), 1.0)[0], session)
+        self.assertIsNot(sessions.join("p", "b", CROSS_DESCRIPTORS, 1.0)[0], session)
+        self.assertEqual(len(sessions), 2)
+
+        replaced = {"rows": [[1], [1]], "columns": [[1], [1], [0]]}
+        session, reset = sessions.join("p", "a", replaced, 2.0)
+        self.assertTrue(reset)
+        self.assertEqual(session.grid.get(0), UNKNOWN)
+        self.assertEqual(session.descriptors, replaced)
+
+    def test_sessions_of_a_puzzle_share_clues(self):
+        """Test that the clues of a puzzle are normalised once for all its sessions."""
+        sessions = CoopSessions(idle_seconds=10)
+        first, _ = sessions.join("p", "a", CROSS_DESCRIPTORS, 0.0)
+        second, _ = sessions.join("p", "b", CROSS_DESCRIPTORS, 0.0)
+        self.assertIs(first.play.clues, second.play.clues)
+        self.assertEqual(first.play.clues, [(2,), (1,), (1,), (1,), (1,)])
+        other, _ = sessions.join("q", "a", {"rows": [[1]], "columns": [[1]]}, 0.0)
+        self.assertIsNot(other.play.clues, first.play.clues)
+        sessions.evict_idle(100.0)
+        self.assertEqual(sessions._clues, {})
+
+    def test_capacity_evicts_sessions_without_players(self):
+        """Test that a full set replaces the least recently active session without players."""
+        sessions = CoopSessions(max_sessions=2)
+        first, _ = sessions.join("p", "a", CROSS_DESCRIPTORS, 0.0)
+        second, _ = sessions.join("p", "b", CROSS_DESCRIPTORS, 1.0)
+        first.players.add("player")
+        sessions.join("p", "c", CROSS_DESCRIPTORS, 2.0)
+        self.assertIs(sessions.join("p", "a", CROSS_DESCRIPTORS, 3.0)[0], first)
+        self.assertIsNot(sessions.join("p", "b", CROSS_DESCRIPTORS, 4.0)[0], second)
+
+        for session in list(sessions._sessions.values()):
+            session.players.add("player")
+        with self.assertRaises(CoopSessionsFull):
+            sessions.join("p", "d", CROSS_DESCRIPTORS, 5.0)
+
+    def test_idle_sessions_are_evicted(self):
+        """Test that sessions without activity for the idle time are evicted, oldest first."""
+        sessions = CoopSessions(idle_seconds=10)
+        first, _ = sessions.join("p", "a", CROSS_DESCRIPTORS, 0.0)
+        second, _ = sessions.join("p", "b", CROSS_DESCRIPTORS, 5.0)
+        sessions.touch(first, 8.0)
+        self.assertEqual(sessions.evict_idle(12.0), [])
+        self.assertEqual(sessions.evict_idle(15.0), [second])
+        self.assertEqual(sessions.evict_idle(18.0), [first])
+        self.assertEqual(len(sessions), 0)
+        self.assertEqual(sessions._clues, {})
+        # An evicted session is not brought back by activity on it
+        sessions.touch(first, 20.0)
+        self.assertEqual(len(sessions), 0)
+
+
+class TestCoopWebSocket(unittest.TestCase):
+    """Test cases for the co-op WebSocket endpoint."""
+
+    def setUp(self):
+        """Serve the co-op router over a temporary catalogue."""
+        temp_file = tempfile.NamedTemporaryFile("w", delete=False, suffix=".json")
+        json.dump({"cross": {"board": [[True, True, False], [False, False, True]], "descriptors": CROSS_DESCRIPTORS}},
+                  temp_file)
+        temp_file.close()
+        self.addCleanup(os.unlink, temp_file.name)
+        manager = NonogramDataManager(temp_file.name, reload_strategy=ManualReloadStrategy())
+        self.addCleanup(manager.close)
+        for target, value in (("data_manager", manager), ("coop_sessions", CoopSessions())):
+            patcher = mock.patch.object(coop_api, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        test_app = FastAPI()
+        test_app.include_router(coop_api.router, prefix="/api/nonograms")
+        # Entering the client keeps one event loop for all the connections of a test
+        self.client = TestClient(test_app)
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+
+    def test_players_share_the_board(self):
+        """Test joining, coalesced deltas to every player and completion."""
+        with mock.patch.object(coop_api, "COOP_COALESCE_MS", 1000), \
+                self.client.websocket_connect("/api/nonograms/cross/coop/room1") as alice:
+            state = alice.receive_json()
+            self.assertEqual((state["type"], state["width"], state["height"]), ("state", 3, 2))
+            self.assertEqual(alice.receive_json(), {"type": "players", "count": 1})
+            alice.send_json({"type": "set", "cells": [0, FILLED]})
+
+            with self.client.websocket_connect("/api/nonograms/cross/coop/room1") as bob:
+                state = bob.receive_json()
+                # Changes not broadcast yet are part of the state
+                self.assertEqual(base64.b64decode(state["cells"])[0], FILLED)
+                self.assertEqual(bob.receive_json(), {"type": "players", "count": 2})
+                self.assertEqual(alice.receive_json(), {"type": "players", "count": 2})
+
+                alice.send_json({"type": "set", "cells": [1, FILLED]})
+                bob.send_json({"type": "set", "cells": [5, FILLED, 3, CROSSED]})
+                for player in (alice, bob):
+                    delta = player.receive_json()
+                    self.assertEqual(delta["type"], "delta")
+                    self.assertEqual(delta["seq"], 1)
+                    self.assertEqual(delta["cells"], [0, FILLED, 1, FILLED, 5, FILLED, 3, CROSSED])
+                    self.assertTrue(delta["complete"])
+
+                bob.send_json({"type": "set", "cells": [6, FILLED]})
+                self.assertEqual(bob.receive_json()["type"], "error")
+                bob.send_text("not json")
+                self.assertEqual(bob.receive_json()["type"], "error")
+
+            self.assertEqual(alice.receive_json(), {"type": "players", "count": 1})
+            self.assertEqual(coop_api.coop_sessions.players(), 1)
+
+    def test_refused_connections(self):
+        """Test the close codes of unknown puzzles, invalid ids and full sessions."""
+        for path, code in (("/api/nonograms/missing/coop/room1", coop_api.CLOSE_NOT_FOUND),
+                           ("/api/nonograms/cross/coop/" + "x" * 65, coop_api.CLOSE_INVALID)):
+            with self.client.websocket_connect(path) as websocket:
+                with self.assertRaises(WebSocketDisconnect) as raised:
+                    websocket.receive_json()
+                self.assertEqual(raised.exception.code, code)
+
+        with mock.patch.object(coop_api, "COOP_PLAYERS", 1), \
+                self.client.websocket_connect("/api/nonograms/cross/coop/room1") as first:
+            first.receive_json()
+            with self.client.websocket_connect("/api/nonograms/cross/coop/room1") as second:
+                with self.assertRaises(WebSocketDisconnect) as raised:
+                    second.receive_json()
+                self.assertEqual(raised.exception.code, coop_api.CLOSE_TRY_AGAIN)
+
+
+if __name__ == "__main__":
+    unittest.main()
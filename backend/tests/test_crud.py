@@ -3,9 +3,15 @@ import json
 import os
 import tempfile
 from typing import Dict, Any
+from unittest import mock
+
+from app.core.bitboard import PackedBoard
 
 from app.core.crud import NonogramDataManager
 from app.core.models import NonogramCreate
+from app.core.executor import JobExecutor
+from app.core.reload import ManualReloadStrategy, IntervalReloadStrategy
+from app.core.snapshot import CachedNonogram, CatalogueEntry
 
 class TestNonogramDataManager(unittest.TestCase):
     """Test cases for NonogramDataManager."""
@@ -46,10 +52,11 @@ class TestNonogramDataManager(unittest.TestCase):
             json.dump(self.test_data, f)
         
         # Create a NonogramDataManager instance with the temp file
-        self.data_manager = NonogramDataManager(self.temp_file.name)
+        self.data_manager = NonogramDataManager(self.temp_file.name, reload_strategy=ManualReloadStrategy())
     
     def tearDown(self):
         """Tear down test fixtures."""
+        self.data_manager.close()
         # Remove the temporary file
         os.unlink(self.temp_file.name)
     
@@ -66,6 +73,30 @@ class TestNonogramDataManager(unittest.TestCase):
         self.assertEqual(nonogram.board, self.test_data["test_nonogram"]["board"])
         self.assertEqual(nonogram.descriptors, self.test_data["test_nonogram"]["descriptors"])
     
+    def test_get_cached_is_reused_until_reload(self):
+        """Test that encoded nonograms are cached per snapshot."""
+        cached = self.data_manager.get_cached("test_nonogram")
+        self.assertIs(self.data_manager.get_cached("test_nonogram"), cached)
+        self.assertEqual(json.loads(cached.body)["board"], self.test_data["test_nonogram"]["board"])
+        
+        self.test_data["test_nonogram"]["board"][0][0] = True
+        with open(self.temp_file.name, 'w') as f:
+            json.dump(self.test_data, f)
+        self.data_manager.refresh()
+        
+        reloaded = self.data_manager.get_cached("test_nonogram")
+        self.assertIsNot(reloaded, cached)
+        self.assertNotEqual(reloaded.etag, cached.etag)
+    
+    def test_cached_body_matches_model(self):
+        """Test that cached bodies are byte for byte the model's JSON, whichever encoder made them."""
+        cached = self.data_manager.get_cached("test_nonogram")
+        self.assertEqual(cached.body, cached.model.model_dump_json().encode("utf-8"))
+        with mock.patch("app.core.encoding.orjson", None):
+            entry = CatalogueEntry(PackedBoard.from_rows([[True]]), {"rows": [[1]], "columns": [[1]]})
+            fallback = CachedNonogram.build("caf\u00e9 \"1\"", entry)
+        self.assertEqual(fallback.body, fallback.model.model_dump_json().encode("utf-8"))
+
     def test_get_by_invalid_name(self):
         """Test getting a nonogram with an invalid name."""
         nonogram = self.data_manager.get_by_name("nonexistent")
@@ -85,6 +116,59 @@ class TestNonogramDataManager(unittest.TestCase):
         matches = self.data_manager.search_by_clue("4")
         self.assertEqual(matches, [])
     
+    def test_search_by_clue_uses_fresh_index(self):
+        """Test that the clue index follows changes to the data file."""
+        # Add a nonogram that shares the [1] clue with test_nonogram
+        self.test_data["column_only"] = {
+            "board": [[True, False], [False, False]],
+            "descriptors": {"rows": [[1], [0]], "columns": [[1], [0]]}
+        }
+        with open(self.temp_file.name, 'w') as f:
+            json.dump(self.test_data, f)
+        self.assertTrue(self.data_manager.refresh())
+        
+        matches = self.data_manager.search_by_clue("1")
+        self.assertEqual(matches, ["test_nonogram", "column_only"])
+        
+        # Space and comma separated queries are equivalent
+        self.assertEqual(self.data_manager.search_by_clue("1, 0"), [])
+        self.assertEqual(self.data_manager.search_by_clue("abc"), [])
+    
+    def test_refresh_skips_unchanged_file(self):
+        """Test that a refresh without file changes keeps the same snapshot."""
+        snapshot = self.data_manager._snapshot
+        self.assertFalse(self.data_manager.refresh())
+        self.assertIs(self.data_manager._snapshot, snapshot)
+    
+    def test_refresh_keeps_data_on_invalid_json(self):
+        """Test that a broken data file does not replace the current snapshot."""
+        with open(self.temp_file.name, 'w') as f:
+            f.write("{not json")
+        self.assertFalse(self.data_manager.refresh())
+        self.assertEqual(set(self.data_manager.get_all_names()), {"test_nonogram", "another_test"})
+    
+    def test_interval_reload_strategy(self):
+        """Test that the interval strategy picks up changes once the interval passed."""
+        manager = NonogramDataManager(self.temp_file.name, reload_strategy=IntervalReloadStrategy(interval_ms=0))
+        self.addCleanup(manager.close)
+        with open(self.temp_file.name, 'w') as f:
+            json.dump({"only": self.test_data["another_test"]}, f)
+        self.assertEqual(manager.get_all_names(), ["only"])
+    
+    def test_interval_reload_in_background(self):
+        """Test that a background interval check serves the old snapshot until the reload finished."""
+        executor = JobExecutor(cpu_workers=0)
+        self.addCleanup(executor.shutdown)
+        strategy = IntervalReloadStrategy(interval_ms=0, executor=executor)
+        manager = NonogramDataManager(self.temp_file.name, reload_strategy=strategy)
+        self.addCleanup(manager.close)
+        with open(self.temp_file.name, 'w') as f:
+            json.dump({"only": self.test_data["another_test"]}, f)
+        
+        manager.get_all_names()
+        strategy._pending.result(timeout=5)
+        self.assertEqual(manager.get_all_names(), ["only"])
+    
     def test_calculate_descriptors(self):
         """Test calculation of descriptors from a board."""
         # Test with cross pattern
@@ -124,7 +208,7 @@ class TestNonogramDataManager(unittest.TestCase):
         descriptors = NonogramDataManager.calculate_descriptors(board)
         expected = {
             "rows": [[1, 1], [0], [3]],
-            "columns": [[2], [1], [2]]
+            "columns": [[1, 1], [1], [1, 1]]
         }
         self.assertEqual(descriptors, expected)
     
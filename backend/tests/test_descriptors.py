@@ -0,0 +1,76 @@
+import random
+import unittest
+from unittest import mock
+
+from app.core import descriptors
+from app.core.bitboard import PackedBoard
+from app.core.descriptors import calculate_descriptors, calculate_descriptors_batch, line_clue
+
+
+def reference_descriptors(board):
+    """Straightforward cell-by-cell descriptor calculation to compare against."""
+    def clue(line):
+        runs, count = [], 0
+        for cell in line:
+            if cell:
+                count += 1
+            elif count:
+                runs.append(count)
+                count = 0
+        if count:
+            runs.append(count)
+        return runs or [0]
+    
+    return {
+        "rows": [clue(row) for row in board],
+        "columns": [clue(column) for column in zip(*board)]
+    }
+
+
+class TestDescriptors(unittest.TestCase):
+    """Test cases for the bitwise descriptor engine."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        rng = random.Random(1234)
+        self.boards = [
+            [[rng.random() < density for _ in range(width)] for _ in range(height)]
+            for width, height, density in [(1, 1, 0.5), (5, 7, 0.5), (10, 10, 0.3), (33, 20, 0.7), (64, 65, 0.5)]
+        ]
+    
+    def test_line_clue(self):
+        """Test the clue of a single line."""
+        self.assertEqual(line_clue([]), [0])
+        self.assertEqual(line_clue([False, False]), [0])
+        self.assertEqual(line_clue([True, True, False, True, True, True, False, False, False, True]), [2, 3, 1])
+    
+    def test_matches_reference(self):
+        """Test list-of-lists and packed boards against the reference implementation."""
+        # Exercise both the pure-Python and (when available) the vectorized path
+        for min_cells in (0, float("inf")):
+            with mock.patch.multiple(descriptors, VECTORIZE_MIN_CELLS=min_cells, VECTORIZE_MIN_CELLS_LISTS=min_cells):
+                for board in self.boards:
+                    expected = reference_descriptors(board)
+                    self.assertEqual(calculate_descriptors(board), expected)
+                    self.assertEqual(calculate_descriptors(PackedBoard.from_rows(board)), expected)
+    
+    def test_batch(self):
+        """Test computing descriptors for many boards in one call."""
+        # Several boards share a shape so they are stacked together
+        boards = self.boards + [PackedBoard.from_rows(board) for board in self.boards] + [[]]
+        with mock.patch.object(descriptors, "VECTORIZE_MIN_CELLS", 0):
+            self.assertEqual(
+                calculate_descriptors_batch(boards),
+                [reference_descriptors(board) for board in self.boards] * 2 + [{"rows": [], "columns": []}]
+            )
+        self.assertEqual(calculate_descriptors_batch([]), [])
+    
+    def test_invalid_boards(self):
+        """Test empty and ragged boards."""
+        self.assertEqual(calculate_descriptors([]), {"rows": [], "columns": []})
+        with self.assertRaises(ValueError):
+            calculate_descriptors([[True, False], [True]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from app.core.difficulty import (
+    LEVEL_SPAN, Difficulty, analyze, difficulty_level, from_stats, in_band, level_scores
+)
+from app.core.solver import SolveStats
+
+
+class TestDifficulty(unittest.TestCase):
+    """Test cases for difficulty levels and scores."""
+
+    def test_levels(self):
+        """Test that levels follow the strongest technique a solve needed."""
+        self.assertEqual(difficulty_level(SolveStats(line_solves=10)), "easy")
+        self.assertEqual(difficulty_level(SolveStats(line_solves=10, probes=3)), "medium")
+        self.assertEqual(difficulty_level(SolveStats(probes=3, branches=1)), "hard")
+        self.assertEqual(difficulty_level(SolveStats(line_solves=10), settled=False), "hard")
+        self.assertTrue(in_band("medium", "easy", "hard"))
+        self.assertTrue(in_band("easy", None, "easy"))
+        self.assertFalse(in_band("easy", "medium", None))
+        self.assertFalse(in_band("hard", None, "medium"))
+
+    def test_scores_order_levels(self):
+        """Test that every score of a level ranks below every score of a harder one."""
+        easiest_medium = from_stats(SolveStats(line_solves=10, probes=1), 10)
+        hardest_easy = from_stats(SolveStats(line_solves=10 ** 6), 10)
+        self.assertEqual(hardest_easy.level, "easy")
+        self.assertLess(hardest_easy.score, easiest_medium.score)
+        self.assertEqual(level_scores("medium"), (LEVEL_SPAN, 2 * LEVEL_SPAN - 1))
+
+        shallow = from_stats(SolveStats(branches=4, max_depth=1), 10)
+        deep = from_stats(SolveStats(branches=4, max_depth=3), 10)
+        unsettled = from_stats(SolveStats(branches=1), 10, settled=False)
+        self.assertLess(easiest_medium.score, shallow.score)
+        self.assertLess(shallow.score, deep.score)
+        self.assertEqual(unsettled.score, level_scores("hard")[1])
+        self.assertFalse(unsettled.settled)
+
+    def test_analyze(self):
+        """Test analysing clues, including ones without a solution."""
+        plus = analyze({"rows": [[1], [3], [1]], "columns": [[1], [3], [1]]})
+        self.assertEqual(plus.level, "easy")
+        self.assertGreater(plus.passes, 0)
+        # Two interchangeable diagonals: only guessing tells them apart
+        diagonal = analyze({"rows": [[1], [1]], "columns": [[1], [1]]})
+        self.assertEqual(diagonal.level, "hard")
+        self.assertGreater(diagonal.branches, 0)
+        self.assertGreater(diagonal.score, plus.score)
+        with self.assertRaises(ValueError):
+            analyze({"rows": [[2], [2]], "columns": [[1], [1]]})
+
+    def test_json_round_trip(self):
+        """Test that stored analyses read back and malformed ones are refused."""
+        difficulty = Difficulty(1003, "medium", 4, 3, 0, 0)
+        self.assertEqual(Difficulty.from_json(difficulty.to_json()), difficulty)
+        for invalid in ({"score": 1}, {**difficulty.to_json(), "level": "fiendish"}, {**difficulty.to_json(), "extra": 1}):
+            with self.assertRaises(ValueError):
+                Difficulty.from_json(invalid)
+
+
+if __name__ == "__main__":
+    unittest.main()
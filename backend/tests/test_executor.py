@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import unittest
+
+from app.core.descriptors import calculate_descriptors
+from app.core.executor import CancelFlag, ExecutorSaturated, JobExecutor, JobTimeout
+
+
+class TestJobExecutor(unittest.TestCase):
+    """Test cases for the executor layer."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.release = threading.Event()
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        self.release.set()
+    
+    def test_run_cpu_in_process_pool(self):
+        """Test running a module-level function on the process pool."""
+        executor = JobExecutor(cpu_workers=1)
+        try:
+            result = asyncio.run(executor.run_cpu(calculate_descriptors, [[True, False], [True, True]]))
+        finally:
+            executor.shutdown()
+        self.assertEqual(result, {"rows": [[1], [2]], "columns": [[2], [1]]})
+    
+    def test_run_cpu_without_workers(self):
+        """Test that cpu_workers=0 runs CPU jobs on the thread pool."""
+        executor = JobExecutor(cpu_workers=0)
+        try:
+            name = asyncio.run(executor.run_cpu(lambda: threading.current_thread().name))
+        finally:
+            executor.shutdown()
+        self.assertTrue(name.startswith("nonogram-io"))
+    
+    def test_cancel_flag_reaches_worker_processes(self):
+        """Test that a flag set by the server is seen by a copy in a worker process."""
+        flag = CancelFlag()
+        executor = JobExecutor(cpu_workers=1)
+        try:
+            self.assertFalse(asyncio.run(executor.run_cpu(flag.is_set)))
+            flag.set()
+            self.assertTrue(asyncio.run(executor.run_cpu(flag.is_set)))
+        finally:
+            executor.shutdown()
+        flag.set()
+
+    def test_saturation(self):
+        """Test that jobs beyond max_pending are refused immediately."""
+        executor = JobExecutor(cpu_workers=0, max_pending=1, retry_after=3)
+        
+        async def scenario():
+            blocked = asyncio.ensure_future(executor.run_io(self.release.wait))
+            await asyncio.sleep(0)
+            with self.assertRaises(ExecutorSaturated) as context:
+                await executor.run_io(lambda: None)
+            self.assertEqual(context.exception.retry_after, 3)
+            self.release.set()
+            await blocked
+            # The slot is free again once the job finished
+            self.assertEqual(await executor.run_io(lambda: 42), 42)
+        
+        try:
+            asyncio.run(scenario())
+        finally:
+            executor.shutdown()
+    
+    def test_timeout_keeps_slot_until_job_finishes(self):
+        """Test per-job timeouts and that timed-out jobs still count as pending."""
+        executor = JobExecutor(cpu_workers=0, max_pending=1, timeout=0.05)
+        
+        async def scenario():
+            with self.assertRaises(JobTimeout):
+                await executor.run_io(self.release.wait)
+            with self.assertRaises(ExecutorSaturated):
+                await executor.run_io(lambda: None)
+        
+        try:
+            asyncio.run(scenario())
+        finally:
+            self.release.set()
+            executor.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
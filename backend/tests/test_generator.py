@@ -0,0 +1,59 @@
+import unittest
+
+from app.core import solver
+from app.core.descriptors import calculate_descriptors
+from app.core.generator import GenerateSpec, generate_batch
+
+
+class TestGenerator(unittest.TestCase):
+    """Test cases for random puzzle generation and its filters."""
+
+    def test_batches_are_reproducible(self):
+        """Test that a batch depends only on the seed and its index."""
+        spec = GenerateSpec(width=6, height=4, density=0.5, seed=11, unique=False)
+        first = generate_batch(spec, 3, 5, 100)
+        self.assertEqual(first, generate_batch(spec, 3, 5, 100))
+        self.assertNotEqual(first.puzzles[0].board, generate_batch(spec, 4, 5, 100).puzzles[0].board)
+        self.assertEqual(first.attempts, 5)
+        for puzzle in first.puzzles:
+            self.assertEqual((len(puzzle.board), len(puzzle.board[0])), (4, 6))
+            self.assertEqual(puzzle.descriptors, calculate_descriptors(puzzle.board))
+            self.assertIsNone(puzzle.unique)
+        # Names are attempt numbers, so batches never collide
+        names = {p.name for batch in range(3) for p in generate_batch(spec, batch, 5, 100).puzzles}
+        self.assertEqual(len(names), 15)
+
+    def test_unique_and_difficulty_filters(self):
+        """Test that kept puzzles are unique and within the difficulty band."""
+        spec = GenerateSpec(width=5, height=5, density=0.6, seed=2, unique=True, max_difficulty="medium")
+        result = generate_batch(spec, 0, 10, 400)
+        self.assertEqual(len(result.puzzles), 10)
+        self.assertGreaterEqual(result.attempts, 10)
+        for puzzle in result.puzzles:
+            self.assertTrue(puzzle.unique)
+            self.assertIn(puzzle.difficulty, ("easy", "medium"))
+            self.assertEqual(solver.check_uniqueness(puzzle.board, puzzle.descriptors).status, "unique")
+
+        # The attempt budget bounds a batch whatever the filters keep
+        spec = spec._replace(min_difficulty="hard", max_difficulty="hard", width=3, height=3)
+        result = generate_batch(spec, 0, 10, 50)
+        self.assertEqual(result.attempts, 50)
+        self.assertTrue(all(puzzle.difficulty == "hard" for puzzle in result.puzzles))
+
+    def test_time_limit_and_cancellation(self):
+        """Test that a batch stops early when out of time or cancelled, keeping what it found."""
+        spec = GenerateSpec(width=4, height=4, density=0.5, seed=5, unique=False)
+        self.assertEqual(generate_batch(spec, 0, 10, 100, time_limit=0), ([], 0))
+        self.assertEqual(generate_batch(spec, 0, 10, 100, cancelled=lambda: True), ([], 0))
+
+        checks = []
+        def cancelled():
+            checks.append(None)
+            return len(checks) > 3
+        result = generate_batch(spec, 0, 10, 100, time_limit=60, cancelled=cancelled)
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(result.puzzles, generate_batch(spec, 0, 3, 100).puzzles)
+
+
+if __name__ == "__main__":
+    unittest.main()
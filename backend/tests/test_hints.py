@@ -0,0 +1,86 @@
+import unittest
+from unittest import mock
+
+from app.core import hints
+from app.core.descriptors import calculate_descriptors
+from app.core.hints import next_hint
+
+# Unique, but line solving alone stalls on it: it takes probing
+PROBING_BOARD = [
+    [False, True, False, False, False],
+    [False, True, False, False, False],
+    [True, False, False, True, False],
+    [False, True, True, False, False],
+    [False, False, False, True, False]
+]
+
+
+class TestHints(unittest.TestCase):
+    """Test cases for the hint engine."""
+
+    def play(self, board):
+        """Apply hints from an empty grid until none is given; returns the grid and techniques used."""
+        descriptors = calculate_descriptors(board)
+        grid = [[None] * len(board[0]) for _ in board]
+        techniques = []
+        while True:
+            hint = next_hint(descriptors, grid)
+            if hint.status != "hint":
+                return grid, techniques, hint
+            techniques.append(hint.technique)
+            self.assertTrue(hint.cells)
+            for r, c, filled in hint.cells:
+                self.assertIsNone(grid[r][c])
+                # Every hinted cell agrees with the unique solution
+                self.assertEqual(filled, board[r][c])
+                grid[r][c] = filled
+
+    def test_line_hint_picks_the_easiest_line(self):
+        """Test that the forcing line with the fewest unknown cells is chosen."""
+        descriptors = {"rows": [[3], [1]], "columns": [[1], [2], [1]]}
+        hint = next_hint(descriptors, [[None, None, None], [False, None, False]])
+        self.assertEqual((hint.status, hint.technique, hint.line), ("hint", "line", 1))
+        self.assertEqual(hint.cells, [(1, 1, True)])
+        # The middle column (line 3) has two cells to the top row's three
+        hint = next_hint(descriptors)
+        self.assertEqual((hint.technique, hint.line), ("line", 3))
+        self.assertEqual(hint.cells, [(0, 1, True), (1, 1, True)])
+
+    def test_hints_solve_the_puzzle(self):
+        """Test that following hints, including probes, reaches the solution."""
+        grid, techniques, hint = self.play(PROBING_BOARD)
+        self.assertEqual(hint.status, "solved")
+        self.assertEqual(grid, PROBING_BOARD)
+        self.assertIn("probe", techniques)
+        self.assertEqual(techniques[0], "line")
+
+    def test_probe_hint(self):
+        """Test that a probe names the failing assumption and the line it breaks."""
+        descriptors = calculate_descriptors(PROBING_BOARD)
+        with mock.patch.object(hints, "line_hint", return_value=None):
+            hint = next_hint(descriptors)
+        self.assertEqual(hint.technique, "probe")
+        r, c, filled = hint.probe
+        self.assertEqual(hint.cells, [(r, c, not filled)])
+        self.assertIsNotNone(hint.line)
+        self.assertGreater(hint.stats.probes, 0)
+
+        with mock.patch.object(hints, "line_hint", return_value=None):
+            self.assertEqual(next_hint(descriptors, probe=False).status, "stuck")
+
+    def test_contradiction_and_ambiguity(self):
+        """Test contradicted grids, several solutions and malformed input."""
+        descriptors = {"rows": [[2], [0]], "columns": [[1], [1]]}
+        hint = next_hint(descriptors, [[True, None], [True, None]])
+        self.assertEqual((hint.status, hint.line), ("contradiction", 1))
+        self.assertEqual(next_hint(descriptors, [[True, True], [False, False]]).status, "solved")
+        # Two diagonals: no deduction exists
+        self.assertEqual(next_hint({"rows": [[1], [1]], "columns": [[1], [1]]}).status, "stuck")
+        with self.assertRaises(ValueError):
+            next_hint(descriptors, [[True]])
+        with self.assertRaises(ValueError):
+            next_hint({"rows": [[3]], "columns": [[1], [1]]})
+
+
+if __name__ == "__main__":
+    unittest.main()
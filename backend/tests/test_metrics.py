@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.metrics import MetricsMiddleware
+from app.core import metrics
+from app.core.crud import NonogramDataManager
+from app.core.metrics import MetricsRegistry
+from app.core.reload import ManualReloadStrategy
+from main import app
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for metric recording and the Prometheus text format."""
+
+    def test_render(self):
+        """Test counters, gauges and cumulative histogram buckets."""
+        registry = MetricsRegistry(enabled=True)
+        requests = registry.counter("requests_total", "Requests", ("route",))
+        size = registry.gauge("size", "Size", function=lambda: 3)
+        latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        requests.inc('/a "b"')
+        requests.inc('/a "b"', amount=2)
+        latency.observe(0.05)
+        latency.observe(0.1)
+        latency.observe(5)
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE requests_total counter", lines)
+        self.assertIn('requests_total{route="/a \\"b\\""} 3', lines)
+        self.assertIn("size 3", lines)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{le="1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn("latency_seconds_count 3", lines)
+        self.assertIn("latency_seconds_sum 5.15", lines)
+        self.assertEqual(size.value(), 3)
+
+    def test_disabled_registry_records_nothing(self):
+        """Test that recording is a no-op while metrics are disabled."""
+        registry = MetricsRegistry(enabled=False)
+        counter = registry.counter("jobs_total", "Jobs")
+        histogram = registry.histogram("latency_seconds", "Latency")
+        counter.inc()
+        histogram.observe(1.0)
+        self.assertEqual(counter.value(), 0)
+        self.assertEqual(histogram.count(), 0)
+        with self.assertRaises(ValueError):
+            registry.counter("jobs_total", "Jobs")
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    """Test cases for the request middleware and the /metrics endpoint."""
+
+    def setUp(self):
+        """Enable the shared registry for the duration of a test."""
+        patcher = mock.patch.object(metrics.registry, "enabled", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_middleware_labels_routes_by_template(self):
+        """Test latency, status and size recorded per route template."""
+        router = APIRouter()
+
+        @router.get("/items/{item}")
+        async def get_item(item: str):
+            return {"item": item}
+
+        test_app = FastAPI()
+        test_app.add_middleware(MetricsMiddleware)
+        test_app.include_router(router, prefix="/api")
+        client = TestClient(test_app)
+
+        before = metrics.http_request_duration.count("GET", "/api/items/{item}", "200")
+        client.get("/api/items/a")
+        client.get("/api/items/b")
+        client.get("/missing")
+        self.assertEqual(metrics.http_request_duration.count("GET", "/api/items/{item}", "200"), before + 2)
+        self.assertGreaterEqual(metrics.http_request_duration.count("GET", "unmatched", "404"), 1)
+        self.assertGreaterEqual(metrics.http_response_size.count("GET", "/api/items/{item}"), 2)
+        self.assertEqual(metrics.http_requests_in_flight.value(), 0)
+
+    def test_metrics_endpoint_and_reload_counters(self):
+        """Test that manager reloads and cache lookups show up on /metrics."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "nonograms.json")
+        with open(path, 'w') as f:
+            json.dump({"dot": {"board": [[True]], "descriptors": {"rows": [[1]], "columns": [[1]]}}}, f)
+
+        reloads = metrics.reloads.value("full")
+        misses = metrics.cache_lookups.value("search", "miss")
+        hits = metrics.cache_lookups.value("search", "hit")
+        manager = NonogramDataManager(path, reload_strategy=ManualReloadStrategy())
+        self.addCleanup(manager.close)
+        manager.get_search_response("1")
+        manager.get_search_response("1")
+        self.assertEqual(metrics.reloads.value("full"), reloads + 1)
+        self.assertEqual(metrics.cache_lookups.value("search", "miss"), misses + 1)
+        self.assertEqual(metrics.cache_lookups.value("search", "hit"), hits + 1)
+
+        response = TestClient(app).get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn("# TYPE nonogram_reloads_total counter", response.text)
+        self.assertIn("nonogram_catalogue_puzzles ", response.text)
+
+        with mock.patch.object(metrics.registry, "enabled", False):
+            self.assertEqual(TestClient(app).get("/metrics").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import random
+import unittest
+
+from app.core.descriptors import calculate_descriptors
+from app.core.play import CheckSessions, PlayState, UnknownBoardError, mask_clue
+
+
+def random_board(width, height, seed):
+    rng = random.Random(seed)
+    return [[rng.random() < 0.5 for _ in range(width)] for _ in range(height)]
+
+
+class TestPlayState(unittest.TestCase):
+    """Test cases for incremental checking of boards in play."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.solution = random_board(7, 5, seed=3)
+        self.descriptors = calculate_descriptors(self.solution)
+
+    def test_mask_clue(self):
+        """Test that line clues of bitmasks match calculate_descriptors."""
+        self.assertEqual(mask_clue(0b0110111, 7), [3, 2])
+        self.assertEqual(mask_clue(0, 4), [0])
+        self.assertEqual(mask_clue(0b1111, 4), [4])
+
+    def test_incremental_matches_full_check(self):
+        """Test that statuses and hashes after deltas match a board checked in full."""
+        rng = random.Random(4)
+        state = PlayState("p", self.descriptors)
+        board = [[False] * 7 for _ in range(5)]
+        for _ in range(200):
+            changes = [(rng.randrange(5), rng.randrange(7), rng.random() < 0.5) for _ in range(rng.randint(1, 3))]
+            touched = state.apply(changes)
+            for r, c, filled in changes:
+                board[r][c] = filled
+            full = PlayState("p", self.descriptors, board)
+            self.assertEqual(state.status, full.status)
+            self.assertEqual(state.counts, full.counts)
+            self.assertEqual(state.hash, full.hash)
+            # Only lines through changed cells are examined
+            self.assertTrue(set(touched) <= {r for r, _, _ in changes} | {5 + c for _, c, _ in changes})
+
+    def test_statuses_and_completion(self):
+        """Test satisfied, contradicted and open lines up to completion."""
+        state = PlayState("p", {"rows": [[2], [0]], "columns": [[1], [1], [0]]})
+        self.assertEqual(state.status, ["open", "satisfied", "open", "open", "satisfied"])
+        state.apply([(1, 0, True)])
+        self.assertEqual(state.status, ["open", "contradicted", "satisfied", "open", "satisfied"])
+        state.apply([(1, 0, False), (0, 0, True), (0, 1, True)])
+        self.assertTrue(state.complete)
+        self.assertEqual(state.counts["satisfied"], 5)
+        # Setting a cell to its current value touches nothing
+        self.assertEqual(state.apply([(0, 0, True)]), [])
+        with self.assertRaises(ValueError):
+            state.apply([(0, 2, True), (2, 0, True)])
+        self.assertEqual(state.rows, [0b011, 0])
+        with self.assertRaises(ValueError):
+            PlayState("p", self.descriptors, [[True]])
+
+    def test_sessions(self):
+        """Test that boards are held per session token, checked by hash and evicted in LRU order."""
+        sessions = CheckSessions(max_sessions=2)
+        first = PlayState("a", self.descriptors)
+        second = PlayState("a", self.descriptors)
+        sessions.put(first)
+        sessions.put(second)
+        # Identical boards of one puzzle are separate sessions
+        self.assertEqual(first.board_hash, second.board_hash)
+        self.assertNotEqual(first.session, second.session)
+        self.assertIs(sessions.take("a", first.session, first.board_hash), first)
+        with self.assertRaises(UnknownBoardError):
+            sessions.take("a", first.session)
+        with self.assertRaises(UnknownBoardError):
+            sessions.take("b", second.session)
+        # A board at another hash stays held for a check that is in sync
+        with self.assertRaises(UnknownBoardError):
+            sessions.take("a", second.session, "00000000000000ff")
+        self.assertIs(sessions.take("a", second.session, second.board_hash.upper()), second)
+
+        states = [PlayState(name, self.descriptors) for name in "abc"]
+        for state in states:
+            sessions.put(state)
+        self.assertEqual(len(sessions), 2)
+        with self.assertRaises(UnknownBoardError):
+            sessions.take("a", states[0].session)
+        self.assertIs(sessions.take("c", states[2].session), states[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import random
+import unittest
+
+from app.core.descriptors import calculate_descriptors
+from app.core.index import ClueIndex, CluePattern
+from app.core.query import RangeTerm, parse_pattern, parse_query, run_query
+
+
+def random_catalogue(count, seed):
+    """Descriptors of random boards of a few sizes."""
+    rng = random.Random(seed)
+    catalogue = {}
+    for i in range(count):
+        width, height = rng.choice([(3, 3), (4, 5), (5, 5), (6, 4)])
+        board = [[rng.random() < 0.5 for _ in range(width)] for _ in range(height)]
+        catalogue[f"puzzle-{i}"] = calculate_descriptors(board)
+    return catalogue
+
+
+def reference_search(catalogue, query):
+    """Check every term against every puzzle."""
+    query = parse_query(query)
+    matches = []
+    for name, clues in catalogue.items():
+        rows = [tuple(clue) for clue in clues["rows"]]
+        columns = [tuple(clue) for clue in clues["columns"]]
+        values = {
+            "width": len(columns),
+            "height": len(rows),
+            "filled": sum(map(sum, rows))
+        }
+        if not all(
+            any(term.pattern.matches(clue) for clue in (rows if term.rows else []) + (columns if term.columns else []))
+            for term in query.clues
+        ):
+            continue
+        if not all(
+            (term.low is None or values[term.attribute] >= term.low) and
+            (term.high is None or values[term.attribute] <= term.high)
+            for term in query.ranges
+        ):
+            continue
+        matches.append(name)
+    return matches
+
+
+QUERIES = [
+    "row:1,1", "col:2,*", "any:*,1", "row:*,1,1,*", "*2*", "col:*,1,2,*", "row:*,2,1",
+    "size:5x5", "size:*x4", "width:4..5 height:<5", "filled:>=15", "filled:..3",
+    "row:1,* size:5x5", "any:*,1,1,* col:3,* filled:8..12", "row:0 col:0", "any:*", "height:3 height:>3"
+]
+
+
+class TestQueryParser(unittest.TestCase):
+    """Test cases for parsing search queries."""
+
+    def test_parse_pattern(self):
+        """Test the exact, prefix, suffix and contains forms."""
+        self.assertEqual(parse_pattern("3,1"), CluePattern((3, 1), True, True))
+        self.assertEqual(parse_pattern("5,*"), CluePattern((5,), True, False))
+        self.assertEqual(parse_pattern("*,1"), CluePattern((1,), False, True))
+        self.assertEqual(parse_pattern("*,3,1,*"), CluePattern((3, 1), False, False))
+        self.assertEqual(parse_pattern("*3,1*"), CluePattern((3, 1), False, False))
+        self.assertEqual(parse_pattern("*"), CluePattern((), False, False))
+        for invalid in ("", "3,,1", "a", "3;1"):
+            with self.assertRaises(ValueError):
+                parse_pattern(invalid)
+
+    def test_parse_query(self):
+        """Test terms, sizes and merged ranges."""
+        query = parse_query("row:3,1 col:5,* size:15x10..12 width:<20 filled:>40")
+        self.assertEqual(len(query.clues), 2)
+        self.assertEqual(query.ranges, (
+            RangeTerm("width", 15, 15), RangeTerm("height", 10, 12), RangeTerm("filled", 41, None)
+        ))
+        self.assertEqual(parse_query("3,1").clues, parse_query("any:3,1").clues)
+        for invalid in ("", "colour:red", "size:15", "width:big", "row:x"):
+            with self.assertRaises(ValueError):
+                parse_query(invalid)
+
+    def test_parse_difficulty(self):
+        """Test difficulty levels, level ranges and score ranges."""
+        self.assertEqual(parse_query("difficulty:easy").ranges, (RangeTerm("difficulty", 0, 999),))
+        self.assertEqual(parse_query("difficulty:Easy..medium").ranges, (RangeTerm("difficulty", 0, 1999),))
+        self.assertEqual(parse_query("difficulty:medium..").ranges, (RangeTerm("difficulty", 1000, None),))
+        self.assertEqual(parse_query("difficulty:>easy").ranges, (RangeTerm("difficulty", 1000, None),))
+        self.assertEqual(parse_query("difficulty:<hard").ranges, (RangeTerm("difficulty", None, 1999),))
+        self.assertEqual(parse_query("difficulty:1500..2500").ranges, (RangeTerm("difficulty", 1500, 2500),))
+        for invalid in ("difficulty:fiendish", "difficulty:easy..fiendish", "difficulty:>=x"):
+            with self.assertRaises(ValueError):
+                parse_query(invalid)
+
+
+class TestQuerySearch(unittest.TestCase):
+    """Test cases for running queries against the clue index."""
+
+    def test_matches_reference(self):
+        """Test that indexed queries match a scan of every puzzle."""
+        catalogue = random_catalogue(300, seed=5)
+        index = ClueIndex(catalogue)
+        for query in QUERIES:
+            with self.subTest(query=query):
+                self.assertEqual(run_query(index, parse_query(query)), reference_search(catalogue, query))
+
+    def test_incremental_index_matches_rebuild(self):
+        """Test that an index updated with changes answers like a rebuilt one."""
+        catalogue = random_catalogue(200, seed=6)
+        index = ClueIndex(catalogue)
+        replacements = random_catalogue(40, seed=7)
+
+        updated = dict(catalogue)
+        removed = {}
+        for i in range(0, 200, 5):
+            removed[f"puzzle-{i}"] = updated.pop(f"puzzle-{i}")
+        added = {}
+        for i, clues in enumerate(replacements.values()):
+            name = f"puzzle-{i * 3}" if i % 2 else f"new-{i}"
+            if name in catalogue and name not in removed:
+                removed[name] = catalogue[name]
+            added[name] = clues
+        updated.update(added)
+
+        changed = index.with_changes(removed, added)
+        rebuilt = ClueIndex(updated)
+        for query in QUERIES:
+            with self.subTest(query=query):
+                self.assertEqual(
+                    sorted(run_query(changed, parse_query(query))),
+                    sorted(run_query(rebuilt, parse_query(query)))
+                )
+        # The original index is left untouched
+        self.assertEqual(run_query(index, parse_query("row:1,1")), reference_search(catalogue, "row:1,1"))
+
+    def test_difficulty_terms_and_order(self):
+        """Test filtering and sorting by difficulty score, with unanalysed puzzles left out."""
+        catalogue = random_catalogue(100, seed=8)
+        scores = {name: (i * 37) % 3000 if i % 10 else None for i, name in enumerate(catalogue)}
+        index = ClueIndex(catalogue, scores)
+        for query, low, high in (("difficulty:medium", 1000, 1999), ("difficulty:>=hard", 2000, 2999),
+                                 ("difficulty:0..2999", 0, 2999)):
+            with self.subTest(query=query):
+                expected = [name for name, score in scores.items() if score is not None and low <= score <= high]
+                self.assertEqual(run_query(index, parse_query(query)), expected)
+
+        ordered = index.in_attribute_order(list(reversed(catalogue)), "difficulty")
+        known = [name for name in ordered if scores[name] is not None]
+        self.assertEqual([scores[name] for name in known], sorted(scores[name] for name in known))
+        # Unanalysed puzzles come last, in catalogue order
+        self.assertEqual(ordered[len(known):], [name for name in catalogue if scores[name] is None])
+
+        rescored = index.with_changes({"puzzle-0": catalogue["puzzle-0"]}, {"puzzle-0": catalogue["puzzle-0"]}, {"puzzle-0": 1500})
+        self.assertIn("puzzle-0", run_query(rescored, parse_query("difficulty:medium")))
+        self.assertNotIn("puzzle-0", run_query(index, parse_query("difficulty:medium")))
+
+
+if __name__ == "__main__":
+    unittest.main()
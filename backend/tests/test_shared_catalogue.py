@@ -0,0 +1,199 @@
+import json
+import os
+import tempfile
+import unittest
+
+from app.core.bitboard import PackedBoard
+from app.core.catalogue_file import FORMAT_VERSION, CatalogueFile, CatalogueFileError, write_catalogue_file
+from app.core.crud import NonogramDataManager
+from app.core.descriptors import calculate_descriptors
+from app.core.difficulty import Difficulty
+from app.core.reload import ManualReloadStrategy
+from app.core.shared_catalogue import SharedCatalogueStore, _FileLock, fcntl
+from app.core.snapshot import CatalogueEntry
+from app.core.storage import JsonFileStore, StoreError
+
+PLUS = [[False, True, False], [True, True, True], [False, True, False]]
+BAR = [[True, True, True, True]]
+
+
+def make_entry(board, difficulty=None):
+    """Catalogue entry for a list-of-lists board."""
+    return CatalogueEntry(PackedBoard.from_rows(board), calculate_descriptors(board), difficulty=difficulty)
+
+
+class TestCatalogueFile(unittest.TestCase):
+    """Test cases for compiled catalogue files."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "catalogue.bin")
+
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """Test that boards, clues, names and difficulties read back as written."""
+        difficulty = Difficulty(1003, "medium", 4, 3, 0, 0, True)
+        entries = {
+            "plus": make_entry(PLUS, difficulty),
+            "bär": make_entry(BAR),
+            "empty": CatalogueEntry(PackedBoard.from_rows([]), {"rows": [], "columns": []}),
+            # Clues that do not match the board are kept as they are
+            "odd": CatalogueEntry(PackedBoard.from_rows(BAR), {"rows": [[2], [1]], "columns": [[]]}),
+        }
+        write_catalogue_file(self.path, entries, "ab" * 32)
+
+        catalogue = CatalogueFile(self.path)
+        self.assertEqual(catalogue.version, FORMAT_VERSION)
+        self.assertEqual(catalogue.digest, "ab" * 32)
+        loaded = catalogue.entries()
+        self.assertEqual(list(loaded), list(entries))
+        for name, entry in entries.items():
+            self.assertEqual(loaded[name].descriptors, entry.descriptors)
+            self.assertEqual((loaded[name].width, loaded[name].height), (entry.width, entry.height))
+            self.assertEqual(loaded[name].board, entry.board)
+        self.assertEqual(loaded["plus"].difficulty, difficulty)
+        self.assertIsNone(loaded["bär"].difficulty)
+
+    def test_rejects_other_files(self):
+        """Test that foreign, truncated and newer files are refused."""
+        write_catalogue_file(self.path, {"plus": make_entry(PLUS)}, "00" * 32)
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        for content in (b"", b"{}", data[:-2], b"NONOCAT\0" + (FORMAT_VERSION + 1).to_bytes(4, "little") + data[12:]):
+            with open(self.path, "wb") as f:
+                f.write(content)
+            with self.assertRaises(CatalogueFileError):
+                CatalogueFile(self.path)
+
+    def test_mapping_outlives_file(self):
+        """Test that entries still load their boards after the file was removed."""
+        write_catalogue_file(self.path, {"plus": make_entry(PLUS)}, "00" * 32)
+        entries = CatalogueFile(self.path).entries()
+        os.unlink(self.path)
+        self.assertEqual(entries["plus"].board.to_rows(), PLUS)
+
+
+class TestSharedCatalogueStore(unittest.TestCase):
+    """Test cases for the catalogue shared between worker processes."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.json_path = os.path.join(self.directory.name, "nonograms.json")
+        self.shared = os.path.join(self.directory.name, "shared")
+        self.write_source({"plus": PLUS})
+
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.directory.cleanup()
+
+    def write_source(self, boards):
+        """Write the source JSON file and give it a new modification time."""
+        with open(self.json_path, "w") as f:
+            json.dump({name: {"board": board, "descriptors": calculate_descriptors(board)}
+                       for name, board in boards.items()}, f)
+        stat = os.stat(self.json_path)
+        os.utime(self.json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def make_store(self):
+        """A worker's view of the shared directory."""
+        store = SharedCatalogueStore(self.shared, JsonFileStore(self.json_path), analyze_difficulty=True)
+        self.addCleanup(store.close)
+        return store
+
+    def test_first_load_publishes_once(self):
+        """Test that the first worker publishes and the next one attaches."""
+        first, second = self.make_store(), self.make_store()
+        self.assertIsNone(first.fingerprint())
+
+        contents = first.load()
+        self.assertEqual(contents.fingerprint, (1, 0))
+        self.assertEqual(second.fingerprint(), (1, 0))
+        attached = second.load()
+        self.assertEqual(attached.fingerprint, (1, 0))
+        self.assertEqual(attached.digest, contents.digest)
+        self.assertEqual(attached.entries["plus"].board.to_rows(), PLUS)
+        # Analysed by the loader, so workers have nothing left to analyse
+        self.assertEqual(attached.entries["plus"].difficulty.level, "easy")
+
+        self.assertEqual(first.publish(), 1)
+
+    def test_republish_on_change(self):
+        """Test that a changed source becomes a new generation and old ones are pruned."""
+        loader, worker = self.make_store(), self.make_store()
+        self.assertEqual(loader.publish(), 1)
+        first = worker.load()
+
+        for generation in (2, 3):
+            self.write_source({"plus": PLUS, f"bar{generation}": BAR})
+            self.assertEqual(loader.publish(), generation)
+            self.assertEqual(worker.fingerprint(), (generation, 0))
+        self.assertEqual(sorted(os.listdir(self.shared)),
+                         ["catalogue-2.bin", "catalogue-3.bin", "generation", "lock", "published.json"])
+
+        self.assertEqual(sorted(worker.load().entries), ["bar3", "plus"])
+        # Entries of a removed generation keep reading from their mapping
+        self.assertEqual(first.entries["plus"].board.to_rows(), PLUS)
+
+    def test_manager_switches_generation(self):
+        """Test that a data manager picks up a new generation on refresh."""
+        loader = self.make_store()
+        loader.publish()
+        manager = NonogramDataManager(store=self.make_store(), reload_strategy=ManualReloadStrategy())
+        self.addCleanup(manager.close)
+        self.assertEqual(manager.get_all_names(), ["plus"])
+        self.assertFalse(manager.refresh())
+
+        self.write_source({"plus": PLUS, "bar": BAR})
+        loader.publish()
+        self.assertTrue(manager.refresh())
+        self.assertEqual(manager.get_all_names(), ["plus", "bar"])
+        self.assertEqual(manager.get_by_name("bar").board, BAR)
+        self.assertTrue(manager.read_only)
+
+    def test_corrupt_generation(self):
+        """Test that an unreadable catalogue file is a store error."""
+        loader = self.make_store()
+        loader.publish()
+        with open(loader.catalogue_path(1), "wb") as f:
+            f.write(b"garbage")
+        with self.assertRaises(StoreError):
+            self.make_store().load()
+
+    @unittest.skipUnless(hasattr(os, "fork") and fcntl is not None, "needs fork and flock")
+    def test_fork_while_locked(self):
+        """Test that a worker forked while the publish lock is held does not keep it locked."""
+        os.makedirs(self.shared)
+        lock_path = os.path.join(self.shared, "lock")
+        ready_read, ready_write = os.pipe()
+        exit_read, exit_write = os.pipe()
+        with _FileLock(lock_path):
+            pid = os.fork()
+            if pid == 0:
+                # The worker lives on, with whatever it inherited, until told to exit
+                os.write(ready_write, b"r")
+                os.read(exit_read, 1)
+                os._exit(0)
+        try:
+            os.read(ready_read, 1)
+            fd = os.open(lock_path, os.O_RDWR)
+            try:
+                # Raises BlockingIOError if the worker's copy of the descriptor still holds the lock
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            finally:
+                os.close(fd)
+            self.assertEqual(self.make_store().publish(), 1)
+        finally:
+            os.write(exit_write, b"x")
+            os.waitpid(pid, 0)
+            for fd in (ready_read, ready_write, exit_read, exit_write):
+                os.close(fd)
+
+
+if __name__ == '__main__':
+    unittest.main()
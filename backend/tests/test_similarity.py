@@ -0,0 +1,102 @@
+import random
+import unittest
+
+from app.core.bitboard import PackedBoard
+from app.core.descriptors import calculate_descriptors
+from app.core.similarity import EXACT_SCAN_SIZE, SimilarityIndex, board_distance
+
+
+def random_board(rng, width, height, density=0.5):
+    """Random list-of-lists board."""
+    return [[rng.random() < density for _ in range(width)] for _ in range(height)]
+
+
+def flip(board, cells):
+    """Copy of a board with the given (row, column) cells flipped."""
+    flipped = [list(row) for row in board]
+    for r, c in cells:
+        flipped[r][c] = not flipped[r][c]
+    return flipped
+
+
+def entries_for(boards):
+    """Similarity index entries for named list-of-lists boards."""
+    return {name: (PackedBoard.from_rows(board), calculate_descriptors(board)) for name, board in boards.items()}
+
+
+class TestSimilarityIndex(unittest.TestCase):
+    """Test cases for board and clue similarity search."""
+
+    def setUp(self):
+        """Set up a size group large enough to be probed through the LSH tables."""
+        rng = random.Random(3)
+        self.boards = {f"p{i}": random_board(rng, 10, 10) for i in range(EXACT_SCAN_SIZE + 200)}
+        self.boards.update({f"small{i}": random_board(rng, 5, 5) for i in range(20)})
+        self.index = SimilarityIndex(entries_for(self.boards))
+
+    def test_nearest_in_small_group_is_exact(self):
+        """Test that small groups return the true nearest boards."""
+        query = self.boards["small3"]
+        packed = PackedBoard.from_rows(query)
+        expected = sorted(
+            (board_distance(int.from_bytes(packed.bits, "big"), int.from_bytes(PackedBoard.from_rows(board).bits, "big")), name)
+            for name, board in self.boards.items() if name.startswith("small") and name != "small3"
+        )[:3]
+        found = self.index.nearest(packed, calculate_descriptors(query), k=3, exclude="small3")
+        self.assertEqual([(n.distance, n.name) for n in found], expected)
+
+    def test_near_boards_found_through_tables(self):
+        """Test that boards a few cells apart are found in a large group."""
+        query = flip(self.boards["p42"], [(0, 0), (5, 7)])
+        found = self.index.nearest(PackedBoard.from_rows(query), calculate_descriptors(query), k=1)
+        self.assertEqual(found[0].name, "p42")
+        self.assertEqual(found[0].distance, 2)
+        # Other sizes are never compared
+        self.assertEqual(self.index.nearest(PackedBoard.from_rows([[True] * 7] * 7), {"rows": [], "columns": []}), [])
+
+    def test_find_duplicate(self):
+        """Test exact, near and same-clue duplicates."""
+        board = self.boards["p7"]
+        duplicate = self.index.find_duplicate(PackedBoard.from_rows(board), calculate_descriptors(board))
+        self.assertEqual(duplicate[0].name, "p7")
+        self.assertIsNone(self.index.find_duplicate(PackedBoard.from_rows(board), calculate_descriptors(board), exclude="p7"))
+
+        near = flip(board, [(9, 9)])
+        self.assertIsNone(self.index.find_duplicate(PackedBoard.from_rows(near), calculate_descriptors(near)))
+        match, metric = self.index.find_duplicate(PackedBoard.from_rows(near), calculate_descriptors(near), max_distance=2)
+        self.assertEqual((match.name, match.distance, metric), ("p7", 1, "board"))
+
+        # Swapping a 2x2 checkerboard keeps every clue but changes four cells
+        swapped = {
+            "a": [[True, False, False], [False, True, False], [False, False, False]],
+            "b": [[False, True, False], [True, False, False], [False, False, False]]
+        }
+        index = SimilarityIndex(entries_for({"a": swapped["a"]}))
+        match, metric = index.find_duplicate(PackedBoard.from_rows(swapped["b"]), calculate_descriptors(swapped["b"]))
+        self.assertEqual((match.name, metric), ("a", "clues"))
+
+    def test_with_changes(self):
+        """Test that an updated index answers like a rebuilt one and the old one is untouched."""
+        rng = random.Random(4)
+        added = {"p1": random_board(rng, 10, 10), "new": random_board(rng, 10, 10), "tiny": [[True]]}
+        changed = self.index.with_changes(["p2", "small1"], entries_for(added))
+        boards = dict(self.boards)
+        del boards["p2"], boards["small1"]
+        boards.update(added)
+        rebuilt = SimilarityIndex(entries_for(boards))
+
+        self.assertEqual(len(changed), len(rebuilt))
+        for name in ("p1", "new", "p3", "small2", "tiny"):
+            packed, descriptors = entries_for({name: boards[name]})[name]
+            for metric in ("board", "clues"):
+                self.assertEqual(
+                    changed.nearest(packed, descriptors, k=3, metric=metric),
+                    rebuilt.nearest(packed, descriptors, k=3, metric=metric)
+                )
+        original = self.boards["p2"]
+        self.assertEqual(self.index.find_duplicate(PackedBoard.from_rows(original), calculate_descriptors(original))[0].name, "p2")
+        self.assertIsNone(changed.find_duplicate(PackedBoard.from_rows(original), calculate_descriptors(original)))
+
+
+if __name__ == "__main__":
+    unittest.main()
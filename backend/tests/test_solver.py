@@ -0,0 +1,160 @@
+import itertools
+import random
+import unittest
+from unittest import mock
+
+from app.core.descriptors import calculate_descriptors
+from app.core.solver import NonogramSolver, check_uniqueness, normalize_clue, solve, solve_line
+
+
+def brute_force_line(clue, length, filled, empty):
+    """Intersect every full line matching the clue and the known cells."""
+    always_filled, always_empty, found = (1 << length) - 1, (1 << length) - 1, False
+    for cells in itertools.product((0, 1), repeat=length):
+        mask = sum(bit << i for i, bit in enumerate(cells))
+        if mask & empty or ~mask & filled:
+            continue
+        runs = tuple(len(list(group)) for value, group in itertools.groupby(cells) if value)
+        if runs != clue:
+            continue
+        found = True
+        always_filled &= mask
+        always_empty &= ~mask
+    if not found:
+        return None
+    return always_filled, always_empty & ((1 << length) - 1)
+
+
+class TestSolver(unittest.TestCase):
+    """Test cases for the line solver and the grid solver."""
+    
+    def test_solve_line_matches_brute_force(self):
+        """Test line solving against enumerating every line."""
+        rng = random.Random(7)
+        for _ in range(2000):
+            length = rng.randint(1, 10)
+            line = [rng.random() < 0.5 for _ in range(length)]
+            clue = normalize_clue(calculate_descriptors([line])["rows"][0])
+            if rng.random() < 0.2:
+                clue = clue + (1,)
+            known = [i for i in range(length) if rng.random() < 0.3]
+            filled = sum(1 << i for i in known if line[i] or rng.random() < 0.1)
+            empty = sum(1 << i for i in known if not filled >> i & 1)
+            self.assertEqual(solve_line(clue, length, filled, empty), brute_force_line(clue, length, filled, empty))
+    
+    def test_solve_line_overlap(self):
+        """Test the classic overlap deduction on an empty line."""
+        filled, empty = solve_line((4,), 5, 0, 0)
+        self.assertEqual(filled, 0b01110)
+        self.assertEqual(empty, 0)
+        self.assertEqual(solve_line((), 3, 0, 0), (0, 0b111))
+    
+    def test_unique_solution(self):
+        """Test solving a puzzle with a single solution."""
+        board = [
+            [True, True, False],
+            [False, True, False],
+            [True, True, True]
+        ]
+        result = solve(calculate_descriptors(board), max_solutions=2)
+        self.assertEqual(result.status, "solved")
+        self.assertEqual(result.solutions, [board])
+        self.assertTrue(result.unique)
+    
+    def test_multiple_solutions(self):
+        """Test a puzzle whose clues fit more than one board."""
+        descriptors = {"rows": [[1], [1]], "columns": [[1], [1]]}
+        result = solve(descriptors, max_solutions=2)
+        self.assertEqual(result.status, "solved")
+        self.assertEqual(len(result.solutions), 2)
+        self.assertFalse(result.unique)
+        self.assertIsNone(solve(descriptors).unique)
+    
+    def test_unsolvable(self):
+        """Test clues that no board satisfies."""
+        result = solve({"rows": [[2], [0]], "columns": [[1], [0]]})
+        self.assertEqual(result.status, "unsolvable")
+        self.assertEqual(result.solutions, [])
+        self.assertFalse(result.unique)
+    
+    def test_invalid_clues(self):
+        """Test clues that cannot fit the grid."""
+        with self.assertRaises(ValueError):
+            NonogramSolver({"rows": [[2, 2]], "columns": [[1], [1], [1]]})
+        # Jobs reach the solver without request validation: malformed clues are ValueErrors too
+        for descriptors in ({"rows": 5, "columns": [[1]]}, {"rows": [["a"]], "columns": [[1]]},
+                            {"rows": [[1.5]], "columns": [[1]]}, {"rows": [1], "columns": [[1]]}, [[1]]):
+            with self.assertRaises(ValueError):
+                NonogramSolver(descriptors)
+    
+    def test_random_boards(self):
+        """Test that solutions of random boards reproduce their clues."""
+        rng = random.Random(99)
+        for size in (5, 10, 15):
+            board = [[rng.random() < 0.6 for _ in range(size)] for _ in range(size)]
+            descriptors = calculate_descriptors(board)
+            result = solve(descriptors)
+            self.assertEqual(result.status, "solved")
+            self.assertEqual(calculate_descriptors(result.solutions[0]), descriptors)
+    
+    def test_node_limit(self):
+        """Test that an exhausted budget is reported as a limit."""
+        # Every permutation matrix fits these clues, so there are 720 solutions
+        descriptors = {"rows": [[1]] * 6, "columns": [[1]] * 6}
+        result = solve(descriptors, max_solutions=1000, node_limit=5)
+        self.assertEqual(result.status, "limit")
+        self.assertFalse(result.unique)
+        self.assertLessEqual(result.stats.nodes, 6)
+
+    
+    def test_check_uniqueness(self):
+        """Test the uniqueness report for unique, ambiguous and over-budget boards."""
+        board = [
+            [True, True, False],
+            [False, True, False],
+            [True, True, True]
+        ]
+        self.assertEqual(check_uniqueness(board).status, "unique")
+        
+        # The first two rows can trade their cells in columns 0 and 1
+        board = [
+            [True, False, False, True],
+            [False, True, False, True],
+            [False, False, True, False]
+        ]
+        report = check_uniqueness(board)
+        self.assertEqual(report.status, "multiple")
+        self.assertTrue(report.witness)
+        other = [row[:] for row in board]
+        for r, c in report.witness:
+            other[r][c] = not other[r][c]
+        self.assertEqual(calculate_descriptors(other), calculate_descriptors(board))
+        
+        permutation = [[r == c for c in range(8)] for r in range(8)]
+        self.assertEqual(check_uniqueness(permutation, node_limit=0).status, "timeout")
+
+    def test_uniqueness_stops_at_a_differing_solution(self):
+        """Test that the search ends at the first solution other than the board."""
+        descriptors = {"rows": [[1], [1]], "columns": [[1], [1]]}
+        self.assertEqual(len(solve(descriptors, max_solutions=2).solutions), 2)
+        result = solve(descriptors, max_solutions=2, stop=lambda solution: True)
+        self.assertEqual(len(result.solutions), 1)
+        self.assertFalse(result.exhausted)
+
+        # Whichever diagonal the search finds first, the other board is settled by it alone
+        first = result.solutions[0]
+        other = [[not cell for cell in row] for row in first]
+        searched = []
+
+        def recording_solve(*args, **kwargs):
+            searched.append(solve(*args, **kwargs))
+            return searched[-1]
+
+        with mock.patch("app.core.solver.solve", side_effect=recording_solve):
+            report = check_uniqueness(other, descriptors)
+        self.assertEqual(report.status, "multiple")
+        self.assertEqual(searched[0].solutions, [first])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,376 @@
+import json
+import mmap
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from app.core.bitboard import PackedBoard
+from app.core.compile_catalogue import compile_catalogue, main as compile_main
+from app.core.crud import NonogramDataManager
+from app.core.descriptors import calculate_descriptors
+from app.core.index import ClueIndex
+from app.core.json_index import scan_catalogue
+from app.core.models import Nonogram
+from app.core.reload import ManualReloadStrategy
+from app.core.similarity import DuplicateNonogramError
+from app.core.snapshot import CatalogueEntry
+from app.core.storage import (
+    JsonFileStore, NonogramExistsError, ReadOnlyStoreError, SQLiteStore, StoreError, compiled_path_for
+)
+
+
+def make_entry(board):
+    """Catalogue entry for a list-of-lists board."""
+    return CatalogueEntry(PackedBoard.from_rows(board), calculate_descriptors(board))
+
+
+class TestClueIndexChanges(unittest.TestCase):
+    """Test cases for incremental clue index updates."""
+    
+    def test_with_changes(self):
+        """Test that changes produce a new index and leave the old one alone."""
+        index = ClueIndex({
+            "a": {"rows": [[1], [2]], "columns": [[1]]},
+            "b": {"rows": [[2]], "columns": [[3]]}
+        })
+        updated = index.with_changes(
+            removed={"a": {"rows": [[1], [2]], "columns": [[1]]}},
+            added={"a": {"rows": [[3]], "columns": [[1]]}, "c": {"rows": [[2]], "columns": [[1]]}}
+        )
+        self.assertEqual(index.lookup((1,)), ["a"])
+        self.assertEqual(index.lookup((2,)), ["a", "b"])
+        self.assertEqual(updated.lookup((2,)), ["b", "c"])
+        self.assertEqual(updated.lookup((3,)), ["a", "b"])
+        self.assertEqual(updated.lookup((1,)), ["a", "c"])
+        
+        removed = updated.with_changes(removed={"b": {"rows": [[2]], "columns": [[3]]}}, added={})
+        self.assertEqual(removed.lookup((2,)), ["c"])
+        self.assertEqual(removed.columns((3,)), set())
+
+
+class TestSQLiteStore(unittest.TestCase):
+    """Test cases for the SQLite store and incremental reloads."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.seed_path = os.path.join(self.directory.name, "seed.json")
+        self.db_path = os.path.join(self.directory.name, "nonograms.db")
+        with open(self.seed_path, 'w') as f:
+            json.dump({
+                "plus": {
+                    "board": [[False, True, False], [True, True, True], [False, True, False]],
+                    "descriptors": {"rows": [[1], [3], [1]], "columns": [[1], [3], [1]]}
+                },
+                "block": {
+                    "board": [[True, True], [True, True]],
+                    "descriptors": {"rows": [[2], [2]], "columns": [[2], [2]]}
+                }
+            }, f)
+        self.store = SQLiteStore(self.db_path, seed_path=self.seed_path)
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        self.store.close()
+        self.directory.cleanup()
+    
+    def manager(self):
+        """A data manager on its own connection, like a separate worker."""
+        manager = NonogramDataManager(store=SQLiteStore(self.db_path), reload_strategy=ManualReloadStrategy())
+        self.addCleanup(manager.close)
+        return manager
+    
+    def test_seeded_once(self):
+        """Test that a new database is seeded from the JSON file only once."""
+        self.assertEqual(list(self.store.load().entries), ["plus", "block"])
+        fingerprint = self.store.fingerprint()
+        reopened = SQLiteStore(self.db_path, seed_path=self.seed_path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.fingerprint(), fingerprint)
+    
+    def test_put_and_delete(self):
+        """Test creating, replacing and deleting puzzles."""
+        entry = make_entry([[True, False], [False, False]])
+        self.assertTrue(self.store.put("corner", entry))
+        with self.assertRaises(NonogramExistsError):
+            self.store.put("corner", entry)
+        self.assertFalse(self.store.put("corner", make_entry([[True, True]]), overwrite=True))
+        self.assertEqual(self.store.load().entries["corner"].board.to_rows(), [[True, True]])
+        
+        self.assertTrue(self.store.delete("corner"))
+        self.assertFalse(self.store.delete("corner"))
+        self.assertNotIn("corner", self.store.load().entries)
+    
+    def test_changes_since(self):
+        """Test that only puzzles changed after a fingerprint are returned."""
+        fingerprint = self.store.fingerprint()
+        self.store.put("corner", make_entry([[True, False]]))
+        self.store.delete("block")
+        changes = self.store.changes_since(fingerprint)
+        self.assertEqual(list(changes.upserts), ["corner"])
+        self.assertEqual(changes.deletes, ["block"])
+        self.assertEqual(changes.fingerprint, self.store.fingerprint())
+        self.assertIsNone(self.store.changes_since((0, 12345)))
+    
+    def test_workers_apply_changes_incrementally(self):
+        """Test that a write by one manager reaches another without a full reload."""
+        writer = self.manager()
+        reader = self.manager()
+        plus = reader.get_cached("plus")
+        
+        created = writer.save_nonogram(Nonogram(name="bar", board=[[True, True, True]], descriptors={"rows": [[3]], "columns": [[1], [1], [1]]}))
+        self.assertTrue(created)
+        self.assertEqual(writer.search_by_clue("3"), ["plus", "bar"])
+        
+        self.assertEqual(reader.search_by_clue("3"), ["plus"])
+        # A full reload would go through store.load()
+        with mock.patch.object(reader.store, "load") as load:
+            self.assertTrue(reader.refresh())
+        load.assert_not_called()
+        self.assertEqual(reader.search_by_clue("3"), ["plus", "bar"])
+        self.assertEqual(reader.get_all_names(), ["plus", "block", "bar"])
+        # The untouched puzzle keeps its cached body across the reload
+        self.assertIs(reader.get_cached("plus"), plus)
+        self.assertEqual(reader.get_list_response().etag, writer.get_list_response().etag)
+        
+        self.assertTrue(writer.delete_nonogram("plus"))
+        reader.refresh()
+        self.assertEqual(reader.search_by_clue("3"), ["bar"])
+        self.assertIsNone(reader.get_by_name("plus"))
+    
+    def test_duplicates_are_checked_within_the_write(self):
+        """Test that a duplicate saved by another worker just before a write is still refused."""
+        first = self.manager()
+        second = self.manager()
+        bar = Nonogram(name="bar", board=[[True, True, True]], descriptors={"rows": [[3]], "columns": [[1], [1], [1]]})
+        copy = Nonogram(name="copy", board=bar.board, descriptors=bar.descriptors)
+        put = first.store.put
+
+        def put_after_other_worker(*args, **kwargs):
+            # The other worker saves between this worker's own check and its write
+            second.save_nonogram(bar)
+            return put(*args, **kwargs)
+
+        with mock.patch.object(first.store, "put", side_effect=put_after_other_worker):
+            with self.assertRaises(DuplicateNonogramError):
+                first.save_nonogram(copy)
+        self.assertNotIn("copy", self.store.load().entries)
+        self.assertIn("bar", first.get_all_names())
+        # Reads made by the check joined the write's transaction, which ended with it
+        self.assertFalse(first.store._conn.in_transaction)
+        self.assertTrue(first.save_nonogram(Nonogram(name="dot", board=[[True]], descriptors={"rows": [[1]], "columns": [[1]]})))
+
+    def test_json_store_is_read_only(self):
+        """Test that the JSON file store refuses writes."""
+        store = JsonFileStore(self.seed_path)
+        self.assertTrue(store.read_only)
+        with self.assertRaises(ReadOnlyStoreError):
+            store.put("corner", make_entry([[True]]))
+        with self.assertRaises(ReadOnlyStoreError):
+            store.delete("plus")
+
+    def test_difficulties_are_persisted(self):
+        """Test that load-time analyses are stored once and come back with the puzzles."""
+        manager = self.manager()
+        fingerprint = self.store.fingerprint()
+        entries = self.store.load().entries
+        self.assertEqual(entries["plus"].difficulty, manager._snapshot.data["plus"].difficulty)
+        self.assertEqual(entries["plus"].difficulty.level, "easy")
+        # Storing analyses is not a change to the catalogue
+        self.assertEqual(self.store.fingerprint(), fingerprint)
+        with mock.patch("app.core.crud.analyze") as analyze:
+            self.manager()
+        analyze.assert_not_called()
+
+        manager.save_nonogram(Nonogram(name="diagonal", board=[[True, False], [False, True]],
+                                       descriptors={"rows": [[1], [1]], "columns": [[1], [1]]}))
+        self.assertEqual(self.store.load().entries["diagonal"].difficulty.level, "hard")
+
+    def test_difficulty_column_is_added(self):
+        """Test that databases created before difficulties were stored are migrated."""
+        path = os.path.join(self.directory.name, "old.db")
+        with sqlite3.connect(path) as conn:
+            conn.execute(
+                "CREATE TABLE nonograms (name TEXT PRIMARY KEY, width INTEGER NOT NULL, height INTEGER NOT NULL, "
+                "board BLOB NOT NULL, descriptors TEXT NOT NULL)"
+            )
+            conn.execute("INSERT INTO nonograms VALUES ('dot', 1, 1, X'80', '{\"rows\": [[1]], \"columns\": [[1]]}')")
+        conn.close()
+        store = SQLiteStore(path)
+        self.addCleanup(store.close)
+        self.assertIsNone(store.load().entries["dot"].difficulty)
+        manager = NonogramDataManager(store=store, reload_strategy=ManualReloadStrategy())
+        self.assertEqual(manager._snapshot.data["dot"].difficulty.level, "easy")
+        self.assertEqual(store.load().entries["dot"].difficulty.level, "easy")
+
+
+class TestJsonFileStore(unittest.TestCase):
+    """Test cases for the indexed, lazily loading JSON file store."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        self.data = {
+            "plus": {
+                "board": [[False, True, False], [True, True, True], [False, True, False]],
+                "descriptors": {"rows": [[1], [3], [1]], "columns": [[1], [3], [1]]}
+            },
+            "wide \"bar\" \u00e9": {
+                "descriptors": {"rows": [[4]], "columns": [[1], [1], [1], [1]]},
+                "board": [[True, True, True, True]]
+            },
+            "empty": {"board": [], "descriptors": {"rows": [], "columns": []}}
+        }
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "nonograms.json")
+        with open(self.path, 'w') as f:
+            json.dump(self.data, f, indent=4)
+    
+    def tearDown(self):
+        """Tear down test fixtures."""
+        self.directory.cleanup()
+    
+    def test_scan_catalogue(self):
+        """Test that the offset index matches a full parse of the file."""
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        index = scan_catalogue(raw)
+        self.assertEqual(list(index), list(self.data))
+        for name, entry in self.data.items():
+            start, end = index[name].board_span
+            self.assertEqual(json.loads(raw[start:end]), entry["board"])
+            self.assertEqual(index[name].descriptors, entry["descriptors"])
+        self.assertEqual((index["plus"].width, index["plus"].height), (3, 3))
+        self.assertEqual((index['wide "bar" \u00e9'].width, index['wide "bar" \u00e9'].height), (4, 1))
+        with self.assertRaises(ValueError):
+            scan_catalogue(b'[{"board": []}]')
+
+    def test_load_time_analysis_is_opt_in(self):
+        """Test that puzzles of a store that cannot keep analyses are only analysed on request."""
+        with mock.patch.dict(os.environ, {"NONOGRAM_DIFFICULTY": "auto"}):
+            with mock.patch("app.core.crud.analyze_missing") as analyze_missing:
+                manager = NonogramDataManager(self.path, reload_strategy=ManualReloadStrategy())
+            analyze_missing.assert_not_called()
+            self.assertFalse(manager.analyze_difficulty)
+            self.assertIsNone(manager._snapshot.data["plus"].difficulty)
+        with mock.patch.dict(os.environ, {"NONOGRAM_DIFFICULTY": "1"}):
+            manager = NonogramDataManager(self.path, reload_strategy=ManualReloadStrategy())
+        self.assertEqual(manager._snapshot.data["plus"].difficulty.level, "easy")
+
+    def test_stored_difficulty(self):
+        """Test that a difficulty stored in the file is used instead of analysing the puzzle."""
+        difficulty = {"score": 1004, "level": "medium", "passes": 3, "probes": 4, "branches": 0, "depth": 0, "settled": True}
+        self.data["plus"]["difficulty"] = difficulty
+        self.data["empty"]["difficulty"] = {"score": "?"}
+        with open(self.path, 'w') as f:
+            json.dump(self.data, f)
+        with open(self.path, 'rb') as f:
+            index = scan_catalogue(f.read())
+        self.assertEqual(index["plus"].difficulty, difficulty)
+        self.assertIsNone(index['wide "bar" \u00e9'].difficulty)
+
+        entries = JsonFileStore(self.path).load().entries
+        self.assertEqual(entries["plus"].difficulty.score, 1004)
+        # Malformed analyses are dropped and redone
+        self.assertIsNone(entries["empty"].difficulty)
+        eager = JsonFileStore(self.path, lazy=False).load().entries
+        self.assertEqual(eager["plus"].difficulty, entries["plus"].difficulty)
+        self.assertIsNone(eager["empty"].difficulty)
+    
+    def test_boards_load_on_first_use(self):
+        """Test that loading only indexes boards and reads them when used."""
+        contents = JsonFileStore(self.path).load()
+        entry = contents.entries["plus"]
+        self.assertIsNone(entry._board)
+        self.assertEqual((entry.width, entry.height), (3, 3))
+        self.assertEqual(entry.board.to_rows(), self.data["plus"]["board"])
+        self.assertAlmostEqual(entry.density(), 5 / 9)
+        self.assertEqual(contents.entries["empty"].board.to_rows(), [])
+        
+        eager = JsonFileStore(self.path, lazy=False).load()
+        self.assertEqual(eager.digest, contents.digest)
+        self.assertEqual(eager.fingerprint, contents.fingerprint)
+    
+    def test_listing_does_not_load_boards(self):
+        """Test that names and dimensions are listed without reading boards."""
+        manager = NonogramDataManager(self.path, reload_strategy=ManualReloadStrategy())
+        self.addCleanup(manager.close)
+        page = json.loads(manager.get_list_page(fields=("name", "width", "height")).body)
+        self.assertEqual(page["names"], sorted(self.data))
+        self.assertEqual(page["items"][1], {"name": "plus", "width": 3, "height": 3})
+        self.assertTrue(all(entry._board is None for name, entry in manager._snapshot.data.items() if name != "empty"))
+        self.assertEqual(manager.get_by_name("plus").board, self.data["plus"]["board"])
+    
+    def test_changed_file_is_not_read_through_stale_offsets(self):
+        """Test that a board is not read from a file that changed after indexing."""
+        manager = NonogramDataManager(self.path, reload_strategy=ManualReloadStrategy())
+        self.addCleanup(manager.close)
+        snapshot = manager._snapshot
+        with open(self.path, 'a') as f:
+            f.write("\n")
+        self.assertIsNone(snapshot.get_cached("plus"))
+        self.assertTrue(manager.refresh())
+        self.assertEqual(manager.get_by_name("plus").board, self.data["plus"]["board"])
+
+
+    def test_compiled_catalogue(self):
+        """Test that an up to date compiled file is loaded instead of the JSON."""
+        json_contents = JsonFileStore(self.path).load()
+        self.assertEqual(compile_catalogue(self.path), 3)
+        compiled_path = compiled_path_for(self.path)
+        self.assertTrue(os.path.exists(compiled_path))
+
+        with mock.patch("app.core.storage.scan_catalogue") as scan:
+            contents = JsonFileStore(self.path).load()
+        scan.assert_not_called()
+        self.assertEqual(contents.digest, json_contents.digest)
+        self.assertEqual(contents.fingerprint, json_contents.fingerprint)
+        for name, entry in self.data.items():
+            self.assertEqual(contents.entries[name].board.to_rows(), entry["board"])
+            self.assertEqual(contents.entries[name].descriptors, entry["descriptors"])
+        self.assertEqual(contents.entries["plus"].difficulty.level, "easy")
+
+        manager = NonogramDataManager(self.path, reload_strategy=ManualReloadStrategy())
+        self.addCleanup(manager.close)
+        self.assertEqual(manager.get_by_name("plus").board, self.data["plus"]["board"])
+        self.assertEqual(manager.search_by_clue("4"), ['wide "bar" \u00e9'])
+
+        # Boards are views into the mapping, made on use and never kept as copies
+        entry = manager._snapshot.data["plus"]
+        self.assertIsInstance(entry.board.bits, memoryview)
+        self.assertIsInstance(entry.board.bits.obj, mmap.mmap)
+        manager._snapshot.similarity_index()
+        self.assertIsNone(entry._board)
+
+    def test_compiled_catalogue_fallback(self):
+        """Test that stale or unreadable compiled files are ignored in favour of the JSON."""
+        compile_catalogue(self.path)
+        self.data["cross"] = self.data.pop("plus")
+        with open(self.path, 'w') as f:
+            json.dump(self.data, f)
+        with self.assertLogs("app.core.storage", "WARNING"):
+            entries = JsonFileStore(self.path).load().entries
+        self.assertIn("cross", entries)
+
+        compile_catalogue(self.path)
+        with open(compiled_path_for(self.path), "r+b") as f:
+            f.truncate(100)
+        with self.assertLogs("app.core.storage", "WARNING"):
+            self.assertIn("cross", JsonFileStore(self.path).load().entries)
+        self.assertIn("cross", JsonFileStore(self.path, compiled=False).load().entries)
+
+    def test_compile_command(self):
+        """Test the compile entry point."""
+        output = os.path.join(self.directory.name, "out.bin")
+        with mock.patch("sys.stdout"):
+            self.assertEqual(compile_main([self.path, "--output", output, "--no-difficulty"]), 0)
+        self.assertTrue(os.path.exists(output))
+        with mock.patch("sys.stderr"):
+            self.assertEqual(compile_main([os.path.join(self.directory.name, "missing.json")]), 1)
+        with self.assertRaises(StoreError):
+            compile_catalogue(os.path.join(self.directory.name, "missing.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
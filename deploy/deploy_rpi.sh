@@ -27,6 +27,8 @@ python -m venv venv
 source venv/bin/activate
 pip install -r requirements.txt
 pip install gunicorn
+# Compile the catalogue so workers start without parsing the JSON data file
+python -m app.core.compile_catalogue
 
 # 3. Create systemd service file
 echo "Creating systemd service..."
@@ -38,6 +40,8 @@ After=network.target
 [Service]
 User=$(whoami)
 WorkingDirectory=$(pwd)
+# Workers share one compiled catalogue published by the gunicorn master (see gunicorn.conf.py)
+Environment=NONOGRAM_STORE=shared
 ExecStart=$(pwd)/venv/bin/gunicorn -w 2 -k uvicorn.workers.UvicornWorker main:app -b 0.0.0.0:8000
 Restart=always
 RestartSec=5
@@ -48,6 +52,27 @@ StandardError=journal
 WantedBy=multi-user.target
 EOF
 
+# Co-op sessions live in the memory of one process, so they get a single-process service of their own
+cat > nonogram-coop.service << EOF
+[Unit]
+Description=Nonogram Editor co-op sessions
+After=network.target nonogram-api.service
+
+[Service]
+User=$(whoami)
+WorkingDirectory=$(pwd)
+# Maps the catalogue published by nonogram-api.service
+Environment=NONOGRAM_STORE=shared
+ExecStart=$(pwd)/venv/bin/uvicorn main:app --host 127.0.0.1 --port 8001
+Restart=always
+RestartSec=5
+StandardOutput=journal
+StandardError=journal
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 # 4. Create Nginx configuration
 echo "Creating Nginx configuration..."
 cat > nonogram-editor.conf << EOF
@@ -62,6 +87,16 @@ server {
         try_files \$uri \$uri/ /index.html;
     }
 
+    # Co-op WebSockets go to the single co-op process, so players of a session meet
+    location ~ ^/api/nonograms/[^/]+/coop/ {
+        proxy_pass http://127.0.0.1:8001;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade \$http_upgrade;
+        proxy_set_header Connection "upgrade";
+        proxy_set_header Host \$host;
+        proxy_read_timeout 1h;
+    }
+
     # Proxy API requests to the backend
     location /api/ {
         proxy_pass http://127.0.0.1:8000;
@@ -77,12 +112,12 @@ echo
 echo "Deployment files created successfully!"
 echo
 echo "Next steps for manual installation:"
-echo "1. Copy the systemd service file to system directory:"
-echo "   sudo cp backend/nonogram-api.service /etc/systemd/system/"
+echo "1. Copy the systemd service files to system directory:"
+echo "   sudo cp backend/nonogram-api.service backend/nonogram-coop.service /etc/systemd/system/"
 echo
-echo "2. Enable and start the service:"
-echo "   sudo systemctl enable nonogram-api.service"
-echo "   sudo systemctl start nonogram-api.service"
+echo "2. Enable and start the services:"
+echo "   sudo systemctl enable nonogram-api.service nonogram-coop.service"
+echo "   sudo systemctl start nonogram-api.service nonogram-coop.service"
 echo
 echo "3. Copy the Nginx configuration:"
 echo "   sudo cp backend/nonogram-editor.conf /etc/nginx/sites-available/"